@@ -10,7 +10,8 @@ class RunConfiguration:
                  dotnet_sdk_version: str, 
                  diag_tool_version: str,
                  diag_tool_feed: str,
-                 arch: str=None) -> None:
+                 arch: str=None,
+                 analysis_cache_root: str=None) -> None:
         self.test_bed = test_bed
         self.dotnet_sdk_version = dotnet_sdk_version
         if arch is None:
@@ -29,6 +30,8 @@ class RunConfiguration:
 
         self.dump_folder = os.path.join(test_bed, f'dumps-net{dotnet_sdk_version}')
         self.analyze_folder = os.path.join(test_bed, f'analyze-net{dotnet_sdk_version}')
+        # shared by runs so unchanged dumps aren't analyzed again
+        self.analysis_cache_root = analysis_cache_root
         
         env = os.environ.copy()
         env['DOTNET_ROOT'] = self.dotnet_root
@@ -45,6 +48,7 @@ class CrossOSDACConfiguration:
         self.conf_file_path = conf_file_path
         self.test_name = f'CrossOSDAC-{self.os_name}-{self.cpu_arch}-{self.diag_tool_version}'
         self.analyze_testbed: str = os.path.join(self.testbed_root, f'TestBed-{self.test_name}')
+        self.analysis_cache_root: str = os.path.join(self.testbed_root, 'analysis-cache')
 
         self.run_conf_list: list[RunConfiguration] = list()
 
@@ -62,7 +66,8 @@ class CrossOSDACConfiguration:
                         sdk_version,
                         self.diag_tool_version,
                         self.diag_tool_feed,
-                        arch
+                        arch,
+                        self.analysis_cache_root
                     )
                 )
 
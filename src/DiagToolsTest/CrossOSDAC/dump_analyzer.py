@@ -1,11 +1,19 @@
 import os
 import glob
+import time
+import threading
+from typing import Optional, Union
 from subprocess import PIPE
+from concurrent.futures import ThreadPoolExecutor
 
 import app
 from tools import dotnet_tool
 from tools import dotnet_app
 from tools import terminal
+from tools import sos_parser
+from tools import heap_stats
+from tools import analysis_cache
+from tools.sysinfo import get_available_memory
 from CrossOSDAC.configuration import RunConfiguration
 
 
@@ -41,13 +49,225 @@ def __filter_64bit_dump(dump_path_list: list[str]) -> list[str]:
     )
 
 
+# estimated RSS of a dotnet-dump analyze process besides the mapped dump
+ANALYZER_BASE_MEMORY = 256 * 1024 * 1024
+
+
+class MemoryBoundedAdmission:
+    '''Admit jobs while their estimated memory fits the budget.
+
+    One job is always admitted when nothing is running, so a dump larger than the budget
+    still gets analyzed, alone.
+    '''
+    def __init__(self, memory_budget: int):
+        '''
+        :param memory_budget: total memory(bytes) running jobs may use
+        '''
+        self.__memory_budget = memory_budget
+        self.__reserved = 0
+        self.__running = 0
+        self.__condition = threading.Condition()
+
+    def acquire(self, cost: int) -> None:
+        '''Block until a job of given cost can start
+
+        :param cost: estimated memory(bytes) of the job
+        '''
+        with self.__condition:
+            self.__condition.wait_for(
+                lambda: self.__running == 0 or self.__reserved + cost <= self.__memory_budget)
+            self.__reserved += cost
+            self.__running += 1
+
+    def release(self, cost: int) -> None:
+        '''Return memory of a finished job
+
+        :param cost: estimated memory(bytes) of the job
+        '''
+        with self.__condition:
+            self.__reserved -= cost
+            self.__running -= 1
+            self.__condition.notify_all()
+
+
+class DumpAnalysisResult:
+    '''Outcome of analyzing a dump.
+    '''
+    def __init__(self,
+                 dump_path: str,
+                 result: Union[int, Exception],
+                 elapsed_secs: float,
+                 record_count_map: dict[str, int],
+                 heap_stat_table: Optional[heap_stats.HeapStatTable],
+                 cache_hit: bool):
+        '''
+        :param dump_path: dump path
+        :param result: exit code or exception
+        :param elapsed_secs: elapsed time(seconds)
+        :param record_count_map: counts of parsed SOS records
+        :param heap_stat_table: HeapStatTable instance, None if numpy isn't installed
+        :param cache_hit: whether transcript is restored from analysis cache
+        '''
+        self.dump_path = dump_path
+        self.result = result
+        self.elapsed_secs = elapsed_secs
+        self.record_count_map = record_count_map
+        self.heap_stat_table = heap_stat_table
+        self.cache_hit = cache_hit
+
+
+def _get_dump_size(dump_path: str) -> int:
+    '''Get dump size, 0 if the dump is gone
+
+    :param dump_path: dump path
+    :return: size(bytes)
+    '''
+    try:
+        return os.path.getsize(dump_path)
+    except OSError:
+        return 0
+
+
+def _analyze_single_dump(test_conf: RunConfiguration,
+                         tool_dll_path: str,
+                         dump_path: str,
+                         admission: MemoryBoundedAdmission,
+                         cache: Optional[analysis_cache.AnalysisResultCache]=None) -> DumpAnalysisResult:
+    '''Analyze a dump, an error is kept in its result so that other dumps are still analyzed
+
+    :param test_conf: test configuration
+    :param tool_dll_path: path of dotnet-dump dll
+    :param dump_path: dump path
+    :param admission: MemoryBoundedAdmission instance
+    :param cache: AnalysisResultCache instance, dump is always analyzed if it's None
+    :return: DumpAnalysisResult instance
+    '''
+    start = time.perf_counter()
+    try:
+        return _run_single_analysis(test_conf, tool_dll_path, dump_path, admission, cache)
+    except Exception as ex:
+        return DumpAnalysisResult(
+            dump_path,
+            Exception(f'fail to analyze {dump_path}: {ex}'),
+            time.perf_counter() - start,
+            dict(),
+            None,
+            False
+        )
+
+
+def _run_single_analysis(test_conf: RunConfiguration,
+                         tool_dll_path: str,
+                         dump_path: str,
+                         admission: MemoryBoundedAdmission,
+                         cache: Optional[analysis_cache.AnalysisResultCache]=None) -> DumpAnalysisResult:
+    '''Analyze a dump with dotnet-dump analyze, streaming output into its analyze file
+
+    :param test_conf: test configuration
+    :param tool_dll_path: path of dotnet-dump dll
+    :param dump_path: dump path
+    :param admission: MemoryBoundedAdmission instance
+    :param cache: AnalysisResultCache instance, dump is always analyzed if it's None
+    :return: DumpAnalysisResult instance
+    '''
+    dump_name = os.path.basename(dump_path)
+    analyze_output_path = os.path.join(
+        test_conf.analyze_folder,
+        dump_name.replace('dump', 'analyze')
+    )
+
+    analyze_commands = basic_analyze_commands.copy()
+    
+    # analyze dump on windows
+    if test_conf.arch is not None:
+        analyze_output_path = f'{analyze_output_path}_win'
+
+        app_name = dump_name.replace('dump_', '')
+        app_root = os.path.join(test_conf.test_bed, app_name)
+        project_symbol_root = dotnet_app.get_app_symbol_root(app_name, app_root)
+        if isinstance(project_symbol_root, Exception):
+            return DumpAnalysisResult(dump_path, project_symbol_root, 0, dict(), None, False)
+        analyze_commands.insert(
+            0,
+            f'setsymbolserver -directory {project_symbol_root}\n'.encode()
+        )
+        
+    async_args = [test_conf.dotnet_bin_path, tool_dll_path, 'analyze', dump_path]
+    cost = os.path.getsize(dump_path) + ANALYZER_BASE_MEMORY
+
+    def run_analyzer():
+        admission.acquire(cost)
+        try:
+            with open(analyze_output_path, 'wb+') as fp:
+                _, proc = terminal.run_command_async(async_args, stdin=PIPE, stdout=fp, stderr=fp, env=test_conf.env)
+
+                for command in analyze_commands:
+                    try:
+                        proc.stdin.write(command)
+                    except Exception as exception:
+                        fp.write(f'{exception}\n'.encode('utf-8'))
+                        continue
+                proc.communicate()
+            return proc.returncode
+        except Exception as ex:
+            return Exception(f'fail to analyze {dump_path}: {ex}')
+        finally:
+            admission.release(cost)
+
+    start = time.perf_counter()
+    result, record_list, cache_hit = analysis_cache.load_or_analyze(
+        cache,
+        dump_path,
+        f'dotnet-dump {test_conf.diag_tool_version}',
+        analyze_commands,
+        analyze_output_path,
+        run_analyzer
+    )
+    elapsed_secs = time.perf_counter() - start
+
+    record_count_map = dict()
+    heap_stat_table = None
+    if record_list is not None:
+        record_count_map = sos_parser.count_records(record_list)
+        if heap_stats.HAS_NUMPY:
+            heap_stat_table = heap_stats.HeapStatTable.from_records(record_list)
+    return DumpAnalysisResult(dump_path, result, elapsed_secs, record_count_map, heap_stat_table, cache_hit)
+
+
+def _write_heap_stats_report(report_path: str, table_map: dict, top_n: int=20):
+    '''Write largest types of each dump and a comparison of them across dumps
+
+    :param report_path: report path
+    :param table_map: a dict maps dump name to HeapStatTable instance
+    :param top_n: number of types listed
+    '''
+    lines = []
+    for dump_name, table in table_map.items():
+        lines.append(f'{dump_name}: {table.total_count:,} objects, {table.total_size:,} bytes')
+        lines.extend(table.group_by_type().top(top_n).format())
+        lines.append('')
+    if len(table_map) > 1:
+        lines.append('total size of largest types across dumps:')
+        lines.extend(heap_stats.join_heap_stats(table_map).top(top_n).format())
+    with open(report_path, 'w', encoding='utf-8') as fp:
+        fp.write('\n'.join(lines) + '\n')
+
+
 @app.function_monitor(
     pre_run_msg='------ start to analyze dump ------',
     post_run_msg='------ analyze dump completed ------'
 )
-def analyze_dump(test_conf: RunConfiguration):
-    '''Run sample apps and perform tests.
+def analyze_dump(test_conf: RunConfiguration,
+                 max_workers: int=None,
+                 memory_fraction: float=0.8,
+                 use_cache: bool=True):
+    '''Analyze dumps concurrently while estimated memory of analyzers fits available memory.
 
+    :param test_conf: test configuration
+    :param max_workers: maximum number of analyzers running at the same time, cpu count if it's None
+    :param memory_fraction: fraction of available memory analyzers may use
+    :param use_cache: whether to reuse analysis of unchanged dumps
+    :return: a dict maps dump path to exit code or exception
     '''
     tool_dll_path = dotnet_tool.get_tool_dll(
         'dotnet-dump',
@@ -73,38 +293,58 @@ def analyze_dump(test_conf: RunConfiguration):
         else:
             dump_path_list = __filter_64bit_dump(dump_path_candidates)
 
-    for dump_path in dump_path_list:
-        dump_name = os.path.basename(dump_path)
-        analyze_output_path = os.path.join(
-            test_conf.analyze_folder,
-            dump_name.replace('dump', 'analyze')
-        )
+    available_memory = get_available_memory()
+    if isinstance(available_memory, Exception):
+        print(f'{available_memory}, analyze dumps one by one')
+        memory_budget = 0
+    else:
+        memory_budget = int(available_memory * memory_fraction)
+    admission = MemoryBoundedAdmission(memory_budget)
 
-        analyze_commands = basic_analyze_commands.copy()
-        
-        # analyze dump on windows
-        if test_conf.arch is not None:
-            analyze_output_path = f'{analyze_output_path}_win'
-
-            app_name = dump_name.replace('dump_', '')
-            app_root = os.path.join(test_conf.test_bed, app_name)
-            project_symbol_root = dotnet_app.get_app_symbol_root(app_name, app_root)
-            analyze_commands.insert(
-                0,
-                f'setsymbolserver -directory {project_symbol_root}\n'.encode()
-            )
-            
-        async_args = [test_conf.dotnet_bin_path, tool_dll_path, 'analyze', dump_path]
-        
-        with open(analyze_output_path, 'wb+') as fp:
-            _, proc = terminal.run_command_async(async_args, stdin=PIPE, stdout=fp, stderr=fp, env=test_conf.env)
+    cache = None
+    if use_cache and test_conf.analysis_cache_root is not None:
+        cache = analysis_cache.AnalysisResultCache(test_conf.analysis_cache_root)
+
+    # start with large dumps so that small ones fill the remaining memory
+    dump_path_list = sorted(dump_path_list, key=_get_dump_size, reverse=True)
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        future_list = [
+            executor.submit(_analyze_single_dump, test_conf, tool_dll_path, dump_path, admission, cache)
+            for dump_path in dump_path_list
+        ]
+        result_list = [future.result() for future in future_list]
 
-            for command in analyze_commands:
-                try:
-                    proc.stdin.write(command)
-                except Exception as exception:
-                    fp.write(f'{exception}\n'.encode('utf-8'))
-                    continue
-            proc.communicate()
+    summary_lines = ['dump analysis summary:']
+    for analysis in result_list:
+        status = 'succeeded' if analysis.result == 0 else f'failed({analysis.result})'
+        if analysis.cache_hit:
+            status = 'restored from cache'
+        summary_lines.append(
+            f'    {os.path.basename(analysis.dump_path)}: {status} in {analysis.elapsed_secs:.1f}s')
+        if analysis.result == 0:
+            record_count_map = analysis.record_count_map
+            summary_lines.append(
+                '        '
+                f'{record_count_map.get("ThreadRecord", 0)} threads, '
+                f'{record_count_map.get("FrameRecord", 0)} frames, '
+                f'{record_count_map.get("HeapSegmentRecord", 0)} heap segments, '
+                f'{record_count_map.get("HeapStatRecord", 0)} heap types'
+            )
+    succeeded_count = len([analysis for analysis in result_list if analysis.result == 0])
+    summary_lines.append(f'{succeeded_count} succeeded, {len(result_list) - succeeded_count} failed')
+    summary = '\n'.join(summary_lines)
+    print(summary)
+    if app.get_logger() is not None:
+        app.get_logger().info(summary)
 
+    table_map = {
+        os.path.basename(analysis.dump_path): analysis.heap_stat_table
+        for analysis in result_list
+        if analysis.heap_stat_table is not None and len(analysis.heap_stat_table) > 0
+    }
+    if not heap_stats.HAS_NUMPY:
+        print('skip heap statistics report: numpy is not installed')
+    elif len(table_map) > 0:
+        _write_heap_stats_report(os.path.join(test_conf.analyze_folder, 'heap_stats.log'), table_map)
 
+    return {analysis.dump_path: analysis.result for analysis in result_list}
@@ -71,13 +71,23 @@ def install_DotNET_SDK(run_conf: RunConfiguration) -> Union[None, Exception]:
     
 
 def install_dotnet_dump(run_conf: RunConfiguration) -> Union[None, Exception]:
+    config_file_path = dotnet_tool.mirror_tool_feed(
+        ['dotnet-dump'],
+        run_conf.diag_tool_version,
+        run_conf.diag_tool_feed,
+        os.path.join(run_conf.test_bed, 'nuget-mirror')
+    )
+    if isinstance(config_file_path, Exception):
+        config_file_path = None
+
     dotnet_tool.install_tool(
         run_conf.dotnet_bin_path,
         'dotnet-dump',
         run_conf.diag_tool_root,
         run_conf.diag_tool_version,
         run_conf.diag_tool_feed,
-        run_conf.env
+        run_conf.env,
+        config_file_path
     )
 
 
@@ -92,13 +102,13 @@ def prepare_sample_app(run_conf: RunConfiguration) -> Union[None, Exception]:
     try:
         target_app.create_oom(run_conf)
     except Exception as ex:
-        app.logger.error(f'fail to create oom: {ex}')
+        app.get_logger().error(f'fail to create oom: {ex}')
 
     
     try:
         target_app.create_uhe(run_conf)
     except Exception as ex:
-        app.logger.error(f'fail to create uhe: {ex}')
+        app.get_logger().error(f'fail to create uhe: {ex}')
 
 
 def clean_temp(run_conf: RunConfiguration) -> Union[None, Exception]:
@@ -17,6 +17,8 @@ class DiagToolsTestConfiguration:
         self.dotnet_bin_path = os.path.join(self.dotnet_root, f'dotnet{SysInfo.bin_ext}')
 
         self.diag_tool_root = os.path.join(self.test_bed, f'diag-tool')
+        # shared by runs so unchanged dumps aren't debugged again
+        self.analysis_cache_root = os.path.join(self.testbed_root, 'analysis-cache')
 
         env = os.environ.copy()
         env['DOTNET_ROOT'] = self.dotnet_root
@@ -62,6 +64,10 @@ class DiagToolsTestConfiguration:
             else:
                 self.optional_feature_container = False
                 self.optional_feature_container_flag = '-NO'
+
+            # run tools that don't interfere with each other at the same time
+            self.concurrent_tests: bool = \
+                config['Test'].get('ConcurrentTests', 'n').lower() in ['yes', 'y']
                 
         except Exception as ex:
             raise Exception(f'fail to parse conf file {conf_file_path}: {ex}')    
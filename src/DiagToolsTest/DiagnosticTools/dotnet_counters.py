@@ -4,18 +4,36 @@ import time
 import app
 from tools import dotnet_tool
 from tools import terminal
+from tools import waiter
 from tools import dotnet_app
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
-from DiagnosticTools import target_app
+from DiagnosticTools import target_app_pool
+from DiagnosticTools.target_app_pool import TargetAppPool
 
 
+# collect stops by itself after its duration; dotnet-counters buffers the csv and
+# it's only complete once the tool exits, so rows are checked after exit
+COUNTER_COLLECT_SECS = 10
+# seconds beyond collect duration for attaching, flushing csv and exiting
+COUNTER_EXIT_TIMEOUT = 60
+# csv has a row per counter per interval(1 second by default) and System.Runtime reports
+# at least 20 counters, expect rows of COUNTER_INTERVAL_COUNT intervals at least
+SYSTEM_RUNTIME_COUNTER_COUNT = 20
+COUNTER_INTERVAL_COUNT = 3
+COUNTER_ROW_COUNT = SYSTEM_RUNTIME_COUNTER_COUNT * COUNTER_INTERVAL_COUNT
+# seconds to wait for the first refresh of monitor, including attaching
+COUNTER_MONITOR_TIMEOUT = 30
+
 @app.function_monitor(
     pre_run_msg='------ start to test dotnet-counters ------',
     post_run_msg='------ test dotnet-counters completed ------'
 )
-def test_dotnet_counters(test_conf: DiagToolsTestConfiguration):
+def test_dotnet_counters(test_conf: DiagToolsTestConfiguration, app_pool: TargetAppPool=None):
     '''Run sample apps and perform tests.
 
+    :param test_conf: test configuration
+    :param app_pool: TargetAppPool instance lending webapp
+    :return: exception if any check fails
     '''
     tool_dll_path = dotnet_tool.get_tool_dll(
         'dotnet-counters',
@@ -25,55 +43,81 @@ def test_dotnet_counters(test_conf: DiagToolsTestConfiguration):
     if isinstance(tool_dll_path, Exception):
         return tool_dll_path
     
-    webapp_process = target_app.run_webapp(test_conf)
-    if isinstance(webapp_process, Exception):
-        return webapp_process
+    error_list = []
+    with target_app_pool.lease_target_app(test_conf, 'webapp', app_pool) as webapp_process:
+        if isinstance(webapp_process, Exception):
+            return webapp_process
+
+        sync_args_list = [
+            [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'list'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
+        ]
+        for args in sync_args_list:
+            _, outs, errs = terminal.run_command_sync(
+                args,
+                cwd=test_conf.test_result_folder,
+                env=test_conf.env,
+            )
 
-    sync_args_list = [
-        [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'list'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
-    ]
-    for args in sync_args_list:
-        _, outs, errs = terminal.run_command_sync(
+        # csv of an earlier run must not pass the check
+        counter_csv_path = os.path.join(test_conf.test_result_folder, 'webapp_counter.csv')
+        if os.path.exists(counter_csv_path):
+            os.remove(counter_csv_path)
+        args = [
+            test_conf.dotnet_bin_path, tool_dll_path, 'collect', '-p', str(webapp_process.pid),
+            '-o', 'webapp_counter.csv', '--duration', f'00:00:{COUNTER_COLLECT_SECS:02d}'
+        ]
+        _, p = terminal.run_command_async(
             args,
             cwd=test_conf.test_result_folder,
-            env=test_conf.env,
+            env=test_conf.env
         )
+        returncode = waiter.wait_for_process_exit(p, COUNTER_COLLECT_SECS + COUNTER_EXIT_TIMEOUT)
+        if isinstance(returncode, Exception):
+            waiter.terminate_process(p)
+            error_list.append(f'collect doesn\'t stop after its duration: {returncode}')
+        else:
+            row_count = waiter.wait_for_csv_rows(counter_csv_path, COUNTER_ROW_COUNT, 0, p)
+            if isinstance(row_count, Exception):
+                error_list.append(f'collect exits with {returncode}: {row_count}')
 
-    async_args_list = [
-        [test_conf.dotnet_bin_path, tool_dll_path, 'collect', '-p', str(webapp_process.pid), '-o', 'webapp_counter.csv'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'monitor', '-p', str(webapp_process.pid)],
-    ]
-    for args in async_args_list:
-        _, p = terminal.run_command_async(
+        # monitor shows running status once its session is connected,
+        # a provider header of the first refresh also tells it's attached
+        args = [test_conf.dotnet_bin_path, tool_dll_path, 'monitor', '-p', str(webapp_process.pid)]
+        start = time.perf_counter()
+        result = terminal.run_command_until_ready(
             args,
+            r'Status: Running|\[System\.Runtime\]',
+            os.path.join(test_conf.test_result_folder, 'webapp_counter_monitor.log'),
+            COUNTER_MONITOR_TIMEOUT,
             cwd=test_conf.test_result_folder,
             env=test_conf.env
         )
-        time.sleep(10)
-        p.terminate()
-        p.communicate()
-        time.sleep(3)
-
-    webapp_process.terminate()
-    while webapp_process.poll() is None:
-        time.sleep(1)
+        if isinstance(result, Exception):
+            error_list.append(f'{result}')
+        else:
+            target_app_pool.report_attach_latency(
+                app_pool, 'dotnet-counters', 'monitor', time.perf_counter() - start)
+            _, p = result
+            waiter.terminate_process(p)
     
     console_app_root = os.path.join(test_conf.test_bed, 'console')
     console_app_bin = dotnet_app.get_app_bin('console', console_app_root)
     if isinstance(console_app_bin, Exception):
-        return console_app_bin
-    
-    async_args_list = [
-        [test_conf.dotnet_bin_path, tool_dll_path, 'collect', '--', console_app_bin, '-o', 'console_counter.csv'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'monitor', '--', console_app_bin],
-    ]
-    for args in async_args_list:
-        command, p = terminal.run_command_async(
-            args,
-            cwd=test_conf.test_result_folder,
-            env=test_conf.env,
-        )
-        p.communicate()
-        time.sleep(3)
\ No newline at end of file
+        error_list.append(f'{console_app_bin}')
+    else:
+        async_args_list = [
+            [test_conf.dotnet_bin_path, tool_dll_path, 'collect', '--', console_app_bin, '-o', 'console_counter.csv'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'monitor', '--', console_app_bin],
+        ]
+        for args in async_args_list:
+            command, p = terminal.run_command_async(
+                args,
+                cwd=test_conf.test_result_folder,
+                env=test_conf.env,
+            )
+            p.communicate()
+
+    if len(error_list) > 0:
+        return Exception(f'fail to test dotnet-counters: {"; ".join(error_list)}')
\ No newline at end of file
@@ -8,14 +8,15 @@ from tools import dotnet_tool
 from tools import terminal
 from tools.sysinfo import SysInfo
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
-from DiagnosticTools import target_app
+from DiagnosticTools import target_app_pool
+from DiagnosticTools.target_app_pool import TargetAppPool
 
 
 @app.function_monitor(
     pre_run_msg='------ start to test dotnet-dump ------',
     post_run_msg='------ test dotnet-dump completed ------'
 )
-def test_dotnet_dump(test_conf: DiagToolsTestConfiguration):
+def test_dotnet_dump(test_conf: DiagToolsTestConfiguration, app_pool: TargetAppPool=None):
     '''Run sample apps and perform tests.
 
     '''
@@ -27,25 +28,29 @@ def test_dotnet_dump(test_conf: DiagToolsTestConfiguration):
     if isinstance(tool_dll_path, Exception):
         return tool_dll_path
         
-    webapp_process = target_app.run_webapp(test_conf)
-    if isinstance(webapp_process, Exception):
-        return webapp_process
+    with target_app_pool.lease_target_app(test_conf, 'webapp', app_pool, destructive=True) as webapp_process:
+        if isinstance(webapp_process, Exception):
+            return webapp_process
 
-    sync_args_list = [
-        [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'collect', '-p', str(webapp_process.pid)],
-    ]
-    for args in sync_args_list:
+        sync_args_list = [
+            [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
+        ]
+        for args in sync_args_list:
+            _, outs, errs = terminal.run_command_sync(
+                args,
+                cwd=test_conf.test_bed,
+                env=test_conf.env,
+            )
+
+        start = time.perf_counter()
         _, outs, errs = terminal.run_command_sync(
-            args,
+            [test_conf.dotnet_bin_path, tool_dll_path, 'collect', '-p', str(webapp_process.pid)],
             cwd=test_conf.test_bed,
             env=test_conf.env,
         )
-
-    webapp_process.terminate()
-    while webapp_process.poll() is None:
-        time.sleep(1)
+        target_app_pool.report_command_time(
+            app_pool, 'dotnet-dump', 'collect', time.perf_counter() - start)
     
     # analyze dump with dotnet-dump analyze
     if 'win' in SysInfo.rid:
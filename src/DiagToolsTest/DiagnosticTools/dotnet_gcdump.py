@@ -4,14 +4,15 @@ import app
 from tools import dotnet_tool
 from tools import terminal
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
-from DiagnosticTools import target_app
+from DiagnosticTools import target_app_pool
+from DiagnosticTools.target_app_pool import TargetAppPool
 
 
 @app.function_monitor(
     pre_run_msg='------ start to test dotnet-gcdump ------',
     post_run_msg='------ test dotnet-gcdump completed ------'
 )
-def test_dotnet_gcdump(test_conf: DiagToolsTestConfiguration):
+def test_dotnet_gcdump(test_conf: DiagToolsTestConfiguration, app_pool: TargetAppPool=None):
     '''Run sample apps and perform tests.
 
     '''
@@ -23,22 +24,26 @@ def test_dotnet_gcdump(test_conf: DiagToolsTestConfiguration):
     if isinstance(tool_dll_path, Exception):
         return tool_dll_path
         
-    gcdump_playground_process = target_app.run_gc_dump_playground2(test_conf)
-    if isinstance(gcdump_playground_process, Exception):
-        return gcdump_playground_process
+    with target_app_pool.lease_target_app(test_conf, 'GCDumpPlayground2', app_pool) as gcdump_playground_process:
+        if isinstance(gcdump_playground_process, Exception):
+            return gcdump_playground_process
 
-    sync_args_list = [
-        [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'collect', '-p', str(gcdump_playground_process.pid), '-v'],
-    ]
-    for args in sync_args_list:
+        sync_args_list = [
+            [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
+        ]
+        for args in sync_args_list:
+            _, outs, errs = terminal.run_command_sync(
+                args,
+                cwd=test_conf.test_result_folder,
+                env=test_conf.env,
+            )
+
+        start = time.perf_counter()
         _, outs, errs = terminal.run_command_sync(
-            args,
+            [test_conf.dotnet_bin_path, tool_dll_path, 'collect', '-p', str(gcdump_playground_process.pid), '-v'],
             cwd=test_conf.test_result_folder,
             env=test_conf.env,
         )
-
-    gcdump_playground_process.terminate()
-    while gcdump_playground_process.poll() is None:
-        time.sleep(1)
\ No newline at end of file
+        target_app_pool.report_command_time(
+            app_pool, 'dotnet-gcdump', 'collect', time.perf_counter() - start)
\ No newline at end of file
@@ -1,14 +1,15 @@
 import os
 import glob
-import time
 from subprocess import PIPE
 
 import app
 from tools import dotnet_tool
 from tools import terminal
+from tools import analysis_cache
 from tools.sysinfo import SysInfo
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
-from DiagnosticTools import target_app
+from DiagnosticTools import target_app_pool
+from DiagnosticTools.target_app_pool import TargetAppPool
 
 
 def __get_analyze_commands(rid: str):
@@ -50,7 +51,7 @@ def __get_analyze_commands(rid: str):
     pre_run_msg='------ start to test dotnet-sos ------',
     post_run_msg='------ test dotnet-sos completed ------'
 )
-def test_dotnet_sos(test_conf: DiagToolsTestConfiguration):
+def test_dotnet_sos(test_conf: DiagToolsTestConfiguration, app_pool: TargetAppPool=None):
     '''Run sample apps and perform tests.
 
     '''
@@ -75,7 +76,7 @@ def test_dotnet_sos(test_conf: DiagToolsTestConfiguration):
             env=test_conf.env,
         )
     debug_dump(test_conf)
-    attach_process(test_conf)
+    attach_process(test_conf, app_pool)
     
     
 @app.function_monitor(
@@ -102,74 +103,85 @@ def debug_dump(test_conf: DiagToolsTestConfiguration):
     analyze_output = os.path.join(test_conf.test_result_folder, 'sos_dump_debug.log')
 
     analyze_commands = __get_analyze_commands(SysInfo.rid)
-    if 'win' in SysInfo.rid:
-        debug_script = os.path.join(
-            test_conf.test_bed,
-            'cdb_debug_script'
-        )
-        with open(debug_script, 'wb+') as fs:
-            fs.writelines(analyze_commands)
-
-        args = [SysInfo.debugger, '-z', dump_path, '-cf', debug_script]
-        with open(analyze_output, 'wb+') as fp:
-            command, proc = terminal.run_command_async(args, stdout=fp, stderr=fp, env=test_conf.env)
-            proc.communicate()
 
-    else:
-        args = [SysInfo.debugger, '-c', dump_path]
-        with open(analyze_output, 'wb+') as fp:
-            command, proc = terminal.run_command_async(args, stdin=PIPE, stdout=fp, stderr=fp, env=test_conf.env)
-            for command in analyze_commands:
-                try:
-                    proc.stdin.write(command)
-                except Exception as exception:
-                    fp.write(f'{exception}\n'.encode('utf-8'))
-                    continue
-            proc.communicate()
+    def run_debugger():
+        if 'win' in SysInfo.rid:
+            debug_script = os.path.join(
+                test_conf.test_bed,
+                'cdb_debug_script'
+            )
+            with open(debug_script, 'wb+') as fs:
+                fs.writelines(analyze_commands)
+
+            args = [SysInfo.debugger, '-z', dump_path, '-cf', debug_script]
+            with open(analyze_output, 'wb+') as fp:
+                command, proc = terminal.run_command_async(args, stdout=fp, stderr=fp, env=test_conf.env)
+                proc.communicate()
+
+        else:
+            args = [SysInfo.debugger, '-c', dump_path]
+            with open(analyze_output, 'wb+') as fp:
+                command, proc = terminal.run_command_async(args, stdin=PIPE, stdout=fp, stderr=fp, env=test_conf.env)
+                for command in analyze_commands:
+                    try:
+                        proc.stdin.write(command)
+                    except Exception as exception:
+                        fp.write(f'{exception}\n'.encode('utf-8'))
+                        continue
+                proc.communicate()
+        return proc.returncode
+
+    # SOS is installed by dotnet-sos of the tested version
+    _, _, cache_hit = analysis_cache.load_or_analyze(
+        analysis_cache.AnalysisResultCache(test_conf.analysis_cache_root),
+        dump_path,
+        f'dotnet-sos {test_conf.diag_tool_version} {os.path.basename(SysInfo.debugger)}',
+        analyze_commands,
+        analyze_output,
+        run_debugger
+    )
+    if cache_hit:
+        print(f'restore debug output of {dump_path} from analysis cache')
 
 
 @app.function_monitor(
     pre_run_msg='------ start to attach process ------',
     post_run_msg='------ attach process completed ------'
 )
-def attach_process(test_conf: DiagToolsTestConfiguration):
+def attach_process(test_conf: DiagToolsTestConfiguration, app_pool: TargetAppPool=None):
     '''Attach then debug a process
     
     '''
     if isinstance(SysInfo.debugger, Exception):
         return SysInfo.debugger
     
-    webapp_process = target_app.run_webapp(test_conf)
-    if isinstance(webapp_process, Exception):
-        return webapp_process
-    
-    analyze_output = os.path.join(test_conf.test_result_folder, 'sos_process_debug.log')
-    analyze_commands = __get_analyze_commands(SysInfo.rid)
-
-    if 'win' in SysInfo.rid:
-        debug_script = os.path.join(
-            test_conf.test_bed,
-            'cdb_debug_script'
-        )
-        with open(debug_script, 'wb+') as fs:
-            fs.writelines(analyze_commands)
-
-        args = [SysInfo.debugger, '-p', str(webapp_process.pid), '-cf', debug_script]
-        with open(analyze_output, 'wb+') as fp:
-            command, proc = terminal.run_command_async(args, stdout=fp, stderr=fp, env=test_conf.env)
-            proc.communicate()
-    else:
-        args = [SysInfo.debugger, '-p', str(webapp_process.pid)]
-        with open(analyze_output, 'wb+') as fp:
-            command, proc = terminal.run_command_async(args, stdin=PIPE, stdout=fp, stderr=fp, env=test_conf.env)
-            for command in analyze_commands:
-                try:
-                    proc.stdin.write(command)
-                except Exception as exception:
-                    fp.write(f'{exception}\n'.encode('utf-8'))
-                    continue
-            proc.communicate()
-
-    webapp_process.terminate()
-    while webapp_process.poll() is None:
-        time.sleep(1)
\ No newline at end of file
+    with target_app_pool.lease_target_app(test_conf, 'webapp', app_pool, destructive=True) as webapp_process:
+        if isinstance(webapp_process, Exception):
+            return webapp_process
+
+        analyze_output = os.path.join(test_conf.test_result_folder, 'sos_process_debug.log')
+        analyze_commands = __get_analyze_commands(SysInfo.rid)
+
+        if 'win' in SysInfo.rid:
+            debug_script = os.path.join(
+                test_conf.test_bed,
+                'cdb_debug_script'
+            )
+            with open(debug_script, 'wb+') as fs:
+                fs.writelines(analyze_commands)
+
+            args = [SysInfo.debugger, '-p', str(webapp_process.pid), '-cf', debug_script]
+            with open(analyze_output, 'wb+') as fp:
+                command, proc = terminal.run_command_async(args, stdout=fp, stderr=fp, env=test_conf.env)
+                proc.communicate()
+        else:
+            args = [SysInfo.debugger, '-p', str(webapp_process.pid)]
+            with open(analyze_output, 'wb+') as fp:
+                command, proc = terminal.run_command_async(args, stdin=PIPE, stdout=fp, stderr=fp, env=test_conf.env)
+                for command in analyze_commands:
+                    try:
+                        proc.stdin.write(command)
+                    except Exception as exception:
+                        fp.write(f'{exception}\n'.encode('utf-8'))
+                        continue
+                proc.communicate()
\ No newline at end of file
@@ -5,14 +5,15 @@ import app
 from tools import dotnet_tool
 from tools import terminal
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
-from DiagnosticTools import target_app
+from DiagnosticTools import target_app_pool
+from DiagnosticTools.target_app_pool import TargetAppPool
 
 
 @app.function_monitor(
     pre_run_msg='------ start to test dotnet-stack ------',
     post_run_msg='------ test dotnet-stack completed ------'
 )
-def test_dotnet_stack(test_conf: DiagToolsTestConfiguration):
+def test_dotnet_stack(test_conf: DiagToolsTestConfiguration, app_pool: TargetAppPool=None):
     '''Run sample apps and perform tests.
 
     '''
@@ -24,22 +25,26 @@ def test_dotnet_stack(test_conf: DiagToolsTestConfiguration):
     if isinstance(tool_dll_path, Exception):
         return tool_dll_path
         
-    webapp_process = target_app.run_webapp(test_conf)
-    if isinstance(webapp_process, Exception):
-        return webapp_process
+    with target_app_pool.lease_target_app(test_conf, 'webapp', app_pool) as webapp_process:
+        if isinstance(webapp_process, Exception):
+            return webapp_process
 
-    sync_args_list = [
-        [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'report', '-p', str(webapp_process.pid)],
-    ]
-    for args in sync_args_list:
+        sync_args_list = [
+            [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
+        ]
+        for args in sync_args_list:
+            _, outs, errs = terminal.run_command_sync(
+                args,
+                cwd=test_conf.test_result_folder,
+                env=test_conf.env,
+            )
+
+        start = time.perf_counter()
         _, outs, errs = terminal.run_command_sync(
-            args,
+            [test_conf.dotnet_bin_path, tool_dll_path, 'report', '-p', str(webapp_process.pid)],
             cwd=test_conf.test_result_folder,
             env=test_conf.env,
         )
-
-    webapp_process.terminate()
-    while webapp_process.poll() is None:
-        time.sleep(1)
\ No newline at end of file
+        target_app_pool.report_command_time(
+            app_pool, 'dotnet-stack', 'report', time.perf_counter() - start)
\ No newline at end of file
@@ -4,16 +4,23 @@ import time
 import app
 from tools import dotnet_tool
 from tools import terminal
+from tools import waiter
 from tools import dotnet_app
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
-from DiagnosticTools import target_app
+from DiagnosticTools import target_app_pool
+from DiagnosticTools.target_app_pool import TargetAppPool
 
 
+TRACE_DURATION_SECS = 10
+# seconds to wait for collect to attach, and for it to exit after its duration
+TRACE_ATTACH_TIMEOUT = 30
+TRACE_STOP_TIMEOUT = 60
+
 @app.function_monitor(
     pre_run_msg='------ start to test dotnet-trace ------',
     post_run_msg='------ test dotnet-trace completed ------'
 )
-def test_dotnet_trace(test_conf: DiagToolsTestConfiguration):
+def test_dotnet_trace(test_conf: DiagToolsTestConfiguration, app_pool: TargetAppPool=None):
     '''Run sample apps and perform tests.
 
     '''
@@ -25,28 +32,49 @@ def test_dotnet_trace(test_conf: DiagToolsTestConfiguration):
     if isinstance(tool_dll_path, Exception):
         return tool_dll_path
         
-    webapp_process = target_app.run_webapp(test_conf)
-    if isinstance(webapp_process, Exception):
-        return webapp_process
+    with target_app_pool.lease_target_app(test_conf, 'webapp', app_pool) as webapp_process:
+        if isinstance(webapp_process, Exception):
+            return webapp_process
 
-    sync_args_list = [
-        [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'list-profiles'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 
-         'collect', '-p', str(webapp_process.pid), '-o', 'webapp.nettrace', '--duration', '00:00:10'],
-        [test_conf.dotnet_bin_path, tool_dll_path, 'convert', '--format', 'speedscope', 'webapp.nettrace']
-    ]
-    for args in sync_args_list:
-        _, outs, errs = terminal.run_command_sync(
-            args,
+        sync_args_list = [
+            [test_conf.dotnet_bin_path, tool_dll_path, '--help'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'list-profiles'],
+            [test_conf.dotnet_bin_path, tool_dll_path, 'ps'],
+        ]
+        for args in sync_args_list:
+            _, outs, errs = terminal.run_command_sync(
+                args,
+                cwd=test_conf.test_result_folder,
+                env=test_conf.env,
+            )
+
+        # collect prints output file once its EventPipe session is started
+        start = time.perf_counter()
+        result = terminal.run_command_until_ready(
+            [test_conf.dotnet_bin_path, tool_dll_path,
+             'collect', '-p', str(webapp_process.pid), '-o', 'webapp.nettrace',
+             '--duration', f'00:00:{TRACE_DURATION_SECS:02d}'],
+            r'Output File\s*:',
+            os.path.join(test_conf.test_result_folder, 'webapp_trace_collect.log'),
+            TRACE_ATTACH_TIMEOUT,
             cwd=test_conf.test_result_folder,
             env=test_conf.env,
         )
+        if isinstance(result, Exception):
+            return result
+        target_app_pool.report_attach_latency(
+            app_pool, 'dotnet-trace', 'collect', time.perf_counter() - start)
+        _, p = result
+        returncode = waiter.wait_for_process_exit(p, TRACE_DURATION_SECS + TRACE_STOP_TIMEOUT)
+        if isinstance(returncode, Exception):
+            waiter.terminate_process(p)
+            return Exception(f'dotnet-trace collect doesn\'t stop after its duration: {returncode}')
 
-    webapp_process.terminate()
-    while webapp_process.poll() is None:
-        time.sleep(1)
+        _, outs, errs = terminal.run_command_sync(
+            [test_conf.dotnet_bin_path, tool_dll_path, 'convert', '--format', 'speedscope', 'webapp.nettrace'],
+            cwd=test_conf.test_result_folder,
+            env=test_conf.env,
+        )
     
     console_app_root = os.path.join(test_conf.test_bed, 'console')
     console_app_bin = dotnet_app.get_app_bin('console', console_app_root)
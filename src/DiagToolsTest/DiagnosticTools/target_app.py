@@ -1,7 +1,6 @@
 '''Create, build and run app for diag tools testing'''
 
 import os
-import time
 import shutil
 from subprocess import Popen
 from typing import Union
@@ -9,13 +8,19 @@ from typing import Union
 import app
 from tools import dotnet_app
 from tools import terminal
+from tools.port_allocator import port_allocator
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
 
 
+# seconds to wait for ready line of target apps, first launch includes JIT and startup
+APP_READY_TIMEOUT = 120
+# webapp is started again on another port if the port is taken before it binds
+WEBAPP_START_ATTEMPTS = 3
 
-@app.function_monitor(pre_run_msg='create and build console app for diag tool test.')
-def create_build_console_app(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
-    '''create and build console app
+
+@app.function_monitor(pre_run_msg='create console app for diag tool test.')
+def create_console_app(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
+    '''create console app without building it
 
     :param test_conf: test configuration
     :return: path to the project or exception if fail to create
@@ -39,12 +44,36 @@ def create_build_console_app(test_conf: DiagToolsTestConfiguration) -> Union[str
         shutil.copy(src_code_path, dest_code_path)
     except Exception as ex:
         return Exception(f'fail to modify console app source code: {ex}')
+    return app_root
+
+
+@app.function_monitor(pre_run_msg='create and build console app for diag tool test.')
+def create_build_console_app(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
+    '''create and build console app
+
+    :param test_conf: test configuration
+    :return: path to the project or exception if fail to create
+    '''
+    app_root = create_console_app(test_conf)
+    if isinstance(app_root, Exception):
+        return app_root
 
     # build app 
     app_root = dotnet_app.build_app(test_conf.dotnet_bin_path, app_root, test_conf.env)
     return app_root
 
 
+@app.function_monitor(pre_run_msg='create webapp for diag tool test.')
+def create_webapp(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
+    '''create webapp without building it
+
+    :param test_conf: test configuration
+    :return: path to the project or exception if fail to create
+    '''
+    app_root = os.path.join(test_conf.test_bed, 'webapp')
+    return dotnet_app.create_new_app(test_conf.dotnet_bin_path, 'webapp', app_root, test_conf.env)
+
+
 @app.function_monitor(pre_run_msg='create and build webapp for diag tool test.')
 def create_build_webapp(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
     '''create and build webapp
@@ -53,8 +82,7 @@ def create_build_webapp(test_conf: DiagToolsTestConfiguration) -> Union[str, Exc
     :return: path to the project or exception if fail to create
     '''
     # create app
-    app_root = os.path.join(test_conf.test_bed, 'webapp')
-    app_root = dotnet_app.create_new_app(test_conf.dotnet_bin_path, 'webapp', app_root, test_conf.env)
+    app_root = create_webapp(test_conf)
 
     # build app 
     app_root = dotnet_app.build_app(test_conf.dotnet_bin_path, app_root, test_conf.env)
@@ -63,7 +91,11 @@ def create_build_webapp(test_conf: DiagToolsTestConfiguration) -> Union[str, Exc
 
 @app.function_monitor(pre_run_msg='run webapp for diag tool test.')
 def run_webapp(test_conf: DiagToolsTestConfiguration) -> Union[Popen, Exception]:
-    '''Run webapp
+    '''Run webapp on a free port
+
+    The port is passed through ASPNETCORE_URLS instead of binding default Kestrel ports,
+    so webapps of several testbeds can run at the same time. It's recorded with the process
+    in port allocator and released when the process exits.
 
     :param test_conf: test configuration
     :return: Popen instance or exception if fail to create
@@ -74,27 +106,35 @@ def run_webapp(test_conf: DiagToolsTestConfiguration) -> Union[Popen, Exception]
         return project_bin_path
 
     tmp_path = os.path.join(app_root, 'tmp')
-    with open (tmp_path, 'w+') as tmp_write:
-        command, proc = terminal.run_command_async(
-            project_bin_path,
-            stdout=tmp_write,
-            env=test_conf.env
+    for _ in range(WEBAPP_START_ATTEMPTS):
+        try:
+            port = port_allocator.allocate()
+        except OSError as ex:
+            return ex
+        env = test_conf.env.copy()
+        env['ASPNETCORE_URLS'] = f'http://{port_allocator.host}:{port}'
+        result = terminal.run_command_until_ready(
+            [project_bin_path],
+            r'Application started',
+            tmp_path,
+            APP_READY_TIMEOUT,
+            env=env
         )
-    with open(tmp_path, 'r') as tmp_read:
-        while True:
-            if 'Application started' in tmp_read.read():
-                print('webapp is running!')
-                tmp_read.close()
-                break
-            else:
-                time.sleep(2)
-                
+        if not isinstance(result, Exception):
+            break
+        # the port may be taken by a process outside of test
+        port_allocator.release(port)
+    if isinstance(result, Exception):
+        return result
+    command, proc = result
+    port_allocator.attach(port, proc)
+    print(f'webapp is running on port {port}!')
     return proc
 
 
 @app.function_monitor(pre_run_msg='create GCDumpPlayground2 for diag tool test.')
-def create_build_gc_dump_playground2(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
-    '''create and build GCDumpPlayground2
+def create_gc_dump_playground2(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
+    '''create GCDumpPlayground2 without building it
 
     :param test_conf: test configuration
     :return: path to the project or exception if fail to create
@@ -118,6 +158,19 @@ def create_build_gc_dump_playground2(test_conf: DiagToolsTestConfiguration) -> U
         shutil.copy(src_code_path, dest_code_path)
     except Exception as ex:
         return Exception(f'fail to modify GCDumpPlayground2 source code: {ex}')
+    return app_root
+
+
+@app.function_monitor(pre_run_msg='create and build GCDumpPlayground2 for diag tool test.')
+def create_build_gc_dump_playground2(test_conf: DiagToolsTestConfiguration) -> Union[str, Exception]:
+    '''create and build GCDumpPlayground2
+
+    :param test_conf: test configuration
+    :return: path to the project or exception if fail to create
+    '''
+    app_root = create_gc_dump_playground2(test_conf)
+    if isinstance(app_root, Exception):
+        return app_root
 
     # build app 
     app_root = dotnet_app.build_app(test_conf.dotnet_bin_path, app_root, test_conf.env)
@@ -137,20 +190,15 @@ def run_gc_dump_playground2(test_conf: DiagToolsTestConfiguration) -> Union[Pope
         return project_bin_path
 
     tmp_path = os.path.join(app_root, 'tmp')
-    with open (tmp_path, 'w+') as tmp_write:
-        command, proc = terminal.run_command_async(
-            [project_bin_path, '0.05'],
-            stdout=tmp_write,
-            env=test_conf.env
-        )
-        
-    with open(tmp_path, 'r') as tmp_read:
-        while True:
-            if 'Pause for gcdumps.' in tmp_read.read():
-                print('GCDumpPlayground2 is running!')
-                tmp_read.close()
-                break
-            else:
-                time.sleep(2)
-                
+    result = terminal.run_command_until_ready(
+        [project_bin_path, '0.05'],
+        r'Pause for gcdumps\.',
+        tmp_path,
+        APP_READY_TIMEOUT,
+        env=test_conf.env
+    )
+    if isinstance(result, Exception):
+        return result
+    print('GCDumpPlayground2 is running!')
+    command, proc = result
     return proc
\ No newline at end of file
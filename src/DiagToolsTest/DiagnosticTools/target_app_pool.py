@@ -0,0 +1,188 @@
+'''Keep target apps running across diag tool tests'''
+
+import threading
+from contextlib import contextmanager
+from subprocess import Popen
+from typing import Callable, Iterator, Optional, Union
+
+import app
+from tools import waiter
+from DiagnosticTools import target_app
+from DiagnosticTools.configuration import DiagToolsTestConfiguration
+
+
+# timings reported by tool tests
+ATTACH_LATENCY = 'attach latency'
+COMMAND_TIME = 'command time'
+
+
+class _PooledApp:
+    '''Running instance of a target app and the leases on it.
+    '''
+    def __init__(self, launcher: Callable[[DiagToolsTestConfiguration], Union[Popen, Exception]]):
+        '''
+        :param launcher: function starting the app and returning once it's ready
+        '''
+        self.launcher = launcher
+        self.process: Optional[Popen] = None
+        self.shared_lease_count = 0
+        self.exclusive_leased = False
+        self.condition = threading.Condition()
+
+
+class TargetAppPool:
+    '''Start each target app once and lend it to tests.
+
+    Tests that only attach without harming the app(ps, stack report, counters, trace) share
+    an instance. A destructive test(dump collect, debugger attach) waits for shared leases to
+    end, gets the instance alone, and the instance is replaced by the next lease.
+    '''
+    def __init__(self, test_conf: DiagToolsTestConfiguration):
+        '''
+        :param test_conf: test configuration
+        '''
+        self.__test_conf = test_conf
+        self.__app_map = {
+            'webapp': _PooledApp(target_app.run_webapp),
+            'GCDumpPlayground2': _PooledApp(target_app.run_gc_dump_playground2),
+        }
+        self.__timing_list: list[tuple[str, str, str, float]] = list()
+        self.__timing_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @contextmanager
+    def lease(self, app_name: str, destructive: bool=False) -> Iterator[Union[Popen, Exception]]:
+        '''Lend a running instance of app, starting one if there isn't.
+
+        :param app_name: webapp or GCDumpPlayground2
+        :param destructive: whether the test may leave the app unusable
+        :return: context manager yielding Popen instance, or exception if the app fails to start
+        '''
+        pooled_app = self.__app_map[app_name]
+        with pooled_app.condition:
+            if destructive:
+                pooled_app.condition.wait_for(
+                    lambda: pooled_app.shared_lease_count == 0 and not pooled_app.exclusive_leased)
+                pooled_app.exclusive_leased = True
+            else:
+                pooled_app.condition.wait_for(lambda: not pooled_app.exclusive_leased)
+                pooled_app.shared_lease_count += 1
+
+            if pooled_app.process is None or pooled_app.process.poll() is not None:
+                pooled_app.process = None
+                process = pooled_app.launcher(self.__test_conf)
+                if not isinstance(process, Exception):
+                    pooled_app.process = process
+            else:
+                process = pooled_app.process
+
+        try:
+            yield process
+        finally:
+            with pooled_app.condition:
+                if destructive:
+                    if pooled_app.process is not None:
+                        waiter.terminate_process(pooled_app.process)
+                        pooled_app.process = None
+                    pooled_app.exclusive_leased = False
+                else:
+                    pooled_app.shared_lease_count -= 1
+                pooled_app.condition.notify_all()
+
+    def record_timing(self, tool_name: str, command: str, metric: str, elapsed_secs: float):
+        '''Keep a timing of a tool command run against a pooled app.
+
+        :param tool_name: tool name
+        :param command: tool command, e.g. report
+        :param metric: ATTACH_LATENCY or COMMAND_TIME
+        :param elapsed_secs: seconds
+        '''
+        with self.__timing_lock:
+            self.__timing_list.append((tool_name, command, metric, elapsed_secs))
+
+    @property
+    def timing_list(self) -> list[tuple[str, str, str, float]]:
+        '''Get recorded (tool name, command, metric, seconds) in recording order.
+        '''
+        with self.__timing_lock:
+            return list(self.__timing_list)
+
+    def close(self):
+        '''Terminate all running apps.
+        '''
+        for pooled_app in self.__app_map.values():
+            with pooled_app.condition:
+                if pooled_app.process is not None:
+                    waiter.terminate_process(pooled_app.process)
+                    pooled_app.process = None
+
+
+@contextmanager
+def lease_target_app(test_conf: DiagToolsTestConfiguration,
+                     app_name: str,
+                     app_pool: Optional[TargetAppPool]=None,
+                     destructive: bool=False) -> Iterator[Union[Popen, Exception]]:
+    '''Lease app from pool, or run an instance for the caller alone if pool is None.
+
+    :param test_conf: test configuration
+    :param app_name: webapp or GCDumpPlayground2
+    :param app_pool: TargetAppPool instance
+    :param destructive: whether the test may leave the app unusable
+    :return: context manager yielding Popen instance, or exception if the app fails to start
+    '''
+    if app_pool is None:
+        with TargetAppPool(test_conf) as private_pool, private_pool.lease(app_name, destructive) as process:
+            yield process
+    else:
+        with app_pool.lease(app_name, destructive) as process:
+            yield process
+
+
+def _report_timing(app_pool: Optional[TargetAppPool],
+                   tool_name: str,
+                   command: str,
+                   metric: str,
+                   elapsed_secs: float):
+    message = f'{tool_name} {command}: {metric} {elapsed_secs:.2f}s'
+    print(message)
+    if app.get_logger() is not None:
+        app.get_logger().info(message)
+    if app_pool is not None:
+        app_pool.record_timing(tool_name, command, metric, elapsed_secs)
+
+
+def report_attach_latency(app_pool: Optional[TargetAppPool],
+                          tool_name: str,
+                          command: str,
+                          elapsed_secs: float):
+    '''Log time from starting a tool command to its first output telling it's attached
+    to target app, and record it in pool.
+
+    :param app_pool: TargetAppPool instance, latency is only logged if it's None
+    :param tool_name: tool name
+    :param command: tool command, e.g. collect
+    :param elapsed_secs: seconds from starting command to its attach signal
+    '''
+    _report_timing(app_pool, tool_name, command, ATTACH_LATENCY, elapsed_secs)
+
+
+def report_command_time(app_pool: Optional[TargetAppPool],
+                        tool_name: str,
+                        command: str,
+                        elapsed_secs: float):
+    '''Log wall time of a tool command run against target app and record it in pool.
+
+    It's used for commands printing nothing before they finish, e.g. stack report and
+    dump collect, so the time covers tool startup and the work of command, not only attaching.
+
+    :param app_pool: TargetAppPool instance, time is only logged if it's None
+    :param tool_name: tool name
+    :param command: tool command, e.g. report
+    :param elapsed_secs: wall time(seconds) of command
+    '''
+    _report_timing(app_pool, tool_name, command, COMMAND_TIME, elapsed_secs)
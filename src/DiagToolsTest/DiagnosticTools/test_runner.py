@@ -1,14 +1,19 @@
 import os
+import time
 import shutil
 from typing import Union
+from concurrent.futures import ThreadPoolExecutor
 
 import app
 from app import AppLogger
 from tools import sdk_runtime
 from tools import dotnet_tool
+from tools import dotnet_app
 from tools.sysinfo import SysInfo
 from DiagnosticTools import target_app
 from DiagnosticTools.configuration import DiagToolsTestConfiguration
+from DiagnosticTools import target_app_pool
+from DiagnosticTools.target_app_pool import TargetAppPool
 from DiagnosticTools import dotnet_counters
 from DiagnosticTools import dotnet_dump
 from DiagnosticTools import dotnet_gcdump
@@ -70,13 +75,26 @@ def install_DotNET_SDK(test_conf: DiagToolsTestConfiguration) -> Union[None, Exc
 
 def install_diagnostic_tools(test_conf: DiagToolsTestConfiguration) -> Union[None, Exception]:
     '''Install diagnostic tools
+
+    Tool packages are mirrored once into a local feed under testbed root,
+    then tools are installed concurrently from the mirror.
     
     :param test_conf: DiagToolsTestConfiguration instance
     '''
     log_file_path = os.path.join(test_conf.test_result_folder, 'tool_install.log')
     app.logger = AppLogger('Tools Installation', log_file_path)
 
-    for tool_name in test_conf.diag_tool_to_install:
+    config_file_path = dotnet_tool.mirror_tool_feed(
+        test_conf.diag_tool_to_install,
+        test_conf.diag_tool_version,
+        test_conf.diag_tool_feed,
+        os.path.join(test_conf.testbed_root, 'nuget-mirror')
+    )
+    if isinstance(config_file_path, Exception):
+        app.get_logger().error(f'install tools from {test_conf.diag_tool_feed}: {config_file_path}')
+        config_file_path = None
+
+    def install(tool_name: str):
         try:
             dotnet_tool.install_tool(
                 test_conf.dotnet_bin_path,
@@ -84,35 +102,87 @@ def install_diagnostic_tools(test_conf: DiagToolsTestConfiguration) -> Union[Non
                 test_conf.diag_tool_root,
                 test_conf.diag_tool_version,
                 test_conf.diag_tool_feed,
-                test_conf.env)
+                test_conf.env,
+                config_file_path)
 
         except Exception as ex:
-            app.logger.error(f'fail to install tool {tool_name}: {ex}')
-            continue
+            app.get_logger().error(f'fail to install tool {tool_name}: {ex}')
+
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(install, test_conf.diag_tool_to_install))
 
 
 def prepare_sample_app(test_conf: DiagToolsTestConfiguration) -> Union[None, Exception]:
     '''Create and build some .NET app for testing
+
+    Apps are restored once against a packages folder in testbed and then built concurrently,
+    so MSBuild nodes and compiler server started by the first build are reused by the others.
+    Build servers are shut down at the end.
     
     :param test_conf: DiagToolsTestConfiguration instance
     '''
     log_file_path = os.path.join(test_conf.test_result_folder, 'dotnet_app.log')
     app.logger = AppLogger('.NET app Create and Build', log_file_path)
 
+    app_creator_map = {
+        'webapp': target_app.create_webapp,
+        'console': target_app.create_console_app,
+        'GCDumpPlayground2': target_app.create_gc_dump_playground2
+    }
+    packages_folder = os.path.join(test_conf.test_bed, 'packages')
+
+    app_root_list = []
+    error_list = []
     for app_name in test_conf.app_to_create:
+        if app_name not in app_creator_map:
+            print(f'unknown app {app_name}')
+            continue
         try:
-            if app_name == 'webapp':
-                target_app.create_build_webapp(test_conf)
-            elif app_name == 'console':
-                target_app.create_build_console_app(test_conf)
-            elif app_name == 'GCDumpPlayground2':
-                target_app.create_build_gc_dump_playground2(test_conf)
-            else:
-                print(f'unknown app {app_name}')
+            app_root = app_creator_map[app_name](test_conf)
+            if isinstance(app_root, Exception):
+                error_list.append(f'fail to create {app_name}: {app_root}')
+                continue
+            app_root = dotnet_app.restore_app(
+                test_conf.dotnet_bin_path, app_root, test_conf.env, packages_folder)
+            if isinstance(app_root, Exception):
+                error_list.append(f'fail to restore {app_name}: {app_root}')
+                continue
+            app_root_list.append(app_root)
         except Exception as ex:
-            app.logger.error(f'fail to create {app_name}: {ex}')
+            app.get_logger().error(f'fail to create {app_name}: {ex}')
+            error_list.append(f'fail to create {app_name}: {ex}')
             continue
 
+    with ThreadPoolExecutor() as executor:
+        future_list = [
+            executor.submit(
+                dotnet_app.build_app,
+                test_conf.dotnet_bin_path,
+                app_root,
+                test_conf.env,
+                no_restore=True
+            )
+            for app_root in app_root_list
+        ]
+        for app_root, future in zip(app_root_list, future_list):
+            try:
+                result = future.result()
+            except Exception as ex:
+                result = ex
+                app.get_logger().error(f'fail to build {app_root}: {ex}')
+            if isinstance(result, Exception):
+                error_list.append(f'fail to build {app_root}: {result}')
+
+    result = dotnet_app.shutdown_build_server(test_conf.dotnet_bin_path, test_conf.env)
+    if isinstance(result, Exception):
+        error_list.append(str(result))
+
+    if len(error_list) == 0:
+        return None
+    ex = Exception(f'fail to prepare sample app: {"; ".join(error_list)}')
+    app.get_logger().error(str(ex))
+    return ex
+
 
 def clean_temp(test_conf: DiagToolsTestConfiguration) -> Union[None, Exception]:
     if 'win' in SysInfo.rid: home_path = os.environ['USERPROFILE']
@@ -153,6 +223,39 @@ def restore_temp(test_conf: DiagToolsTestConfiguration) -> Union[None, Exception
             print(f'fail to retore {temp_file_folder}: {e}')
 
 
+# how a tool interferes with the target app:
+# eventpipe - only opens EventPipe sessions, so several of them can attach at the same time
+# suspend   - suspends the target app to write a dump
+# debugger  - attaches a native debugger
+TOOL_INTERFERENCE_MAP = {
+    'dotnet-counters': 'eventpipe',
+    'dotnet-dump': 'suspend',
+    'dotnet-gcdump': 'eventpipe',
+    'dotnet-sos': 'debugger',
+    'dotnet-stack': 'eventpipe',
+    'dotnet-trace': 'eventpipe'
+}
+
+
+def _run_tool_test(test_conf: DiagToolsTestConfiguration,
+                   tool_name: str,
+                   runner: callable,
+                   app_pool: TargetAppPool) -> float:
+    '''Run test of a tool with its own log file
+
+    :param test_conf: DiagToolsTestConfiguration instance
+    :param tool_name: tool name
+    :param runner: test function of the tool
+    :param app_pool: TargetAppPool instance
+    :return: elapsed time(seconds)
+    '''
+    log_file_path = os.path.join(test_conf.test_result_folder, f'{tool_name}.log')
+    with app.thread_logger(AppLogger(f'test {tool_name}', log_file_path)):
+        start = time.perf_counter()
+        runner(test_conf, app_pool)
+        return time.perf_counter() - start
+
+
 def run_test(test_conf: DiagToolsTestConfiguration) -> Union[None, Exception]:
     tool_name_runner_map = {
         'dotnet-counters': dotnet_counters.test_dotnet_counters,
@@ -162,8 +265,46 @@ def run_test(test_conf: DiagToolsTestConfiguration) -> Union[None, Exception]:
         'dotnet-stack': dotnet_stack.test_dotnet_stack,
         'dotnet-trace': dotnet_trace.test_dotnet_trace
     }
-    for tool_name in test_conf.diag_tool_to_test:
-        log_file_path = os.path.join(test_conf.test_result_folder, f'{tool_name}.log')
-        app.logger = AppLogger(f'test {tool_name}', log_file_path)
-        runner = tool_name_runner_map[tool_name]
-        runner(test_conf)
+    if test_conf.concurrent_tests:
+        concurrent_tool_list = [
+            tool_name for tool_name in test_conf.diag_tool_to_test
+            if TOOL_INTERFERENCE_MAP[tool_name] == 'eventpipe'
+        ]
+    else:
+        concurrent_tool_list = []
+    # keep configured order, e.g. dotnet-sos debugs the dump written by dotnet-dump
+    sequential_tool_list = [
+        tool_name for tool_name in test_conf.diag_tool_to_test
+        if tool_name not in concurrent_tool_list
+    ]
+
+    # target apps are started once and lent to tests
+    with TargetAppPool(test_conf) as app_pool:
+        elapsed_map = dict()
+        if len(concurrent_tool_list) > 0:
+            with ThreadPoolExecutor(max_workers=len(concurrent_tool_list)) as executor:
+                future_map = {
+                    tool_name: executor.submit(
+                        _run_tool_test, test_conf, tool_name, tool_name_runner_map[tool_name], app_pool)
+                    for tool_name in concurrent_tool_list
+                }
+                for tool_name, future in future_map.items():
+                    elapsed_map[tool_name] = future.result()
+        for tool_name in sequential_tool_list:
+            elapsed_map[tool_name] = _run_tool_test(
+                test_conf, tool_name, tool_name_runner_map[tool_name], app_pool)
+
+        summary_lines = ['diag tool test summary:']
+        for tool_name in test_conf.diag_tool_to_test:
+            mode = 'concurrent' if tool_name in concurrent_tool_list else 'alone'
+            summary_lines.append(f'    {tool_name}({mode}): {elapsed_map[tool_name]:.1f}s')
+        timing_list = app_pool.timing_list
+        for metric in [target_app_pool.ATTACH_LATENCY, target_app_pool.COMMAND_TIME]:
+            summary_lines.append(f'tool {metric}:')
+            for tool_name, command, timing_metric, elapsed_secs in timing_list:
+                if timing_metric == metric:
+                    summary_lines.append(f'    {tool_name} {command}: {elapsed_secs:.2f}s')
+        summary = '\n'.join(summary_lines)
+        print(summary)
+        with open(os.path.join(test_conf.test_result_folder, 'test_summary.log'), 'w') as fp:
+            fp.write(f'{summary}\n')
@@ -77,7 +77,7 @@ def prepare_sample_app(run_conf: RunConfiguration) -> Union[None, Exception]:
     try:
         target_app.create_gcperfsim(run_conf)
     except Exception as ex:
-        app.logger.error(f'fail to create gcperfsim: {ex}')
+        app.get_logger().error(f'fail to create gcperfsim: {ex}')
 
 
 def clean_temp(run_conf: RunConfiguration) -> Union[None, Exception]:
@@ -1,6 +1,8 @@
 
 import os
 import logging
+import threading
+from contextlib import contextmanager
  
 
 # App logger
@@ -27,22 +29,22 @@ def function_monitor(pre_run_msg: str=None, post_run_msg: str=None):
             # print or log pre-run message
             if pre_run_msg is not None:
                 print(pre_run_msg)
-                if logger is not None:
-                    logger.info(pre_run_msg)
+                if get_logger() is not None:
+                    get_logger().info(pre_run_msg)
 
             # run the function
             result = func(*args, **kwargs)
             if isinstance(result, Exception):
-                if logger is not None:
-                    logger.error(f'fail to run function {func.__name__}: {result}')
+                if get_logger() is not None:
+                    get_logger().error(f'fail to run function {func.__name__}: {result}')
                 else:
                     print(f'fail to run function {func.__name__}: {result}')
 
             # print or log post-run message
             if post_run_msg is not None:
                 print(post_run_msg)
-                if logger is not None:
-                    logger.info(post_run_msg)
+                if get_logger() is not None:
+                    get_logger().info(post_run_msg)
                     
             return result
         return wrapper
@@ -51,4 +53,29 @@ def function_monitor(pre_run_msg: str=None, post_run_msg: str=None):
 
 # global instances
 script_root = os.path.dirname(__file__)
-logger: AppLogger = None
\ No newline at end of file
+logger: AppLogger = None
+_thread_state = threading.local()
+
+
+def get_logger() -> AppLogger:
+    '''Get logger bound to current thread, or the global one if none is bound
+    '''
+    if getattr(_thread_state, 'bound', False):
+        return _thread_state.logger
+    return logger
+
+
+@contextmanager
+def thread_logger(logger: AppLogger):
+    '''Bind a logger to current thread, so `get_logger()` returns it until the block ends
+    and tests running in other threads keep their own log files
+
+    :param logger: AppLogger instance
+    '''
+    previous = (getattr(_thread_state, 'bound', False), getattr(_thread_state, 'logger', None))
+    _thread_state.bound = True
+    _thread_state.logger = logger
+    try:
+        yield logger
+    finally:
+        _thread_state.bound, _thread_state.logger = previous
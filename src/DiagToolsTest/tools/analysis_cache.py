@@ -0,0 +1,199 @@
+'''Cache transcripts and parsed records of dump analysis.
+'''
+import os
+import mmap
+import pickle
+import shutil
+import hashlib
+import threading
+from typing import Optional, Union
+
+from tools import sos_parser
+
+
+# dumps are hashed in large blocks so that hashing is bound by disk rather than by calls
+DUMP_HASH_BLOCK_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+
+
+def hash_dump(dump_path: str, block_size: int=DUMP_HASH_BLOCK_SIZE) -> str:
+    '''Compute sha256 of a dump through a read-only memory map
+
+    :param dump_path: dump path
+    :param block_size: bytes hashed per call
+    :return: hex digest
+    '''
+    hasher = hashlib.sha256()
+    with open(dump_path, 'rb') as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size == 0:
+            return hasher.hexdigest()
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for offset in range(0, size, block_size):
+                with view[offset:offset + block_size] as block:
+                    hasher.update(block)
+    return hasher.hexdigest()
+
+
+class AnalysisResultCache:
+    '''Keep transcripts of dump analysis with their parsed records.
+
+    Entries are keyed by dump content, tool version and commands, and the least recently
+    used ones are removed when the cache grows beyond its size limit.
+    '''
+    TRANSCRIPT_FILE_NAME = 'transcript.log'
+    RECORDS_FILE_NAME = 'records.pickle'
+    # mtime of the marker is the last time the entry is used
+    COMPLETE_MARKER = '.analysis-complete'
+
+    def __init__(self, cache_root: str, max_size: int=DEFAULT_MAX_CACHE_SIZE):
+        '''
+        :param cache_root: cache folder
+        :param max_size: maximum size(bytes) of cache
+        '''
+        self.__cache_root = cache_root
+        self.__max_size = max_size
+        self.__lock = threading.Lock()
+
+    @property
+    def cache_root(self) -> str:
+        '''Get cache folder.
+        '''
+        return self.__cache_root
+
+    @staticmethod
+    def compute_key(dump_path: str, tool_version: str, command_list: list[Union[str, bytes]]) -> str:
+        '''Compute cache key of an analysis.
+
+        :param dump_path: dump path
+        :param tool_version: version of analyzer, e.g. `dotnet-dump 9.0.553101`
+        :param command_list: commands written to analyzer
+        :return: cache key
+        '''
+        hasher = hashlib.sha256()
+        hasher.update(hash_dump(dump_path).encode('utf-8'))
+        hasher.update(b'\0')
+        hasher.update(tool_version.encode('utf-8'))
+        for command in command_list:
+            hasher.update(b'\0')
+            hasher.update(sos_parser.normalize_command(command).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def get_entry_path(self, key: str) -> str:
+        '''Get folder of a cache entry.
+
+        :param key: cache key
+        :return: entry folder
+        '''
+        return os.path.join(self.__cache_root, key)
+
+    def restore(self, key: str, transcript_path: str) -> Optional[list[sos_parser.SOSRecord]]:
+        '''Copy cached transcript to transcript path and load its records.
+
+        :param key: cache key
+        :param transcript_path: path the transcript is expected at
+        :return: a list of record, or None if cache is missed
+        '''
+        entry_path = self.get_entry_path(key)
+        with self.__lock:
+            try:
+                with open(os.path.join(entry_path, self.RECORDS_FILE_NAME), 'rb') as fp:
+                    record_list = pickle.load(fp)
+                shutil.copyfile(os.path.join(entry_path, self.TRANSCRIPT_FILE_NAME), transcript_path)
+                os.utime(os.path.join(entry_path, self.COMPLETE_MARKER))
+            except (OSError, pickle.UnpicklingError, EOFError):
+                # missing entry, or an entry removed by another process in the meantime
+                return None
+        return record_list
+
+    def store(self, key: str, transcript_path: str, record_list: list[sos_parser.SOSRecord]) -> None:
+        '''Save transcript and its records, then evict entries beyond size limit.
+
+        :param key: cache key
+        :param transcript_path: transcript path
+        :param record_list: records parsed from transcript
+        '''
+        entry_path = self.get_entry_path(key)
+        temp_path = f'{entry_path}.{os.getpid()}.{threading.get_ident()}.part'
+        os.makedirs(self.__cache_root, exist_ok=True)
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path)
+        os.makedirs(temp_path)
+        shutil.copyfile(transcript_path, os.path.join(temp_path, self.TRANSCRIPT_FILE_NAME))
+        with open(os.path.join(temp_path, self.RECORDS_FILE_NAME), 'wb') as fp:
+            pickle.dump(record_list, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(temp_path, self.COMPLETE_MARKER), 'w', encoding='utf-8') as fp:
+            fp.write(key)
+
+        with self.__lock:
+            if os.path.exists(entry_path):
+                shutil.rmtree(entry_path)
+            os.replace(temp_path, entry_path)
+            self.__evict(keep_key=key)
+
+    def __evict(self, keep_key: str) -> None:
+        '''Remove least recently used entries until cache fits its size limit.
+
+        :param keep_key: key of entry that is never removed
+        '''
+        entry_list = []
+        total_size = 0
+        for key in os.listdir(self.__cache_root):
+            entry_path = self.get_entry_path(key)
+            marker_path = os.path.join(entry_path, self.COMPLETE_MARKER)
+            if not os.path.isfile(marker_path):
+                continue
+            entry_size = sum(
+                os.path.getsize(os.path.join(entry_path, file_name))
+                for file_name in os.listdir(entry_path)
+            )
+            total_size += entry_size
+            entry_list.append((os.path.getmtime(marker_path), key, entry_size))
+
+        for _, key, entry_size in sorted(entry_list):
+            if total_size <= self.__max_size:
+                break
+            if key == keep_key:
+                continue
+            shutil.rmtree(self.get_entry_path(key), ignore_errors=True)
+            total_size -= entry_size
+
+
+def load_or_analyze(cache: Optional[AnalysisResultCache],
+                    dump_path: str,
+                    tool_version: str,
+                    command_list: list[Union[str, bytes]],
+                    transcript_path: str,
+                    analyze) -> tuple[Union[int, Exception], Optional[list[sos_parser.SOSRecord]], bool]:
+    '''Restore a cached analysis, or run it and cache transcript and records if it succeeds.
+
+    :param cache: AnalysisResultCache instance, analysis always runs if it's None
+    :param dump_path: dump path
+    :param tool_version: version of analyzer
+    :param command_list: commands written to analyzer
+    :param transcript_path: path analyzer writes transcript to
+    :param analyze: callable running analyzer, returns exit code or exception
+    :return: exit code or exception, records(None if analysis fails) and whether cache is hit
+    '''
+    key = None
+    if cache is not None:
+        try:
+            key = cache.compute_key(dump_path, tool_version, command_list)
+        except OSError as ex:
+            print(f'fail to hash {dump_path}, skip analysis cache: {ex}')
+        if key is not None:
+            record_list = cache.restore(key, transcript_path)
+            if record_list is not None:
+                return 0, record_list, True
+
+    result = analyze()
+    if result != 0:
+        return result, None, False
+
+    record_list = list(sos_parser.iter_records_from_file(transcript_path, command_list))
+    if key is not None:
+        try:
+            cache.store(key, transcript_path, record_list)
+        except OSError as ex:
+            print(f'fail to cache analysis of {dump_path}: {ex}')
+    return result, record_list, False
@@ -1,10 +1,14 @@
 '''methods for dotnet app creation and building'''
 
 import os
+import re
 import glob
+import shutil
+import hashlib
 from typing import Union
 
 import app
+from tools.file_lock import FileLock
 from tools.terminal import run_command_sync
 from tools.sysinfo import SysInfo
 
@@ -65,6 +69,119 @@ def get_app_symbol_root(app_name: str, app_root: str) -> Union[str, Exception]:
     return os.path.dirname(dll_path)
 
 
+SKELETON_NAME = 'DiagToolsSkeleton'
+
+
+def _get_skeleton_root(dotnet_bin_path: str, app_type: str, app_root: str) -> str:
+    '''Get folder of project skeleton shared by apps of the same SDK and template
+
+    :param dotnet_bin_path: path to dotnet executable
+    :param app_type: type of dotnet app
+    :param app_root: path to the project
+    :return: skeleton folder
+    '''
+    sdk_hash = hashlib.sha256(os.path.abspath(dotnet_bin_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(
+        os.path.dirname(os.path.abspath(app_root)),
+        '.skeletons',
+        f'{sdk_hash}-{app_type}'
+    )
+
+
+def _create_skeleton(dotnet_bin_path: str,
+                     app_type: str,
+                     skeleton_root: str,
+                     env: dict) -> Union[str, Exception]:
+    '''instantiate template once into skeleton folder, caller holds lock of skeleton
+
+    The template is instantiated into a temp folder which is renamed to skeleton folder
+    once complete, so a failed `dotnet new` never leaves a partial skeleton.
+
+    :param dotnet_bin_path: path to dotnet executable
+    :param app_type: type of dotnet app
+    :param skeleton_root: skeleton folder
+    :param env: required environment variable
+    :return: skeleton folder or exception if fail to create
+    '''
+    if os.path.exists(os.path.join(skeleton_root, '.skeleton-complete')):
+        return skeleton_root
+
+    temp_root = f'{skeleton_root}.{os.getpid()}.part'
+    if os.path.exists(temp_root):
+        shutil.rmtree(temp_root)
+    args = [
+        dotnet_bin_path, 'new', app_type,
+        '-o', temp_root,
+        '-n', SKELETON_NAME,
+        '--no-restore'
+    ]
+    command, stdout, stderr = run_command_sync(args, env=env)
+    if stderr != '':
+        shutil.rmtree(temp_root, ignore_errors=True)
+        return Exception(f'fail to create {app_type} skeleton in {skeleton_root}, see log for details')
+
+    with open(os.path.join(temp_root, '.skeleton-complete'), 'w') as fp:
+        fp.write(app_type)
+    if os.path.exists(skeleton_root):
+        shutil.rmtree(skeleton_root)
+    os.replace(temp_root, skeleton_root)
+    return skeleton_root
+
+
+def _to_identifier(name: str) -> str:
+    '''convert app name to a valid C# identifier, like `dotnet new` does for namespaces
+
+    :param name: app name
+    :return: identifier
+    '''
+    identifier = re.sub(r'[^A-Za-z0-9_]', '_', name)
+    if identifier == '' or identifier[0].isdigit():
+        identifier = f'_{identifier}'
+    return identifier
+
+
+def _copy_skeleton(skeleton_root: str, app_root: str) -> Union[str, Exception]:
+    '''copy skeleton into app root and rename it to app name
+
+    Files are copied rather than hard linked since Program.cs is overwritten afterwards.
+
+    :param skeleton_root: skeleton folder
+    :param app_root: path to the project
+    :return: path to the project or exception if fail to copy
+    '''
+    app_name = os.path.basename(os.path.normpath(app_root))
+    identifier = _to_identifier(app_name)
+
+    try:
+        for root, dir_list, file_list in os.walk(skeleton_root):
+            dir_list[:] = [d for d in dir_list if d not in ['bin', 'obj']]
+            relative_root = os.path.relpath(root, skeleton_root)
+            target_root = os.path.normpath(
+                os.path.join(app_root, relative_root.replace(SKELETON_NAME, app_name)))
+            os.makedirs(target_root, exist_ok=True)
+            for file_name in file_list:
+                if file_name == '.skeleton-complete':
+                    continue
+                src_path = os.path.join(root, file_name)
+                dest_path = os.path.join(target_root, file_name.replace(SKELETON_NAME, app_name))
+                with open(src_path, 'rb') as fp:
+                    content = fp.read()
+                try:
+                    text = content.decode('utf-8')
+                except UnicodeDecodeError:
+                    shutil.copyfile(src_path, dest_path)
+                    continue
+                if dest_path.endswith('.csproj'):
+                    text = text.replace(SKELETON_NAME, app_name)
+                else:
+                    text = text.replace(SKELETON_NAME, identifier)
+                with open(dest_path, 'wb') as fp:
+                    fp.write(text.encode('utf-8'))
+    except Exception as ex:
+        return Exception(f'fail to copy skeleton to {app_root}: {ex}')
+    return app_root
+
+
 @app.function_monitor()
 def create_new_app(dotnet_bin_path: str, 
                    app_type: str,
@@ -72,40 +189,85 @@ def create_new_app(dotnet_bin_path: str,
                    env: dict) -> Union[str, Exception]:
     '''create app with dotnet command
 
+    The template is instantiated once per SDK into a skeleton next to app root,
+    and later apps are copied from the skeleton. Skeleton is created and copied
+    under a file lock, since testbeds may create apps concurrently.
+
     :param dotnet_bin_path: path to dotnet executable
     :param app_type: type of dotnet app
     :param app_root: path to the project
     :param env: required environment variable
     :return: path to the project or exception if fail to create
     '''
+    skeleton_root = _get_skeleton_root(dotnet_bin_path, app_type, app_root)
+    with FileLock(f'{skeleton_root}.lock'):
+        skeleton_root = _create_skeleton(dotnet_bin_path, app_type, skeleton_root, env)
+        if isinstance(skeleton_root, Exception):
+            return skeleton_root
+        return _copy_skeleton(skeleton_root, app_root)
+    
+
+@app.function_monitor()
+def restore_app(dotnet_bin_path: str,
+                app_root: str,
+                env: dict,
+                packages_folder: str=None) -> Union[str, Exception]:
+    '''restore app with dotnet command
+
+    :param dotnet_bin_path: path to dotnet executable
+    :param app_root: path to the project
+    :param env: required environment variable
+    :param packages_folder: packages folder shared by apps, default NuGet folder if it's None
+    :return: path to the project or exception if fail to restore
+    '''
     args = [
-        dotnet_bin_path, 'new', app_type,
-        '-o', app_root
+        dotnet_bin_path, 'restore'
     ]
-    command, stdout, stderr = run_command_sync(args, env=env)
+    if packages_folder is not None:
+        args.extend(['--packages', packages_folder])
+    command, stdout, stderr = run_command_sync(args, cwd=app_root, env=env)
     if stderr != '':
-        return Exception(f'fail to create {app_type} in {app_root}, see log for details')
+        return Exception(f'fail to restore {app_root}, see log for details')
     else:
         return app_root
-    
+
 
 @app.function_monitor()
 def build_app(dotnet_bin_path: str, 
               app_root: str,
-              env: dict) -> Union[str, Exception]:
+              env: dict,
+              no_restore: bool=False) -> Union[str, Exception]:
     '''build app with dotnet command
 
     :param dotnet_bin_path: path to dotnet executable
     :param app_root: path to the project
     :param env: required environment variable
+    :param no_restore: whether to skip implicit restore
     :return: path to the project or exception if fail to create
     '''
     args = [
         dotnet_bin_path, 'build'
     ]
+    if no_restore:
+        args.append('--no-restore')
     command, stdout, stderr = run_command_sync(args, cwd=app_root, env=env)
     if stderr != '':
         return Exception(f'fail to install tool, see log for details')
     else:
         return app_root
-    
\ No newline at end of file
+
+
+@app.function_monitor()
+def shutdown_build_server(dotnet_bin_path: str, env: dict) -> Union[None, Exception]:
+    '''shut down MSBuild, Roslyn and Razor build servers
+
+    :param dotnet_bin_path: path to dotnet executable
+    :param env: required environment variable
+    :return: None or exception if fail to shut down
+    '''
+    args = [
+        dotnet_bin_path, 'build-server', 'shutdown'
+    ]
+    command, stdout, stderr = run_command_sync(args, env=env)
+    if stderr != '':
+        return Exception('fail to shut down build server, see log for details')
@@ -1,10 +1,19 @@
 '''methods for dotnet tool installation'''
 
+import os
 import glob
+import json
+import base64
+import hashlib
+import zipfile
+import threading
 from typing import Union
 from urllib import request
+from xml.sax.saxutils import quoteattr
+from concurrent.futures import ThreadPoolExecutor
 
 import app
+from tools.file_lock import FileLock
 from tools.terminal import run_command_sync
 
 
@@ -14,7 +23,8 @@ def install_tool(dotnet_bin_path: str,
                  tool_root: str, 
                  tool_version: str, 
                  tool_feed: str,
-                 env: dict) -> Union[str, Exception]:
+                 env: dict,
+                 config_file_path: str=None) -> Union[str, Exception]:
     '''Install dotnet tool
     
     :param dotnet_bin_path: path to dotnet executable
@@ -23,14 +33,25 @@ def install_tool(dotnet_bin_path: str,
     :param tool_version: version of tool
     :param tool_feed: feed of tool
     :param env: required environment variable
+    :param config_file_path: nuget.config restricting sources, e.g. the one of local mirror; \
+        tool feed is ignored if it's set
     :return: parent dir of the tool or exception if fail to install
     '''
+    # tool root holds one version of a tool, install another version side by side
+    tool_path = tool_root
+    store_folder = os.path.join(tool_root, '.store', tool.lower())
+    if os.path.isdir(store_folder) and tool_version not in os.listdir(store_folder):
+        tool_path = get_side_by_side_tool_path(tool_root, tool_version)
+
     args = [
         dotnet_bin_path, 'tool', 'install', tool,
-        '--tool-path', tool_root,
-        '--version', tool_version,
-        '--add-source', tool_feed
+        '--tool-path', tool_path,
+        '--version', tool_version
     ]
+    if config_file_path is not None:
+        args.extend(['--configfile', config_file_path])
+    else:
+        args.extend(['--add-source', tool_feed])
     command, stdout, stderr = run_command_sync(args, env=env)
     if stderr != '':
         return Exception(f'fail to install {tool}, see log for details')
@@ -38,6 +59,134 @@ def install_tool(dotnet_bin_path: str,
         return tool_root
 
 
+def _mirror_package(tool: str,
+                    tool_version: str,
+                    package_base_address: str,
+                    mirror_root: str) -> Union[str, Exception]:
+    '''Download a tool package into mirror in NuGet v3 folder layout
+
+    The package is streamed into a temp file and hashed on the way, then moved in place
+    under a file lock, so concurrent mirrors of one version don't see a partial package.
+
+    :param tool: name of tool
+    :param tool_version: version of tool
+    :param package_base_address: url of flat container of tool feed
+    :param mirror_root: root of local mirror
+    :return: path of package or exception if fail to download
+    '''
+    lower_id = tool.lower()
+    lower_version = tool_version.lower()
+    package_folder = os.path.join(mirror_root, lower_id, lower_version)
+    package_path = os.path.join(package_folder, f'{lower_id}.{lower_version}.nupkg')
+    # hash file is written last and marks a complete package for NuGet
+    hash_path = f'{package_path}.sha512'
+    if os.path.exists(hash_path):
+        return package_path
+
+    temp_path = f'{package_path}.{os.getpid()}.{threading.get_ident()}.part'
+    try:
+        os.makedirs(package_folder, exist_ok=True)
+        with FileLock(f'{package_folder}.lock'):
+            if os.path.exists(hash_path):
+                return package_path
+
+            hasher = hashlib.sha512()
+            with request.urlopen(
+                f'{package_base_address}{lower_id}/{lower_version}/{lower_id}.{lower_version}.nupkg'
+            ) as response, open(temp_path, 'wb') as fp:
+                while True:
+                    buffer = response.read(1024*1024)
+                    if len(buffer) == 0:
+                        break
+                    hasher.update(buffer)
+                    fp.write(buffer)
+            os.replace(temp_path, package_path)
+
+            with zipfile.ZipFile(package_path, 'r') as zip_ref:
+                nuspec_name = [
+                    name for name in zip_ref.namelist()
+                    if '/' not in name and name.lower().endswith('.nuspec')
+                ][0]
+                with open(os.path.join(package_folder, f'{lower_id}.nuspec'), 'wb') as fp:
+                    fp.write(zip_ref.read(nuspec_name))
+            with open(hash_path, 'w') as fp:
+                fp.write(base64.b64encode(hasher.digest()).decode('ascii'))
+        return package_path
+    except Exception as ex:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return Exception(f'fail to mirror {tool} {tool_version}: {ex}')
+
+
+def _write_nuget_config(config_file_path: str, source: str) -> None:
+    '''Write nuget.config using a package source as the only source
+
+    :param config_file_path: path of nuget.config
+    :param source: package source, e.g. a folder feed
+    '''
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>\n',
+        '<configuration>\n',
+        '  <packageSources>\n',
+        '    <clear />\n',
+        f'    <add key="local-mirror" value={quoteattr(source)} />\n',
+        '  </packageSources>\n',
+        '</configuration>\n'
+    ]
+    temp_path = f'{config_file_path}.{os.getpid()}.{threading.get_ident()}.part'
+    with open(temp_path, 'w', encoding='utf-8') as fp:
+        fp.writelines(lines)
+    os.replace(temp_path, config_file_path)
+
+
+@app.function_monitor()
+def mirror_tool_feed(tool_list: list[str],
+                     tool_version: str,
+                     tool_feed: str,
+                     mirror_root: str) -> Union[str, Exception]:
+    '''Copy tool packages from feed into a local folder feed once, so installs work offline
+
+    :param tool_list: names of tool
+    :param tool_version: version of tool
+    :param tool_feed: feed of tool(url of v3 service index)
+    :param mirror_root: root of local mirror
+    :return: path of nuget.config using the mirror as the only source, or exception if fail to mirror
+    '''
+    config_file_path = os.path.join(mirror_root, 'nuget.config')
+    lower_version = tool_version.lower()
+    package_missing = any(
+        not os.path.exists(
+            os.path.join(mirror_root, tool.lower(), lower_version,
+                         f'{tool.lower()}.{lower_version}.nupkg.sha512'))
+        for tool in tool_list
+    )
+
+    if package_missing:
+        try:
+            with request.urlopen(tool_feed) as response:
+                service_index = json.load(response)
+            package_base_address = [
+                resource['@id'] for resource in service_index['resources']
+                if resource['@type'].startswith('PackageBaseAddress/3.0.0')
+            ][0]
+        except Exception as ex:
+            return Exception(f'fail to resolve package base address of {tool_feed}: {ex}')
+        if not package_base_address.endswith('/'):
+            package_base_address += '/'
+
+        with ThreadPoolExecutor() as executor:
+            result_list = list(executor.map(
+                lambda tool: _mirror_package(tool, tool_version, package_base_address, mirror_root),
+                tool_list
+            ))
+        for result in result_list:
+            if isinstance(result, Exception):
+                return result
+
+    _write_nuget_config(config_file_path, mirror_root)
+    return config_file_path
+
+
 @app.function_monitor(
     pre_run_msg='start to download perfcollect script',
     post_run_msg='download perfcollect script completed')
@@ -57,20 +206,96 @@ def download_perfcollect(perfcollect_path: str) -> Union[str, Exception]:
         return Exception(f'fail to download perfcollect script: {ex}')
     
 
+TOOL_REGISTRY_FILE_NAME = '.tool-registry.json'
+
+
+def get_side_by_side_tool_path(tool_root: str, tool_version: str) -> str:
+    '''Get tool path for a version installed beside another version of the same tool
+
+    :param tool_root: root of diag tools
+    :param tool_version: version of tool
+    :return: tool path
+    '''
+    return os.path.join(tool_root, '.versions', tool_version)
+
+
+def _load_tool_registry(tool_root: str) -> dict:
+    '''Load registry of tool dll recorded in tool root
+
+    :param tool_root: root of diag tools
+    :return: a dict maps "<name>/<version>" to entry
+    '''
+    registry_path = os.path.join(tool_root, TOOL_REGISTRY_FILE_NAME)
+    try:
+        with open(registry_path, 'r') as fp:
+            return {
+                f'{entry["name"]}/{entry["version"]}': entry
+                for entry in json.load(fp)
+            }
+    except (FileNotFoundError, ValueError, KeyError):
+        return dict()
+
+
+def _save_tool_registry(tool_root: str, registry: dict) -> None:
+    '''Write registry of tool dll into tool root
+
+    :param tool_root: root of diag tools
+    :param registry: a dict maps "<name>/<version>" to entry
+    '''
+    registry_path = os.path.join(tool_root, TOOL_REGISTRY_FILE_NAME)
+    temp_path = f'{registry_path}.{os.getpid()}.{threading.get_ident()}.part'
+    with open(temp_path, 'w') as fp:
+        json.dump(list(registry.values()), fp, indent=2)
+    os.replace(temp_path, registry_path)
+
+
 def get_tool_dll(tool_name, tool_version, tool_root: str) -> Union[str, Exception]:
     '''Get path of executable file
 
+    The dll path is recorded in registry of tool root with its mtime,
+    so tool store is only searched once per tool version. Registry is updated
+    under a file lock since tools are installed and tested concurrently.
+
     :param tool_name: name of diag tool
     :param tool_root: root of diag tools
     :return: path of executable file or exception if fail to create
     '''
-    tool_dll_path_template = (
-        f'{tool_root}/.store/{tool_name}'
-        f'/{tool_version}/{tool_name}'
-        f'/{tool_version}/tools/*/any/{tool_name}.dll'
-    )
-    tool_dll_path_candidates = glob.glob(tool_dll_path_template)
+    registry = _load_tool_registry(tool_root)
+    entry = registry.get(f'{tool_name}/{tool_version}')
+    if entry is not None:
+        try:
+            if os.stat(entry['il_path']).st_mtime == entry['mtime']:
+                return entry['il_path']
+        except FileNotFoundError:
+            pass
+
+    tool_dll_path_candidates = []
+    for tool_path in [tool_root, get_side_by_side_tool_path(tool_root, tool_version)]:
+        tool_dll_path_template = (
+            f'{tool_path}/.store/{tool_name}'
+            f'/{tool_version}/{tool_name}'
+            f'/{tool_version}/tools/*/any/{tool_name}.dll'
+        )
+        tool_dll_path_candidates.extend(glob.glob(tool_dll_path_template))
     
     if len(tool_dll_path_candidates) < 1:
         return Exception(f'no dll file availble for {tool_name}')
-    return tool_dll_path_candidates[0]
\ No newline at end of file
+
+    tool_dll_path = tool_dll_path_candidates[0]
+    entry = {
+        'name': tool_name,
+        'version': tool_version,
+        'target_framework': os.path.basename(os.path.dirname(os.path.dirname(tool_dll_path))),
+        'il_path': tool_dll_path,
+        'mtime': os.stat(tool_dll_path).st_mtime
+    }
+    try:
+        with FileLock(os.path.join(tool_root, f'{TOOL_REGISTRY_FILE_NAME}.lock')):
+            # reload so entries saved by others in the meantime are kept
+            registry = _load_tool_registry(tool_root)
+            registry[f'{tool_name}/{tool_version}'] = entry
+            _save_tool_registry(tool_root, registry)
+    except OSError as ex:
+        if app.get_logger() is not None:
+            app.get_logger().warning(f'fail to save tool registry in {tool_root}: {ex}')
+    return tool_dll_path
@@ -0,0 +1,84 @@
+'''Inter-process lock backed by a lock file'''
+
+import os
+try:
+    import fcntl
+except ModuleNotFoundError:
+    fcntl = None
+try:
+    import msvcrt
+except ModuleNotFoundError:
+    msvcrt = None
+
+
+class FileLock:
+    '''Lock shared by threads and processes through a lock file.
+
+    Each acquire opens the file again, so threads of one process exclude each other as well.
+    '''
+    def __init__(self, lock_file_path: str):
+        '''
+        :param lock_file_path: lock file path
+        '''
+        self.__lock_file_path = lock_file_path
+        self.__fp = None
+
+    @property
+    def lock_file_path(self) -> str:
+        '''Get lock file path.
+        '''
+        return self.__lock_file_path
+
+    def acquire(self, blocking: bool=True) -> bool:
+        '''Acquire the lock.
+
+        :param blocking: block until the lock is acquired, or give up at once if it's held
+        :return: whether the lock is acquired
+        '''
+        lock_folder = os.path.dirname(self.__lock_file_path)
+        if lock_folder != '':
+            os.makedirs(lock_folder, exist_ok=True)
+        self.__fp = open(self.__lock_file_path, 'a+b')
+        try:
+            if msvcrt is not None:
+                self.__fp.seek(0)
+                # LK_LOCK only retries for 10 seconds
+                while True:
+                    try:
+                        msvcrt.locking(
+                            self.__fp.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+            else:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(self.__fp.fileno(), flags)
+        except Exception as ex:
+            self.__fp.close()
+            self.__fp = None
+            # the lock is held by someone else
+            if not blocking and isinstance(ex, OSError):
+                return False
+            raise
+        return True
+
+    def release(self):
+        '''Release the lock.
+        '''
+        if self.__fp is None:
+            return
+        if msvcrt is not None:
+            self.__fp.seek(0)
+            msvcrt.locking(self.__fp.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.__fp.fileno(), fcntl.LOCK_UN)
+        self.__fp.close()
+        self.__fp = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,231 @@
+'''Tables of `dumpheap` statistics backed by NumPy arrays.
+'''
+from typing import Iterable, Optional
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+from tools import sos_parser
+
+
+HAS_NUMPY = np is not None
+
+
+class HeapStatTable:
+    '''Statistics rows of a dump with one array per column.
+
+    Rows are kept in the order they are given; operations return new tables.
+    '''
+    def __init__(self, method_tables, counts, total_sizes, type_names):
+        '''
+        :param method_tables: uint64 array of method table address, 0 if rows of several method tables are merged
+        :param counts: int64 array of object count
+        :param total_sizes: int64 array of size(bytes)
+        :param type_names: str array of type name
+        '''
+        if np is None:
+            raise ModuleNotFoundError('numpy is required by heap statistics table')
+        self.method_tables = np.asarray(method_tables, dtype=np.uint64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.total_sizes = np.asarray(total_sizes, dtype=np.int64)
+        self.type_names = np.asarray(type_names, dtype=str)
+
+    @classmethod
+    def from_records(cls, records: Iterable[sos_parser.SOSRecord]):
+        '''Build table from HeapStatRecord instances, other records are ignored.
+
+        :param records: parsed SOS records
+        :return: HeapStatTable instance
+        '''
+        method_table_list = []
+        count_list = []
+        total_size_list = []
+        type_name_list = []
+        for record in records:
+            if not isinstance(record, sos_parser.HeapStatRecord):
+                continue
+            method_table_list.append(record.method_table)
+            count_list.append(record.count)
+            total_size_list.append(record.total_size)
+            type_name_list.append(record.type_name)
+        return cls(method_table_list, count_list, total_size_list, type_name_list)
+
+    @classmethod
+    def from_transcript(cls, transcript_path: str, command_list: Optional[list]=None):
+        '''Build table from `dumpheap` sections of a transcript.
+
+        :param transcript_path: path of transcript
+        :param command_list: commands written to debugger in order, None if transcript echoes commands
+        :return: HeapStatTable instance
+        '''
+        return cls.from_records(sos_parser.iter_records_from_file(transcript_path, command_list))
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def total_count(self) -> int:
+        '''Get number of objects.
+        '''
+        return int(self.counts.sum())
+
+    @property
+    def total_size(self) -> int:
+        '''Get size(bytes) of objects.
+        '''
+        return int(self.total_sizes.sum())
+
+    def take(self, indices):
+        '''Get rows at indices.
+
+        :param indices: int array of row index
+        :return: HeapStatTable instance
+        '''
+        return HeapStatTable(
+            self.method_tables[indices],
+            self.counts[indices],
+            self.total_sizes[indices],
+            self.type_names[indices]
+        )
+
+    def top(self, n: int, by: str='total_size'):
+        '''Get n rows with the largest total size(or count), largest first.
+
+        :param n: number of rows
+        :param by: `total_size` or `count`
+        :return: HeapStatTable instance
+        '''
+        column = self.total_sizes if by == 'total_size' else self.counts
+        if n <= 0:
+            return self.take(np.arange(0))
+        if n < len(column):
+            indices = np.argpartition(column, len(column) - n)[len(column) - n:]
+        else:
+            indices = np.arange(len(column))
+        indices = indices[np.argsort(column[indices], kind='stable')[::-1]]
+        return self.take(indices)
+
+    def group_by_type(self):
+        '''Merge rows of the same type name, e.g. a generic type loaded in several contexts.
+
+        :return: HeapStatTable instance sorted by type name
+        '''
+        type_names, first_indices, inverse = np.unique(
+            self.type_names, return_index=True, return_inverse=True)
+        row_counts = np.bincount(inverse, minlength=len(type_names))
+        method_tables = np.where(row_counts == 1, self.method_tables[first_indices], 0)
+        counts = np.zeros(len(type_names), dtype=np.int64)
+        total_sizes = np.zeros(len(type_names), dtype=np.int64)
+        np.add.at(counts, inverse, self.counts)
+        np.add.at(total_sizes, inverse, self.total_sizes)
+        return HeapStatTable(method_tables, counts, total_sizes, type_names)
+
+    def format(self, limit: Optional[int]=None) -> list[str]:
+        '''Render rows like `dumpheap -stat`.
+
+        :param limit: maximum number of rows, all rows if it's None
+        :return: a list of line
+        '''
+        row_count = len(self) if limit is None else min(limit, len(self))
+        lines = [f'{"MT":>16} {"Count":>12} {"TotalSize":>16} Class Name']
+        for index in range(row_count):
+            lines.append(
+                f'{int(self.method_tables[index]):>16x} '
+                f'{int(self.counts[index]):>12,} '
+                f'{int(self.total_sizes[index]):>16,} '
+                f'{self.type_names[index]}'
+            )
+        return lines
+
+
+class HeapStatMatrix:
+    '''Statistics of several dumps joined by type name.
+    '''
+    def __init__(self, labels: list[str], type_names, counts, total_sizes):
+        '''
+        :param labels: dump labels, one per column
+        :param type_names: str array of type name, one per row
+        :param counts: int64 array of shape (types, dumps)
+        :param total_sizes: int64 array of shape (types, dumps)
+        '''
+        self.labels = labels
+        self.type_names = type_names
+        self.counts = counts
+        self.total_sizes = total_sizes
+
+    def top(self, n: int):
+        '''Get n types with the largest total size in any dump, largest first.
+
+        :param n: number of types
+        :return: HeapStatMatrix instance
+        '''
+        peak = self.total_sizes.max(axis=1) if len(self.labels) > 0 else np.zeros(len(self.type_names))
+        indices = np.argsort(peak, kind='stable')[::-1][:n]
+        return HeapStatMatrix(
+            self.labels,
+            self.type_names[indices],
+            self.counts[indices],
+            self.total_sizes[indices]
+        )
+
+    def format(self, limit: Optional[int]=None) -> list[str]:
+        '''Render total size of each type per dump.
+
+        :param limit: maximum number of rows, all rows if it's None
+        :return: a list of line
+        '''
+        row_count = len(self.type_names) if limit is None else min(limit, len(self.type_names))
+        lines = [' '.join(f'{label:>16}' for label in self.labels) + ' Class Name']
+        for index in range(row_count):
+            lines.append(
+                ' '.join(f'{int(size):>16,}' for size in self.total_sizes[index])
+                + f' {self.type_names[index]}'
+            )
+        return lines
+
+
+def join_heap_stats(table_map: dict[str, HeapStatTable]) -> HeapStatMatrix:
+    '''Join statistics of several dumps by type name, a type missing in a dump counts 0.
+
+    :param table_map: a dict maps dump label to HeapStatTable instance
+    :return: HeapStatMatrix instance
+    '''
+    if np is None:
+        raise ModuleNotFoundError('numpy is required by heap statistics table')
+    labels = list(table_map)
+    table_list = [table_map[label] for label in labels]
+    all_type_names = np.concatenate(
+        [table.type_names for table in table_list]) if len(table_list) > 0 else np.array([], dtype=str)
+    type_names, inverse = np.unique(all_type_names, return_inverse=True)
+
+    counts = np.zeros((len(type_names), len(labels)), dtype=np.int64)
+    total_sizes = np.zeros((len(type_names), len(labels)), dtype=np.int64)
+    offset = 0
+    for column, table in enumerate(table_list):
+        rows = inverse[offset:offset + len(table)]
+        np.add.at(counts[:, column], rows, table.counts)
+        np.add.at(total_sizes[:, column], rows, table.total_sizes)
+        offset += len(table)
+    return HeapStatMatrix(labels, type_names, counts, total_sizes)
+
+
+def diff_heap_stats(baseline: HeapStatTable, target: HeapStatTable) -> HeapStatTable:
+    '''Get growth of each type from baseline to target, e.g. OOM dump vs a healthy one.
+
+    :param baseline: HeapStatTable instance of baseline dump
+    :param target: HeapStatTable instance of target dump
+    :return: HeapStatTable instance of count and size delta, largest absolute size delta first
+    '''
+    matrix = join_heap_stats({'baseline': baseline, 'target': target})
+    count_deltas = matrix.counts[:, 1] - matrix.counts[:, 0]
+    size_deltas = matrix.total_sizes[:, 1] - matrix.total_sizes[:, 0]
+    changed = (count_deltas != 0) | (size_deltas != 0)
+    delta = HeapStatTable(
+        np.zeros(int(changed.sum()), dtype=np.uint64),
+        count_deltas[changed],
+        size_deltas[changed],
+        matrix.type_names[changed]
+    )
+    order = np.argsort(np.abs(delta.total_sizes), kind='stable')[::-1]
+    return delta.take(order)
@@ -0,0 +1,112 @@
+'''Hand out free TCP ports to target apps so several testbeds can run on one machine'''
+
+import os
+import socket
+import tempfile
+import threading
+from subprocess import Popen
+from typing import Optional
+
+from tools import waiter
+from tools.file_lock import FileLock
+
+
+# ports reserved by any DiagToolsTest run on this machine have a locked file here
+PORT_LOCK_FOLDER = os.path.join(tempfile.gettempdir(), 'DiagToolsTest-ports')
+# attempts to find a port that isn't reserved by another run
+MAX_ALLOCATE_ATTEMPTS = 100
+
+
+class PortAllocator:
+    '''Reserve free ports and release them when the processes using them exit.
+
+    A port is picked by the OS and reserved by locking a file named after it, so runs in
+    other processes skip it. The OS drops the lock if this process dies, so reservations
+    never outlive their owner.
+    '''
+    def __init__(self, host: str='127.0.0.1', lock_folder: str=PORT_LOCK_FOLDER):
+        '''
+        :param host: address ports are bound on
+        :param lock_folder: folder of port lock files shared by all runs
+        '''
+        self.__host = host
+        self.__lock_folder = lock_folder
+        self.__lock = threading.Lock()
+        self.__reservation_map: dict[int, FileLock] = dict()
+        self.__process_map: dict[int, Popen] = dict()
+
+    @property
+    def host(self) -> str:
+        '''Get address ports are bound on.
+        '''
+        return self.__host
+
+    @property
+    def process_map(self) -> dict[int, Popen]:
+        '''Get a dict maps port to the process using it.
+        '''
+        with self.__lock:
+            return dict(self.__process_map)
+
+    def allocate(self) -> int:
+        '''Reserve a port that is free now and not reserved by other runs.
+
+        :return: port
+        '''
+        os.makedirs(self.__lock_folder, exist_ok=True)
+        for _ in range(MAX_ALLOCATE_ATTEMPTS):
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                probe.bind((self.__host, 0))
+                port = probe.getsockname()[1]
+
+            with self.__lock:
+                if port in self.__reservation_map:
+                    continue
+                port_lock = FileLock(os.path.join(self.__lock_folder, f'{port}.lock'))
+                if not port_lock.acquire(blocking=False):
+                    continue
+                self.__reservation_map[port] = port_lock
+                return port
+        raise OSError(f'fail to allocate a port in {MAX_ALLOCATE_ATTEMPTS} attempts')
+
+    def attach(self, port: int, proc: Popen):
+        '''Record the process using a port and release the port once the process exits.
+
+        :param port: port returned by allocate
+        :param proc: Popen instance
+        '''
+        with self.__lock:
+            self.__process_map[port] = proc
+
+        def release_on_exit():
+            waiter.wait_for_process_exit(proc)
+            self.release(port)
+
+        threading.Thread(target=release_on_exit, daemon=True).start()
+
+    def get_port(self, proc: Popen) -> Optional[int]:
+        '''Get port used by a process.
+
+        :param proc: Popen instance
+        :return: port, or None if the process isn't recorded
+        '''
+        with self.__lock:
+            for port, recorded_proc in self.__process_map.items():
+                if recorded_proc is proc:
+                    return port
+        return None
+
+    def release(self, port: int):
+        '''Drop reservation of a port, releasing a port twice does nothing.
+
+        :param port: port returned by allocate
+        '''
+        with self.__lock:
+            self.__process_map.pop(port, None)
+            port_lock = self.__reservation_map.pop(port, None)
+        if port_lock is not None:
+            port_lock.release()
+
+
+# allocator shared by all target apps of this run
+port_allocator = PortAllocator()
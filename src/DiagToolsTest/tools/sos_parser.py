@@ -0,0 +1,431 @@
+'''Parse SOS transcripts written by dotnet-dump analyze, lldb and cdb.
+
+Transcripts are read line by line and records are yielded as soon as they are
+recognized, so memory doesn't grow with the size of a transcript.
+'''
+import re
+from typing import Iterable, Iterator, Optional, Union
+
+
+class CommandRecord:
+    '''Start of the output of a command.
+    '''
+    def __init__(self, command: str, line_number: int):
+        '''
+        :param command: command line, e.g. `dumpheap -stat`
+        :param line_number: 1-based line number the output starts at
+        '''
+        self.command = command
+        self.line_number = line_number
+
+
+class ThreadRecord:
+    '''A row of `clrthreads`.
+    '''
+    def __init__(self,
+                 debugger_id: str,
+                 managed_id: int,
+                 os_id: int,
+                 thread_obj: int,
+                 state: int,
+                 gc_mode: str,
+                 exception: Optional[str]):
+        '''
+        :param debugger_id: debugger thread id, `XXXX` for dead threads
+        :param managed_id: managed thread id
+        :param os_id: OS thread id
+        :param thread_obj: address of Thread object
+        :param state: thread state flags
+        :param gc_mode: Preemptive or Cooperative
+        :param exception: last thrown exception or thread role, e.g. `(Finalizer)`
+        '''
+        self.debugger_id = debugger_id
+        self.managed_id = managed_id
+        self.os_id = os_id
+        self.thread_obj = thread_obj
+        self.state = state
+        self.gc_mode = gc_mode
+        self.exception = exception
+
+
+class FrameRecord:
+    '''A frame of `clrstack`.
+    '''
+    def __init__(self, os_thread_id: Optional[int], child_sp: int, ip: int, call_site: str):
+        '''
+        :param os_thread_id: OS thread id of the stack, None if it's not printed
+        :param child_sp: stack pointer
+        :param ip: instruction pointer
+        :param call_site: method or frame description
+        '''
+        self.os_thread_id = os_thread_id
+        self.child_sp = child_sp
+        self.ip = ip
+        self.call_site = call_site
+
+
+class StackObjectRecord:
+    '''A row of `dso`.
+    '''
+    def __init__(self, os_thread_id: Optional[int], location: str, address: int, type_name: str):
+        '''
+        :param os_thread_id: OS thread id of the stack, None if it's not printed
+        :param location: stack address or register holding the object
+        :param address: object address
+        :param type_name: type name and, for strings, the value
+        '''
+        self.os_thread_id = os_thread_id
+        self.location = location
+        self.address = address
+        self.type_name = type_name
+
+
+class HeapSegmentRecord:
+    '''A segment(or region) of `eeheap`.
+    '''
+    def __init__(self,
+                 heap: Optional[int],
+                 generation: Optional[str],
+                 segment: int,
+                 begin: int,
+                 allocated: int,
+                 committed: Optional[int],
+                 allocated_size: int,
+                 committed_size: Optional[int]):
+        '''
+        :param heap: GC heap number, None for workstation GC
+        :param generation: generation or heap name the segment belongs to, e.g. `generation 0`
+        :param segment: address of segment
+        :param begin: start of objects
+        :param allocated: end of objects
+        :param committed: end of committed memory, None if it's not printed
+        :param allocated_size: size(bytes) of objects
+        :param committed_size: size(bytes) of committed memory, None if it's not printed
+        '''
+        self.heap = heap
+        self.generation = generation
+        self.segment = segment
+        self.begin = begin
+        self.allocated = allocated
+        self.committed = committed
+        self.allocated_size = allocated_size
+        self.committed_size = committed_size
+
+
+class HeapStatRecord:
+    '''A row of `Statistics` of `dumpheap`.
+    '''
+    def __init__(self, method_table: int, count: int, total_size: int, type_name: str):
+        '''
+        :param method_table: address of method table
+        :param count: number of objects
+        :param total_size: size(bytes) of objects
+        :param type_name: type name, `Free` for free space
+        '''
+        self.method_table = method_table
+        self.count = count
+        self.total_size = total_size
+        self.type_name = type_name
+
+
+class EEVersionRecord:
+    '''Output of `eeversion`.
+    '''
+    def __init__(self, runtime_version: str, gc_mode: Optional[str]):
+        '''
+        :param runtime_version: runtime version, e.g. 8.0.824.36612
+        :param gc_mode: Workstation or Server, None if it's not printed
+        '''
+        self.runtime_version = runtime_version
+        self.gc_mode = gc_mode
+
+
+SOSRecord = Union[
+    CommandRecord,
+    ThreadRecord,
+    FrameRecord,
+    StackObjectRecord,
+    HeapSegmentRecord,
+    HeapStatRecord,
+    EEVersionRecord
+]
+
+
+# `> ` of dotnet-dump, `(lldb) ` of lldb and `0:000> ` of cdb
+PROMPT_PATTERN = re.compile(r'^(?:>|\(lldb\)|\d+:\d+(?::[0-9a-fA-F]+)?>)(?: |$)')
+_HEX = r'(?:0x)?([0-9a-fA-F]{6,})'
+_OS_THREAD_PATTERN = re.compile(r'^\s*OS Thread Id:\s*0x([0-9a-fA-F]+)')
+_THREAD_PATTERN = re.compile(
+    r'^\s*(\w+)\s+(\d+)\s+([0-9a-fA-F]+)\s+' + _HEX + r'\s+([0-9a-fA-F]+)\s+(Preemptive|Cooperative)\s+(.*)$'
+)
+_THREAD_EXCEPTION_PATTERN = re.compile(r'(\([\w ]+\)|[\w.`+]*Exception\b[^\s]*)')
+_FRAME_PATTERN = re.compile(r'^\s*' + _HEX + r'\s+' + _HEX + r'\s+(\S.*)$')
+_STACK_OBJECT_PATTERN = re.compile(r'^\s*(\S+)\s+' + _HEX + r'\s+(\S.*)$')
+_HEAP_PATTERN = re.compile(r'^\s*Heap\s+(\d+)')
+_GENERATION_PATTERN = re.compile(
+    r'^\s*(generation \d+|(?:Large|Pinned|Small|Frozen) object heap)', re.IGNORECASE
+)
+_SEGMENT_PATTERN = re.compile(
+    r'^\s*' + _HEX + r'\s+' + _HEX + r'\s+' + _HEX + r'(?:\s+' + _HEX + r')?'
+    r'\s+(?:0x[0-9a-fA-F]+)?\((\d+)\)(?:\s+(?:0x[0-9a-fA-F]+)?\((\d+)\))?'
+)
+_HEAP_STAT_PATTERN = re.compile(r'^\s*' + _HEX + r'\s+([\d,]+)\s+([\d,]+)\s+(\S.*?)\s*$')
+_EEVERSION_PATTERN = re.compile(r'^\s*(\d+\.\d+\.\d+(?:\.\d+)?)')
+_GC_MODE_PATTERN = re.compile(r'^\s*(Workstation|Server) mode', re.IGNORECASE)
+
+
+def normalize_command(command: Union[str, bytes]) -> str:
+    '''Strip a command as it's written to debugger.
+
+    :param command: command, e.g. b'!dumpheap -stat\\n'
+    :return: normalized command, e.g. `dumpheap -stat`
+    '''
+    if isinstance(command, bytes):
+        command = command.decode('utf-8', errors='replace')
+    return ' '.join(command.strip().lstrip('!').split()).lower()
+
+
+class _SectionParser:
+    '''Turn lines of a command output into records.
+    '''
+    def feed(self, line: str) -> Iterable[SOSRecord]:
+        return ()
+
+    def finish(self) -> Iterable[SOSRecord]:
+        return ()
+
+
+class _ThreadSectionParser(_SectionParser):
+    def feed(self, line: str):
+        match = _THREAD_PATTERN.match(line)
+        if match is None:
+            return ()
+        exception_match = _THREAD_EXCEPTION_PATTERN.search(match.group(7))
+        return (
+            ThreadRecord(
+                match.group(1),
+                int(match.group(2)),
+                int(match.group(3), 16),
+                int(match.group(4), 16),
+                int(match.group(5), 16),
+                match.group(6),
+                None if exception_match is None else exception_match.group(1)
+            ),
+        )
+
+
+class _StackSectionParser(_SectionParser):
+    def __init__(self):
+        self.os_thread_id = None
+
+    def feed(self, line: str):
+        match = _OS_THREAD_PATTERN.match(line)
+        if match is not None:
+            self.os_thread_id = int(match.group(1), 16)
+            return ()
+        match = _FRAME_PATTERN.match(line)
+        if match is None:
+            return ()
+        return (
+            FrameRecord(
+                self.os_thread_id,
+                int(match.group(1), 16),
+                int(match.group(2), 16),
+                match.group(3).rstrip()
+            ),
+        )
+
+
+class _StackObjectSectionParser(_StackSectionParser):
+    def feed(self, line: str):
+        match = _OS_THREAD_PATTERN.match(line)
+        if match is not None:
+            self.os_thread_id = int(match.group(1), 16)
+            return ()
+        match = _STACK_OBJECT_PATTERN.match(line)
+        if match is None:
+            return ()
+        return (
+            StackObjectRecord(
+                self.os_thread_id,
+                match.group(1),
+                int(match.group(2), 16),
+                match.group(3).rstrip()
+            ),
+        )
+
+
+class _HeapSegmentSectionParser(_SectionParser):
+    def __init__(self):
+        self.heap = None
+        self.generation = None
+
+    def feed(self, line: str):
+        match = _SEGMENT_PATTERN.match(line)
+        if match is not None:
+            return (
+                HeapSegmentRecord(
+                    self.heap,
+                    self.generation,
+                    int(match.group(1), 16),
+                    int(match.group(2), 16),
+                    int(match.group(3), 16),
+                    None if match.group(4) is None else int(match.group(4), 16),
+                    int(match.group(5)),
+                    None if match.group(6) is None else int(match.group(6))
+                ),
+            )
+        match = _HEAP_PATTERN.match(line)
+        if match is not None:
+            self.heap = int(match.group(1))
+            self.generation = None
+            return ()
+        match = _GENERATION_PATTERN.match(line)
+        if match is not None:
+            self.generation = match.group(1)
+        return ()
+
+
+class _HeapStatSectionParser(_SectionParser):
+    def __init__(self):
+        self.in_statistics = False
+
+    def feed(self, line: str):
+        # object rows come before statistics and may be billions of lines, skip them cheaply
+        if not self.in_statistics:
+            self.in_statistics = line.strip() == 'Statistics:'
+            return ()
+        match = _HEAP_STAT_PATTERN.match(line)
+        if match is None:
+            return ()
+        return (
+            HeapStatRecord(
+                int(match.group(1), 16),
+                int(match.group(2).replace(',', '')),
+                int(match.group(3).replace(',', '')),
+                match.group(4)
+            ),
+        )
+
+
+class _EEVersionSectionParser(_SectionParser):
+    def __init__(self):
+        self.runtime_version = None
+        self.gc_mode = None
+
+    def feed(self, line: str):
+        if self.runtime_version is None:
+            match = _EEVERSION_PATTERN.match(line)
+            if match is not None:
+                self.runtime_version = match.group(1)
+            return ()
+        match = _GC_MODE_PATTERN.match(line)
+        if match is not None:
+            self.gc_mode = match.group(1).capitalize()
+        return ()
+
+    def finish(self):
+        if self.runtime_version is None:
+            return ()
+        return (EEVersionRecord(self.runtime_version, self.gc_mode),)
+
+
+SECTION_PARSER_MAP = {
+    'clrthreads': _ThreadSectionParser,
+    'threads': _ThreadSectionParser,
+    'clrstack': _StackSectionParser,
+    'dso': _StackObjectSectionParser,
+    'dumpstackobjects': _StackObjectSectionParser,
+    'eeheap': _HeapSegmentSectionParser,
+    'dumpheap': _HeapStatSectionParser,
+    'eeversion': _EEVersionSectionParser,
+}
+
+
+def _create_section_parser(command: str) -> _SectionParser:
+    command_name = command.split(' ', 1)[0] if command != '' else ''
+    # `sos clrstack` of lldb and `!sos.clrstack` of cdb
+    if command_name == 'sos' and ' ' in command:
+        command_name = command.split(' ', 2)[1]
+    command_name = command_name.split('.')[-1]
+    return SECTION_PARSER_MAP.get(command_name, _SectionParser)()
+
+
+def iter_records(lines: Iterable[Union[str, bytes]],
+                 command_list: Optional[list[Union[str, bytes]]]=None) -> Iterator[SOSRecord]:
+    '''Split a transcript by prompt and yield records of each command.
+
+    Debuggers echo commands after the prompt when they are given a script, but dotnet-dump
+    analyze doesn't when commands are written to stdin, so the expected command list is used
+    to name sections that start without an echo.
+
+    :param lines: lines of transcript
+    :param command_list: commands written to debugger in order, None if transcript echoes commands
+    :return: a generator of records
+    '''
+    # debugger reads one command per line, however commands are chunked when they are written
+    expected_list = []
+    for command in command_list or []:
+        if isinstance(command, bytes):
+            command = command.decode('utf-8', errors='replace')
+        expected_list.extend(normalize_command(c) for c in command.splitlines() if c.strip() != '')
+    expected_index = 0
+    section_parser = _SectionParser()
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.rstrip('\r\n')
+
+        # commands without output leave several prompts on one line, e.g. `> > `
+        match = PROMPT_PATTERN.match(line)
+        while match is not None:
+            yield from section_parser.finish()
+            line = line[match.end():]
+            echo = normalize_command(line)
+            if echo != '' and echo in expected_list[expected_index:]:
+                expected_index = expected_list.index(echo, expected_index)
+            if expected_index < len(expected_list) and (echo == '' or echo == expected_list[expected_index]):
+                command = expected_list[expected_index]
+                expected_index += 1
+                if echo != '':
+                    line = ''
+            elif command_list is None:
+                command = echo
+                line = ''
+            else:
+                # output of the expected command follows the prompt directly
+                command = expected_list[expected_index] if expected_index < len(expected_list) else ''
+                expected_index += 1
+            yield CommandRecord(command, line_number)
+            section_parser = _create_section_parser(command)
+            match = PROMPT_PATTERN.match(line)
+
+        if line != '':
+            yield from section_parser.feed(line)
+    yield from section_parser.finish()
+
+
+def iter_records_from_file(transcript_path: str,
+                           command_list: Optional[list[Union[str, bytes]]]=None) -> Iterator[SOSRecord]:
+    '''Yield records of a transcript file.
+
+    :param transcript_path: path of transcript, e.g. sos_dump_debug.log
+    :param command_list: commands written to debugger in order, None if transcript echoes commands
+    :return: a generator of records
+    '''
+    with open(transcript_path, 'r', encoding='utf-8', errors='replace') as fp:
+        yield from iter_records(fp, command_list)
+
+
+def count_records(records: Iterable[SOSRecord]) -> dict[str, int]:
+    '''Count records by type.
+
+    :param records: records
+    :return: a dict maps record type name to count
+    '''
+    count_map: dict[str, int] = dict()
+    for record in records:
+        record_type = type(record).__name__
+        count_map[record_type] = count_map.get(record_type, 0) + 1
+    return count_map
@@ -91,6 +91,45 @@ def _get_debugger(rid: str) -> Union[str, Exception]:
     return Exception('debugger not found')
 
 
+def get_available_memory() -> Union[int, Exception]:
+    '''Get memory(bytes) available for new processes without swapping
+
+    :return: available memory or Exception if failed
+    '''
+    system = platform.system().lower()
+    try:
+        if system == 'linux':
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+            return Exception('MemAvailable is not found in /proc/meminfo')
+        if system == 'windows':
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ('dwLength', ctypes.c_ulong),
+                    ('dwMemoryLoad', ctypes.c_ulong),
+                    ('ullTotalPhys', ctypes.c_ulonglong),
+                    ('ullAvailPhys', ctypes.c_ulonglong),
+                    ('ullTotalPageFile', ctypes.c_ulonglong),
+                    ('ullAvailPageFile', ctypes.c_ulonglong),
+                    ('ullTotalVirtual', ctypes.c_ulonglong),
+                    ('ullAvailVirtual', ctypes.c_ulonglong),
+                    ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return Exception('GlobalMemoryStatusEx failed')
+            return status.ullAvailPhys
+    except Exception as ex:
+        return Exception(f'fail to get available memory: {ex}')
+    return Exception(f'available memory is unknown on {system}')
+
+
 class SysInfo:
     rid: str = _get_rid()
     debugger: str = _get_debugger(rid)
@@ -1,6 +1,8 @@
 '''wrappers for Popen'''
 
-from subprocess import Popen, PIPE
+import re
+import threading
+from subprocess import Popen, PIPE, TimeoutExpired
 from typing import Union, Iterable, Tuple
 
 import app
@@ -11,8 +13,8 @@ def log_terminal_command():
         def wrapper(*args, **kwargs):
             if func.__name__ == 'run_command_sync':
                 command, stdout, stderr = func(*args, **kwargs)
-                if app.logger is not None:
-                    app.logger.info(
+                if app.get_logger() is not None:
+                    app.get_logger().info(
                         '\n'.join(
                             [
                                 f'run command: {command}',
@@ -24,8 +26,8 @@ def log_terminal_command():
                 return command, stdout, stderr
             elif func.__name__ == 'run_command_async':
                 command, p = func(*args, **kwargs)
-                if app.logger is not None:
-                    app.logger.info(f'run command: {command}')
+                if app.get_logger() is not None:
+                    app.get_logger().info(f'run command: {command}')
                 return command, p
             else:
                 return Exception('not a valid command call')
@@ -98,3 +100,56 @@ def run_command_async(args: Iterable[str], **kwargs) -> Tuple[str, Popen]:
     print(f'run command: {command}:')
     p = Popen(args, **kwargs)
     return command, p
+
+
+def run_command_until_ready(args: Iterable[str],
+                            ready_pattern: str,
+                            log_path: str,
+                            timeout: float=120,
+                            **kwargs) -> Union[Tuple[str, Popen], Exception]:
+    '''Run command and return once a line of its stdout matches ready pattern.
+
+    Stdout is read from a pipe as lines arrive and copied into log file until the process exits,
+    so the process never blocks on a full pipe.
+
+    :param args: sequence of program arguments
+    :param ready_pattern: regular expression of the line telling the process is ready
+    :param log_path: file stdout is copied to
+    :param timeout: seconds to wait for ready line
+    :return: command and Popen object, or exception if the process exits or times out before it's ready
+    '''
+    kwargs['stdout'] = PIPE
+    command, p = run_command_async(args, **kwargs)
+
+    pattern = re.compile(ready_pattern)
+    matched = threading.Event()
+    settled = threading.Event()
+
+    def pump_stdout():
+        try:
+            with open(log_path, 'wb') as fp:
+                for line in iter(p.stdout.readline, b''):
+                    fp.write(line)
+                    fp.flush()
+                    if not matched.is_set() and pattern.search(line.decode('utf-8', errors='replace')):
+                        matched.set()
+                        settled.set()
+        finally:
+            # stdout is closed, the ready line will never come
+            settled.set()
+
+    threading.Thread(target=pump_stdout, daemon=True).start()
+    settled.wait(timeout)
+    if matched.is_set():
+        return command, p
+
+    if settled.is_set():
+        # stdout is closed, give the process a moment to exit
+        try:
+            p.wait(5)
+            return Exception(f'{command} exits with {p.returncode} before it is ready, see {log_path}')
+        except TimeoutExpired:
+            pass
+    p.kill()
+    p.wait()
+    return Exception(f'{command} is not ready in {timeout}s, see {log_path}')
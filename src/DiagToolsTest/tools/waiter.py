@@ -0,0 +1,163 @@
+'''Wait for conditions instead of sleeping for fixed time'''
+
+import os
+import time
+import select
+from subprocess import Popen, TimeoutExpired
+from typing import Callable, Optional, Union
+
+
+# seconds between checks of conditions that can't be waited on directly
+POLL_INTERVAL = 0.2
+
+
+def wait_until(predicate: Callable[[], bool],
+               timeout: Optional[float],
+               poll_interval: float=POLL_INTERVAL) -> bool:
+    '''Check predicate until it holds or timeout passes
+
+    :param predicate: condition to wait for
+    :param timeout: seconds to wait, forever if it's None
+    :param poll_interval: seconds between checks
+    :return: whether predicate holds
+    '''
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        if predicate():
+            return True
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(poll_interval, remaining))
+        else:
+            time.sleep(poll_interval)
+
+
+def wait_for_process_exit(proc: Popen, timeout: Optional[float]=None) -> Union[int, Exception]:
+    '''Wait for a process to exit
+
+    On Linux the process is waited on through a pidfd, so the wait ends as soon as
+    the process exits; elsewhere Popen.wait is used.
+
+    :param proc: Popen instance
+    :param timeout: seconds to wait, forever if it's None
+    :return: exit code, or exception if the process is still running after timeout
+    '''
+    if proc.returncode is not None:
+        return proc.returncode
+
+    if hasattr(os, 'pidfd_open'):
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except OSError:
+            # process is reaped already, or pidfd isn't supported by kernel
+            pidfd = None
+        if pidfd is not None:
+            try:
+                poller = select.poll()
+                poller.register(pidfd, select.POLLIN)
+                if len(poller.poll(None if timeout is None else int(timeout * 1000))) == 0:
+                    return Exception(f'process {proc.pid} is still running after {timeout}s')
+            finally:
+                os.close(pidfd)
+            # reap the process so Popen knows its exit code
+            return proc.wait()
+
+    try:
+        return proc.wait(timeout)
+    except TimeoutExpired:
+        return Exception(f'process {proc.pid} is still running after {timeout}s')
+
+
+def terminate_process(proc: Popen, timeout: float=30) -> Union[int, Exception]:
+    '''Terminate a process and wait for it to exit, kill it if it ignores termination
+
+    :param proc: Popen instance
+    :param timeout: seconds to wait after termination
+    :return: exit code
+    '''
+    if proc.poll() is None:
+        proc.terminate()
+    returncode = wait_for_process_exit(proc, timeout)
+    if isinstance(returncode, Exception):
+        print(f'{returncode}, kill it')
+        proc.kill()
+        returncode = wait_for_process_exit(proc)
+    return returncode
+
+
+def wait_for_csv_rows(csv_path: str,
+                      row_count: int,
+                      timeout: float,
+                      proc: Optional[Popen]=None,
+                      poll_interval: float=POLL_INTERVAL) -> Union[int, Exception]:
+    '''Wait until a csv file written by another process has enough data rows
+
+    Only bytes appended since the last check are read.
+
+    :param csv_path: path of csv file, the first line is header
+    :param row_count: number of data rows to wait for
+    :param timeout: seconds to wait
+    :param proc: process writing the file, waiting stops if it exits
+    :param poll_interval: seconds between checks
+    :return: number of data rows, or exception if there aren't enough rows
+    '''
+    offset = 0
+    line_count = 0
+
+    def enough_rows():
+        nonlocal offset, line_count
+        try:
+            with open(csv_path, 'rb') as fp:
+                fp.seek(offset)
+                content = fp.read()
+        except FileNotFoundError:
+            content = b''
+        offset += len(content)
+        line_count += content.count(b'\n')
+        if line_count - 1 >= row_count:
+            return True
+        return proc is not None and proc.poll() is not None
+
+    wait_until(enough_rows, timeout, poll_interval)
+    data_row_count = max(line_count - 1, 0)
+    if data_row_count < row_count:
+        return Exception(f'{csv_path} has {data_row_count} rows, expect {row_count}')
+    return data_row_count
+
+
+def wait_for_file_size_stable(file_path: str,
+                              stable_secs: float,
+                              timeout: float,
+                              poll_interval: float=POLL_INTERVAL) -> Union[int, Exception]:
+    '''Wait until a file exists and its size stops changing
+
+    :param file_path: file path
+    :param stable_secs: seconds the size has to stay the same
+    :param timeout: seconds to wait
+    :param poll_interval: seconds between checks
+    :return: file size, or exception if the file is missing or still growing
+    '''
+    last_size = None
+    stable_since = None
+
+    def size_stable():
+        nonlocal last_size, stable_since
+        try:
+            size = os.path.getsize(file_path)
+        except FileNotFoundError:
+            last_size = None
+            return False
+        now = time.monotonic()
+        if size != last_size:
+            last_size = size
+            stable_since = now
+            return False
+        return now - stable_since >= stable_secs
+
+    if not wait_until(size_stable, timeout, poll_interval):
+        if last_size is None:
+            return Exception(f'{file_path} is not created in {timeout}s')
+        return Exception(f'{file_path} is still changing after {timeout}s')
+    return last_size
@@ -1,9 +1,23 @@
 '''Implement lttng test command runner
 '''
 
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from eazycli import add_argument, CommandLineArguments, CommandRunner
 
-from test_runner.lttng_test.config import generate_lttng_test_config
+from core_functionality import common
+from core_functionality import artifact_cache
+from core_functionality.scheduler import StepScheduler, StepResult
+from core_functionality.dotnet.build_session import shutdown_build_server
+
+from test_runner.lttng_test.config import (
+    generate_lttng_test_config,
+    get_isolated_test_bed,
+    get_isolated_home
+)
 from test_runner.lttng_test.test_runner import LTTngTestRunner
 from test_runner.lttng_test.lttng_test import test_lttng
 
@@ -15,6 +29,90 @@ class TestLTTngCommandLineArguments(CommandLineArguments):
         '''Get configuration path from command line.
         '''
 
+    @add_argument('--init-workers', type=int, default=None)
+    def init_workers(self):
+        '''Get maximum number of initialization steps running at the same time.
+        '''
+
+    @add_argument('--cache-root', default=None)
+    def cache_root(self):
+        '''Get folder of downloaded script cache.
+        '''
+
+    @add_argument('--offline', action='store_true')
+    def offline(self):
+        '''Get whether to use cached scripts without network access.
+        '''
+
+    @add_argument('-j', '--jobs', type=int, default=1)
+    def jobs(self):
+        '''Get number of worker processes; each SDK version runs in its own testbed if it's above 1.
+        '''
+
+
+def _run_lttng_test_job(configuration_path: str, version: str, init_workers: int=None):
+    '''Run LTTng test for one SDK version in a worker process.
+
+    The worker gets a dedicated testbed, HOME and log.
+
+    :param configuration_path: path of toml file
+    :param version: full version of .NET SDK
+    :param init_workers: maximum number of initialization steps running at the same time
+    :return: whether the test is run
+    '''
+    base_config = common.parse_toml(configuration_path)
+    test_bed = get_isolated_test_bed(base_config.Test.TestBed, version)
+    home = get_isolated_home(base_config.Test.TestBed, version)
+    os.makedirs(home, exist_ok=True)
+    os.environ['HOME'] = home
+    if common.rid_os_name() == 'win':
+        os.environ['USERPROFILE'] = home
+
+    # redirect output of worker and its children to worker log
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with open(os.path.join(test_bed, f'worker-{version}.log'), 'a+', encoding='utf-8') as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+
+    lttng_test_config_list = generate_lttng_test_config(
+        configuration_path, version_list=[version], isolate_test_bed=True)
+    return _run_lttng_tests(lttng_test_config_list, init_workers)[0]
+
+
+def _run_lttng_tests(lttng_test_config_list: list, init_workers: int=None) -> list[bool]:
+    '''Initialize all configs concurrently, then run tests one by one.
+
+    :param lttng_test_config_list: a list of LTTngTestConfig instance
+    :param init_workers: maximum number of initialization steps running at the same time
+    :return: whether each test is run
+    '''
+    runner_list = [
+        LTTngTestRunner(lttng_test_config, initialize=False)
+        for lttng_test_config in lttng_test_config_list
+    ]
+
+    # initialize all SDK versions concurrently
+    scheduler = StepScheduler(init_workers)
+    last_step_list = [runner.add_initialization_steps(scheduler) for runner in runner_list]
+    step_result_map = scheduler.run()
+
+    # build servers stay alive after build; stop them so they don't disturb tracing
+    for lttng_test_config in lttng_test_config_list:
+        if os.path.exists(lttng_test_config.DotNetEnvironment.dotnet_executable):
+            shutdown_build_server(lttng_test_config.DotNetEnvironment)
+
+    run_list = []
+    for runner, last_step in zip(runner_list, last_step_list):
+        if step_result_map[last_step].status != StepResult.SUCCEEDED:
+            print(f'skip test: fail to initialize, see {runner.init_logger_path}')
+            run_list.append(False)
+            continue
+        runner.run_test_with_gcperfsim(test_lttng)
+        run_list.append(True)
+    return run_list
+
+
 class TestLTTngCommandRunner(CommandRunner, TestLTTngCommandLineArguments):
     '''Implement runner for test-lttng command.
     '''
@@ -23,8 +121,43 @@ class TestLTTngCommandRunner(CommandRunner, TestLTTngCommandLineArguments):
 
         :param cli_args: a TestLTTngCommandLineArgument
         '''
-        lttng_test_config_list = generate_lttng_test_config(
-            command_line_arguments.configuration_path)
-        for lttng_test_config in lttng_test_config_list:
-            runner = LTTngTestRunner(lttng_test_config)
-            runner.run_test_with_gcperfsim(test_lttng)
+        # pass cache settings through environment so worker processes share the cache
+        if command_line_arguments.cache_root is not None:
+            os.environ[artifact_cache.CACHE_ROOT_ENV] = command_line_arguments.cache_root
+        if command_line_arguments.offline:
+            os.environ[artifact_cache.OFFLINE_ENV] = '1'
+
+        if command_line_arguments.jobs <= 1:
+            lttng_test_config_list = generate_lttng_test_config(
+                command_line_arguments.configuration_path)
+            _run_lttng_tests(lttng_test_config_list, command_line_arguments.init_workers)
+            return
+
+        base_config = common.parse_toml(command_line_arguments.configuration_path)
+        for version in base_config.DotNet.VersionList:
+            os.makedirs(get_isolated_test_bed(base_config.Test.TestBed, version), exist_ok=True)
+
+        # one process per SDK version; the process is not reused since HOME and fds are changed
+        with ProcessPoolExecutor(
+            max_workers=command_line_arguments.jobs,
+            mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=1
+        ) as executor:
+            future_map = {
+                version: executor.submit(
+                    _run_lttng_test_job,
+                    command_line_arguments.configuration_path,
+                    version,
+                    command_line_arguments.init_workers
+                )
+                for version in base_config.DotNet.VersionList
+            }
+            for version, future in future_map.items():
+                try:
+                    run = future.result()
+                except Exception as ex:
+                    print(f'fail to run test for {version}: {ex}')
+                    continue
+                if not run:
+                    test_bed = get_isolated_test_bed(base_config.Test.TestBed, version)
+                    print(f'skip test for {version}, see {test_bed}')
@@ -0,0 +1,168 @@
+'''Cache downloaded scripts and artifacts on disk
+'''
+
+import os
+import json
+import time
+import shutil
+import hashlib
+from threading import Lock, get_ident
+from urllib import request
+from urllib.error import HTTPError, URLError
+from http.client import HTTPResponse
+
+from core_functionality import common
+
+CACHE_ROOT_ENV = 'DIAGTOOLS_CACHE_ROOT'
+CACHE_TTL_ENV = 'DIAGTOOLS_CACHE_TTL_SECS'
+OFFLINE_ENV = 'DIAGTOOLS_OFFLINE'
+
+
+class ArtifactCache:
+    '''Download artifacts once and revalidate them with ETag/Last-Modified after TTL expires.
+    '''
+    def __init__(self, cache_root: str, ttl_secs: float=24*60*60, offline: bool=False):
+        '''
+        :param cache_root: cache folder
+        :param ttl_secs: time(seconds) a cached artifact is used without revalidation
+        :param offline: whether to use cached artifacts without any network access
+        '''
+        self.__cache_root = cache_root
+        self.__ttl_secs = ttl_secs
+        self.__offline = offline
+        self.__lock = Lock()
+        self.__key_lock_map: dict[str, Lock] = dict()
+
+    @property
+    def cache_root(self):
+        '''Get cache folder.
+        '''
+        return self.__cache_root
+
+    @property
+    def offline(self):
+        '''Get whether network access is disabled.
+        '''
+        return self.__offline
+
+    def __key_lock(self, key: str):
+        with self.__lock:
+            if key not in self.__key_lock_map:
+                self.__key_lock_map[key] = Lock()
+            return self.__key_lock_map[key]
+
+    def get_cache_path(self, url: str):
+        '''Get path of cached artifact for url.
+
+        :param url: url of artifact
+        :return: cache path
+        '''
+        url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.__cache_root, f'{url_hash}-{os.path.basename(url)}')
+
+    def fetch(self, url: str):
+        '''Get cached artifact, downloading or revalidating it if needed.
+
+        :param url: url of artifact(http protocal)
+        :return: cache path
+        '''
+        cache_path = self.get_cache_path(url)
+        metadata_path = f'{cache_path}.json'
+        os.makedirs(self.__cache_root, exist_ok=True)
+
+        with self.__key_lock(cache_path), common.FileLock(f'{cache_path}.lock'):
+            metadata = dict()
+            if os.path.exists(cache_path) and os.path.exists(metadata_path):
+                with open(metadata_path, 'r', encoding='utf-8') as fp:
+                    metadata = json.load(fp)
+
+            if len(metadata) > 0:
+                if self.__offline or time.time() - metadata['fetched_at'] < self.__ttl_secs:
+                    return cache_path
+            elif self.__offline:
+                raise FileNotFoundError(f'{url} is not cached in {self.__cache_root}')
+
+            try:
+                self.__download(url, cache_path, metadata)
+            except (HTTPError, URLError, OSError) as ex:
+                if len(metadata) == 0:
+                    raise
+                print(f'fail to revalidate {url}, use cached copy: {ex}')
+                return cache_path
+
+            metadata['fetched_at'] = time.time()
+            with open(metadata_path, 'w', encoding='utf-8') as fp:
+                json.dump(metadata, fp)
+            return cache_path
+
+    def __download(self, url: str, cache_path: str, metadata: dict):
+        '''Send conditional request and replace cached copy if it's modified.
+
+        :param url: url of artifact
+        :param cache_path: cache path
+        :param metadata: metadata of cached copy, updated in place
+        '''
+        req = request.Request(url)
+        if metadata.get('etag') is not None:
+            req.add_header('If-None-Match', metadata['etag'])
+        if metadata.get('last_modified') is not None:
+            req.add_header('If-Modified-Since', metadata['last_modified'])
+
+        try:
+            response: HTTPResponse = request.urlopen(req)
+        except HTTPError as ex:
+            if ex.code == 304:
+                return
+            raise
+
+        temp_path = f'{cache_path}.part'
+        with response, open(temp_path, 'wb') as fp:
+            while True:
+                buffer = response.read(1024*1024)
+                if len(buffer) == 0:
+                    break
+                fp.write(buffer)
+        os.replace(temp_path, cache_path)
+
+        metadata['url'] = url
+        metadata['etag'] = response.headers.get('ETag')
+        metadata['last_modified'] = response.headers.get('Last-Modified')
+
+    def fetch_to(self, url: str, destination_path: str):
+        '''Place cached artifact at destination.
+
+        :param url: url of artifact(http protocal)
+        :param destination_path: destination path
+        :return: destination path
+        '''
+        cache_path = self.fetch(url)
+        # threads may place the same artifact at the same destination concurrently
+        temp_path = f'{destination_path}.{os.getpid()}.{get_ident()}.part'
+        shutil.copyfile(cache_path, temp_path)
+        os.replace(temp_path, destination_path)
+        return destination_path
+
+
+__DEFAULT_CACHE: ArtifactCache = None
+__DEFAULT_CACHE_LOCK = Lock()
+
+
+def default_artifact_cache():
+    '''Get artifact cache shared in process.
+
+    Settings are read from environment variables so that worker processes share them:
+    DIAGTOOLS_CACHE_ROOT, DIAGTOOLS_CACHE_TTL_SECS and DIAGTOOLS_OFFLINE.
+
+    :return: ArtifactCache instance
+    '''
+    global __DEFAULT_CACHE
+    with __DEFAULT_CACHE_LOCK:
+        if __DEFAULT_CACHE is None:
+            cache_root = os.environ.get(
+                CACHE_ROOT_ENV,
+                os.path.join(common.user_profile(), '.diagtoolstestrunner', 'cache')
+            )
+            ttl_secs = float(os.environ.get(CACHE_TTL_ENV, 24*60*60))
+            offline = os.environ.get(OFFLINE_ENV, '').lower() in ['1', 'true', 'yes', 'y']
+            __DEFAULT_CACHE = ArtifactCache(cache_root, ttl_secs, offline)
+        return __DEFAULT_CACHE
@@ -2,10 +2,136 @@
 '''
 
 import os
-from tempfile import TemporaryDirectory
-from threading import Thread, Lock
+import codecs
+import asyncio
+import selectors
+from threading import Thread
 from subprocess import Popen, PIPE, SubprocessError
-from typing import Generator, Any
+from typing import Callable, Generator, AsyncGenerator, Any
+
+from core_functionality.output_buffer import OutputBuffer
+
+
+class _LineSplitter:
+    '''Decode byte chunks incrementally and dispatch non-empty lines.
+    '''
+    def __init__(self, line_consumer: Callable[[str], None]):
+        '''
+        :param line_consumer: callable invoked with every line(without line break)
+        '''
+        self.__decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.__pending = ''
+        self.__line_consumer = line_consumer
+
+    def feed(self, data: bytes):
+        '''Feed a chunk; empty data stands for EOF and flushes the pending line.
+
+        :param data: bytes read from pipe
+        '''
+        eof = len(data) == 0
+        text = self.__pending + self.__decoder.decode(data, final=eof)
+        lines = text.split('\n')
+        self.__pending = '' if eof else lines.pop()
+        for line in lines:
+            line = line.rstrip('\r')
+            if line.strip() == '':
+                continue
+            self.__line_consumer(line)
+
+
+class _PipeReader:
+    '''Read output pipes of a process and dispatch decoded lines.
+
+    On POSIX all pipes are multiplexed by one selector thread which sleeps until bytes arrive.
+    On Windows, where pipes can't be selected, every pipe gets a thread doing blocking reads.
+    '''
+    def __init__(self, chunk_size: int=64*1024):
+        '''
+        :param chunk_size: maximum number of bytes read from a pipe at once
+        '''
+        self.__chunk_size = chunk_size
+        self.__pipe_state_list: list[tuple[Any, _LineSplitter]] = []
+        self.__thread_list: list[Thread] = []
+        self.__use_selector = os.name == 'posix'
+        self.__wakeup_read_fd = None
+        self.__wakeup_write_fd = None
+
+    def register(self, pipe, line_consumer: Callable[[str], None]):
+        '''Register a pipe before starting.
+
+        :param pipe: readable pipe
+        :param line_consumer: callable invoked with every line(without line break)
+        '''
+        self.__pipe_state_list.append((pipe, _LineSplitter(line_consumer)))
+
+    def start(self):
+        '''Start reading registered pipes.
+        '''
+        if self.__use_selector:
+            self.__wakeup_read_fd, self.__wakeup_write_fd = os.pipe()
+            self.__thread_list.append(Thread(target=self.__select_loop, daemon=True))
+        else:
+            for pipe_state in self.__pipe_state_list:
+                self.__thread_list.append(
+                    Thread(target=self.__blocking_loop, args=(pipe_state,), daemon=True))
+        for thread in self.__thread_list:
+            thread.start()
+
+    def join(self, timeout: float=None):
+        '''Wait until all pipes reach EOF.
+
+        :param timeout: timeout(seconds) for each reader thread
+        :return: whether all pipes are drained
+        '''
+        for thread in self.__thread_list:
+            thread.join(timeout)
+        return not any(thread.is_alive() for thread in self.__thread_list)
+
+    def stop(self):
+        '''Stop reading even if pipes are still open, e.g. inherited by grandchild process.
+        '''
+        if self.__wakeup_write_fd is not None:
+            os.write(self.__wakeup_write_fd, b'\0')
+
+    def close(self):
+        '''Release wakeup pipe.
+        '''
+        for fd in [self.__wakeup_read_fd, self.__wakeup_write_fd]:
+            if fd is not None:
+                os.close(fd)
+        self.__wakeup_read_fd = None
+        self.__wakeup_write_fd = None
+
+    def __select_loop(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.__wakeup_read_fd, selectors.EVENT_READ, None)
+            for pipe_state in self.__pipe_state_list:
+                selector.register(pipe_state[0], selectors.EVENT_READ, pipe_state)
+
+            remaining = len(self.__pipe_state_list)
+            while remaining > 0:
+                for key, _ in selector.select():
+                    pipe_state = key.data
+                    if pipe_state is None:
+                        for _, splitter in self.__pipe_state_list:
+                            splitter.feed(b'')
+                        return
+                    data = os.read(key.fd, self.__chunk_size)
+                    pipe_state[1].feed(data)
+                    if len(data) == 0:
+                        selector.unregister(key.fileobj)
+                        remaining -= 1
+
+    def __blocking_loop(self, pipe_state):
+        fd = pipe_state[0].fileno()
+        while True:
+            try:
+                data = os.read(fd, self.__chunk_size)
+            except OSError:
+                data = b''
+            pipe_state[1].feed(data)
+            if len(data) == 0:
+                break
 
 
 class CommandInvoker(Popen):
@@ -17,129 +143,81 @@ class CommandInvoker(Popen):
                  env=None,
                  redirect_std_in=True,
                  redirect_std_out_err=True,
-                 silent=True):
+                 silent=True,
+                 drain_timeout: float=5,
+                 output_buffer_factory: Callable[[], OutputBuffer]=OutputBuffer):
         '''
         :param args: command in string list format
         :param cwd: working directory
         :param env: environment variables
         :param redirect_std_out_err: whether to redirect stardard output and err
         :param silent: whether to suppress console output
+        :param drain_timeout: time(seconds) to wait for pipes after process exit
+        :param output_buffer_factory: callable creating buffer for standard output and err
         '''
-        self.__lock = Lock()
-        self.__stop_signal = False
         self.__redirect_std_out_err = redirect_std_out_err
         self.__silent: bool = silent
+        self.__drain_timeout = drain_timeout
 
         self.__command = ' '.join(args)
 
-        self.__temp_dir = TemporaryDirectory()
-        self.__std_out_file = os.path.join(self.__temp_dir.name, 'out.txt')
-        self.__std_err_file = os.path.join(self.__temp_dir.name, 'err.txt')
-        self.__stdout_write_stream = open(
-            self.__std_out_file, mode='w+', encoding='utf-8'
-        ) if self.__redirect_std_out_err else None
-        self.__stderr_write_stream = open(
-            self.__std_err_file, mode='w+', encoding='utf-8'
-        ) if self.__redirect_std_out_err else None
-
-        self.__stdout: str = ''
-        self.__stderr: str = ''
+        self.__stdout = output_buffer_factory()
+        self.__stderr = output_buffer_factory()
 
         print(f'run command: {self.__command}')
-        try:
-            stdin = PIPE if redirect_std_in else None
-            super().__init__(args,
-                            bufsize=1,
-                            cwd=cwd,
-                            env=env,
-                            stdin=stdin,
-                            stdout=self.__stdout_write_stream,
-                            stderr=self.__stderr_write_stream,
-                            universal_newlines=True)
-        except Exception:
-            self.__stdout_write_stream.close()
-            self.__stderr_write_stream.close()
-            self.__temp_dir.cleanup()
-            raise
+        stdin = PIPE if redirect_std_in else None
+        std_out_err = PIPE if self.__redirect_std_out_err else None
+        super().__init__(args,
+                         bufsize=1,
+                         cwd=cwd,
+                         env=env,
+                         stdin=stdin,
+                         stdout=std_out_err,
+                         stderr=std_out_err,
+                         universal_newlines=True)
 
         if self.__redirect_std_out_err:
-            self.__stdout_reader = Thread(target=self.__stdout_pipe_consumer)
-            self.__stdout_reader.start()
-            self.__stderr_reader = Thread(target=self.__stderr_pipe_consumer)
-            self.__stderr_reader.start()
+            # take over pipes so that Popen.communicate only handles stdin and waiting
+            self.__stdout_pipe, self.stdout = self.stdout, None
+            self.__stderr_pipe, self.stderr = self.stderr, None
+            self.__pipe_reader = _PipeReader()
+            self.__pipe_reader.register(self.__stdout_pipe, self.__stdout_line_consumer)
+            self.__pipe_reader.register(self.__stderr_pipe, self.__stderr_line_consumer)
+            self.__pipe_reader.start()
 
-    def __stdout_pipe_consumer(self):
-        stop_signal = False
-        try:
-            with open(self.__std_out_file, mode='r+', encoding='utf-8') as stdout_read_stream:
-                while self.returncode is None:
-                    self.__lock.acquire()
-                    stop_signal = self.__stop_signal
-                    self.__lock.release()
-                    if stop_signal:
-                        for _line in stdout_read_stream.readlines():
-                            if _line.strip() in [None, '', '\n', '\r', '\r\n']:
-                                continue
-                            self.__stdout += f'{_line}\n'
-                            if not self.__silent:
-                                print(f'    {_line}')
-                        break
-
-                    line = stdout_read_stream.readline()
-                    if line.strip() in [None, '', '\n', '\r', '\r\n']:
-                        continue
-                    self.__stdout += f'{line}\n'
-                    if not self.__silent:
-                        print(f'    {line}')
-        except Exception:
-            self.__stdout_write_stream.close()
-            self.__stderr_write_stream.close()
-            self.__temp_dir.cleanup()
-            raise
-
-    def __stderr_pipe_consumer(self):
-        stop_signal = False
-        try:
-            with open(self.__std_err_file, mode='r+', encoding='utf-8') as stderr_read_stream:
-                while self.returncode is None:
-                    self.__lock.acquire()
-                    stop_signal = self.__stop_signal
-                    self.__lock.release()
-                    if stop_signal:
-                        for _line in stderr_read_stream.readlines():
-                            if _line.strip() in [None, '', '\n', '\r', '\r\n']:
-                                continue
-                            self.__stderr += f'{_line}\n'
-                            if not self.__silent:
-                                print(f'    {_line}')
-                        break
-
-                    line = stderr_read_stream.readline()
-                    if line.strip() in [None, '', '\n', '\r', '\r\n']:
-                        continue
-                    self.__stderr += f'{line}\n'
-                    if not self.__silent:
-                        print(f'    {line}')
-        except Exception:
-            self.__stdout_write_stream.close()
-            self.__stderr_write_stream.close()
-            self.__temp_dir.cleanup()
-            raise
+    def __stdout_line_consumer(self, line: str):
+        self.__stdout.append(f'{line}\n')
+        if not self.__silent:
+            print(f'    {line}')
+
+    def __stderr_line_consumer(self, line: str):
+        self.__stderr.append(f'{line}\n')
+        if not self.__silent:
+            print(f'    {line}')
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, value, traceback):
-        self.__lock.acquire()
-        self.__stop_signal = True
-        self.__lock.release()
-        if self.__redirect_std_out_err:
-            self.__stdout_reader.join()
-            self.__stdout_write_stream.close()
-            self.__stderr_reader.join()
-            self.__stderr_write_stream.close()
-            self.__temp_dir.cleanup()
-        return super().__exit__(exc_type, value, traceback)
+        try:
+            return super().__exit__(exc_type, value, traceback)
+        finally:
+            if self.__redirect_std_out_err:
+                if not self.__pipe_reader.join(self.__drain_timeout):
+                    self.__pipe_reader.stop()
+                    self.__pipe_reader.join()
+                self.__pipe_reader.close()
+                self.__stdout_pipe.close()
+                self.__stderr_pipe.close()
+            # output of a failed block is never logged, drop it and its spill files now
+            if exc_type is not None:
+                self.close_output()
+
+    def close_output(self):
+        '''Release output buffers, including their spill files.
+        '''
+        self.__stdout.close()
+        self.__stderr.close()
 
     @property
     def command(self):
@@ -151,15 +229,222 @@ class CommandInvoker(Popen):
     def standard_output(self):
         '''Get standard output
         '''
+        return self.__stdout.getvalue()
+
+    @property
+    def standard_error(self):
+        '''Get standard error
+        '''
+        return self.__stderr.getvalue()
+
+    @property
+    def standard_output_buffer(self):
+        '''Get buffer of standard output
+        '''
         return self.__stdout
 
+    @property
+    def standard_error_buffer(self):
+        '''Get buffer of standard error
+        '''
+        return self.__stderr
+
+
+class AsyncCommandInvoker:
+    '''asyncio counterpart of CommandInvoker built on asyncio.create_subprocess_exec.
+    '''
+    def __init__(self,
+                 args: list[str],
+                 cwd=None,
+                 env=None,
+                 redirect_std_in=True,
+                 redirect_std_out_err=True,
+                 silent=True,
+                 output_buffer_factory: Callable[[], OutputBuffer]=OutputBuffer,
+                 chunk_size: int=64*1024):
+        '''
+        :param args: command in string list format
+        :param cwd: working directory
+        :param env: environment variables
+        :param redirect_std_in: whether to redirect stardard input
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        :param output_buffer_factory: callable creating buffer for standard output and err
+        :param chunk_size: maximum number of bytes read from a pipe at once
+        '''
+        self.__args = args
+        self.__cwd = cwd
+        self.__env = env
+        self.__redirect_std_in = redirect_std_in
+        self.__redirect_std_out_err = redirect_std_out_err
+        self.__silent: bool = silent
+        self.__chunk_size = chunk_size
+
+        self.__command = ' '.join(args)
+
+        self.__stdout = output_buffer_factory()
+        self.__stderr = output_buffer_factory()
+
+        self.__process: asyncio.subprocess.Process = None
+        self.__reader_tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        '''Start the process.
+        '''
+        print(f'run command: {self.__command}')
+        stdin = asyncio.subprocess.PIPE if self.__redirect_std_in else None
+        std_out_err = asyncio.subprocess.PIPE if self.__redirect_std_out_err else None
+        self.__process = await asyncio.create_subprocess_exec(
+            *self.__args,
+            cwd=self.__cwd,
+            env=self.__env,
+            stdin=stdin,
+            stdout=std_out_err,
+            stderr=std_out_err
+        )
+
+        if self.__redirect_std_out_err:
+            self.__reader_tasks = [
+                asyncio.create_task(self.__consume_stream(self.__process.stdout, self.__stdout)),
+                asyncio.create_task(self.__consume_stream(self.__process.stderr, self.__stderr))
+            ]
+        return self
+
+    async def __consume_stream(self, stream: asyncio.StreamReader, buffer: OutputBuffer):
+        def line_consumer(line: str):
+            buffer.append(f'{line}\n')
+            if not self.__silent:
+                print(f'    {line}')
+
+        splitter = _LineSplitter(line_consumer)
+        while True:
+            data = await stream.read(self.__chunk_size)
+            splitter.feed(data)
+            if len(data) == 0:
+                break
+
+    async def communicate(self, input: str=None):
+        '''Send input, wait for the output pipes to be drained and the process to exit.
+
+        :param input: text sent to standard input
+        :return: return code
+        '''
+        if self.__process.stdin is not None:
+            if input is not None:
+                self.__process.stdin.write(input.encode('utf-8'))
+                try:
+                    await self.__process.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            self.__process.stdin.close()
+        await asyncio.gather(*self.__reader_tasks)
+        return await self.__process.wait()
+
+    async def wait(self):
+        '''Wait for the process to exit.
+
+        :return: return code
+        '''
+        return await self.__process.wait()
+
+    def terminate(self):
+        '''Terminate the process.
+        '''
+        if self.__process.returncode is None:
+            self.__process.terminate()
+
+    def kill(self):
+        '''Kill the process.
+        '''
+        if self.__process.returncode is None:
+            self.__process.kill()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, value, traceback):
+        # don't wait for a process nobody will communicate with any more
+        if exc_type is not None:
+            self.kill()
+        if self.__process.stdin is not None:
+            self.__process.stdin.close()
+        await asyncio.gather(*self.__reader_tasks)
+        await self.__process.wait()
+        if exc_type is not None:
+            self.close_output()
+
+    def close_output(self):
+        '''Release output buffers, including their spill files.
+        '''
+        self.__stdout.close()
+        self.__stderr.close()
+
+    @property
+    def command(self):
+        '''Get invoked command
+        '''
+        return self.__command
+
+    @property
+    def pid(self):
+        '''Get process id
+        '''
+        return self.__process.pid
+
+    @property
+    def returncode(self):
+        '''Get return code
+        '''
+        return self.__process.returncode
+
+    @property
+    def standard_output(self):
+        '''Get standard output
+        '''
+        return self.__stdout.getvalue()
+
     @property
     def standard_error(self):
         '''Get standard error
         '''
+        return self.__stderr.getvalue()
+
+    @property
+    def standard_output_buffer(self):
+        '''Get buffer of standard output
+        '''
+        return self.__stdout
+
+    @property
+    def standard_error_buffer(self):
+        '''Get buffer of standard error
+        '''
         return self.__stderr
 
 
+def write_invoker_output(logger_path: str,
+                          invoker: CommandInvoker | AsyncCommandInvoker | None,
+                          content: list[str]):
+    '''Append command and its output to logger.
+
+    Output of the invoker is released once it's written.
+
+    :param logger_path: logger path
+    :param invoker: a finished CommandInvoker or AsyncCommandInvoker instance
+    :param content: extra lines
+    '''
+    with open(logger_path, 'a+', encoding='utf-8') as logger:
+        if invoker is not None:
+            # copy output buffers block by block instead of materializing them
+            logger.write(f'Run command: {invoker.command}\n')
+            invoker.standard_output_buffer.write_to(logger)
+            logger.write('\n')
+            invoker.standard_error_buffer.write_to(logger)
+            logger.write('\n')
+            invoker.close_output()
+        logger.writelines(content)
+
+
 def command_sequence_runner(logger_path: str,
                             command_invoke_sequence: Generator[CommandInvoker, Any, None],
                             ignore_error: bool=False):
@@ -169,21 +454,53 @@ def command_sequence_runner(logger_path: str,
     :param command_invoke_sequence: a Generator[CommandInvoker] instance
     :param ignore_error: whether to ignore error 
     '''
+    invoker = None
     while True:
         content = []
+        finished_invoker = None
         try:
             invoker = next(command_invoke_sequence)
-            content.append(f'Run command: {invoker.command}\n')
-            content.append(f'{invoker.standard_output}\n')
-            content.append(f'{invoker.standard_error}\n')
+            finished_invoker = invoker
         except StopIteration:
             break
         except SubprocessError as ex:
-            content.append(f'Fail to run command \"{invoker.command}\": {ex}\n')
+            command = invoker.command if invoker is not None else ''
+            content.append(f'Fail to run command \"{command}\": {ex}\n')
+            if not ignore_error:
+                break
+            else:
+                continue
+        finally:
+            write_invoker_output(logger_path, finished_invoker, content)
+
+
+async def async_command_sequence_runner(
+        logger_path: str,
+        command_invoke_sequence: AsyncGenerator[AsyncCommandInvoker, None],
+        ignore_error: bool=False):
+    '''Run AsyncGenerator[AsyncCommandInvoker].
+
+    Several sequences can be driven by one event loop with asyncio.gather.
+
+    :param logger_path: logger path
+    :param command_invoke_sequence: an AsyncGenerator[AsyncCommandInvoker] instance
+    :param ignore_error: whether to ignore error
+    '''
+    invoker = None
+    while True:
+        content = []
+        finished_invoker = None
+        try:
+            invoker = await anext(command_invoke_sequence)
+            finished_invoker = invoker
+        except StopAsyncIteration:
+            break
+        except (SubprocessError, OSError) as ex:
+            command = invoker.command if invoker is not None else ''
+            content.append(f'Fail to run command \"{command}\": {ex}\n')
             if not ignore_error:
                 break
             else:
                 continue
         finally:
-            with open(logger_path, 'a+', encoding='utf-8') as logger:
-                logger.writelines(content)
+            await asyncio.to_thread(write_invoker_output, logger_path, finished_invoker, content)
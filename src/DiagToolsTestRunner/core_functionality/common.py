@@ -1,20 +1,32 @@
 '''Provide common used utilities
 '''
 
+import io
 import os
 import glob
 import json
+import hashlib
+import tempfile
 import tomllib
 import platform
+import queue
 import tarfile
 import zipfile
+import threading
+import http.client
+import urllib.parse
 from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, Future
 from urllib import request
 from http.client import HTTPResponse
 try:
     import winreg
 except ModuleNotFoundError:
     print('skip winreg module')
+try:
+    import fcntl
+except ModuleNotFoundError:
+    import msvcrt
 
 __UNAME = platform.uname()
 __USERPROFILE = ''
@@ -76,25 +88,216 @@ def rid_machine_name():
     return __SHORTMACHINENAME
 
 
-def http_download(download_path: str, download_url: str, buffer_size: int=4*1024*1024):
+class _RangedDownload:
+    '''Download a file in HTTP Range parts over a small connection pool.
+
+    Parts are hashed in order as they arrive, and finished parts are recorded in a state file
+    next to the partial file so that an interrupted download can be resumed.
+    '''
+    def __init__(self,
+                 download_path: str,
+                 download_url: str,
+                 part_size: int,
+                 connection_count: int,
+                 retry_count: int=3):
+        '''
+        :param download_path: download path
+        :param download_url: url of resource(http protocal)
+        :param part_size: size(byte) of each range request
+        :param connection_count: number of connections fetching parts concurrently
+        :param retry_count: attempts for each part
+        '''
+        self.__download_path = download_path
+        self.__download_url = download_url
+        self.__part_size = part_size
+        self.__connection_count = max(connection_count, 1)
+        self.__retry_count = retry_count
+
+        self.__partial_path = f'{download_path}.part'
+        self.__state_path = f'{download_path}.part.json'
+        self.__local = threading.local()
+        self.__connection_list: list[http.client.HTTPConnection] = []
+        self.__connection_list_lock = threading.Lock()
+
+    def run(self) -> str:
+        '''Start download.
+
+        :return: SHA-512 hex digest of downloaded file
+        '''
+        probe_request = request.Request(self.__download_url, headers={'Range': 'bytes=0-0'})
+        probe: HTTPResponse = request.urlopen(probe_request)
+        content_range = probe.headers.get('Content-Range', '')
+        if probe.status != 206 or '/' not in content_range or content_range.endswith('/*'):
+            # server ignores range or doesn't tell total size, fall back to a single stream
+            # of the whole resource; probe body may only be the first byte
+            probe.close()
+            return self.__download_stream(request.urlopen(self.__download_url))
+
+        with probe:
+            probe.read()
+        total_size = int(content_range.rsplit('/', 1)[1])
+        return self.__download_parts(probe.geturl(), total_size, probe.headers.get('ETag'))
+
+    def __download_stream(self, response: HTTPResponse) -> str:
+        hasher = hashlib.sha512()
+        with response, open(self.__partial_path, 'wb') as fp:
+            while True:
+                buffer = response.read(self.__part_size)
+                if len(buffer) == 0:
+                    break
+                hasher.update(buffer)
+                fp.write(buffer)
+        self.__finish()
+        return hasher.hexdigest()
+
+    def __load_state(self, url: str, total_size: int, etag: str) -> set[int]:
+        '''Load finished parts of a previous attempt if it downloads the same resource.
+        '''
+        state = dict()
+        if os.path.exists(self.__state_path) and os.path.exists(self.__partial_path):
+            with open(self.__state_path, 'r', encoding='utf-8') as fp:
+                state = json.load(fp)
+        if state.get('url') != url or state.get('total_size') != total_size \
+                or state.get('etag') != etag or state.get('part_size') != self.__part_size:
+            return set()
+        return set(state.get('completed', []))
+
+    def __save_state(self, url: str, total_size: int, etag: str, completed: set[int]):
+        state = {
+            'url': url,
+            'total_size': total_size,
+            'etag': etag,
+            'part_size': self.__part_size,
+            'completed': sorted(completed)
+        }
+        with open(f'{self.__state_path}.tmp', 'w', encoding='utf-8') as fp:
+            json.dump(state, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(f'{self.__state_path}.tmp', self.__state_path)
+
+    def __connection(self, url: str) -> http.client.HTTPConnection:
+        '''Get keep-alive connection of current thread.
+        '''
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            parsed_url = urllib.parse.urlsplit(url)
+            if parsed_url.scheme == 'https':
+                connection = http.client.HTTPSConnection(parsed_url.netloc, timeout=60)
+            else:
+                connection = http.client.HTTPConnection(parsed_url.netloc, timeout=60)
+            self.__local.connection = connection
+            with self.__connection_list_lock:
+                self.__connection_list.append(connection)
+        return connection
+
+    def __fetch_part(self, url: str, start: int, end: int) -> bytes:
+        '''Fetch bytes [start, end] with retry.
+        '''
+        parsed_url = urllib.parse.urlsplit(url)
+        target = parsed_url.path + (f'?{parsed_url.query}' if parsed_url.query != '' else '')
+        for attempt in range(self.__retry_count):
+            connection = self.__connection(url)
+            try:
+                connection.request('GET', target, headers={'Range': f'bytes={start}-{end}'})
+                response = connection.getresponse()
+                data = response.read()
+                if response.status != 206 or len(data) != end - start + 1:
+                    raise OSError(
+                        f'unexpected response for bytes {start}-{end}: '
+                        f'status {response.status}, {len(data)} bytes')
+                return data
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                self.__local.connection = None
+                if attempt == self.__retry_count - 1:
+                    raise
+        raise OSError(f'fail to fetch bytes {start}-{end}')
+
+    def __download_parts(self, url: str, total_size: int, etag: str) -> str:
+        part_count = (total_size + self.__part_size - 1) // self.__part_size
+        completed = self.__load_state(url, total_size, etag)
+        if len(completed) == 0:
+            with open(self.__partial_path, 'wb') as fp:
+                fp.truncate(total_size)
+
+        hasher = hashlib.sha512()
+        # parts are submitted ahead of hashing within a bounded window to limit memory
+        window = self.__connection_count * 2
+        future_map: dict[int, Future] = dict()
+        next_submit = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.__connection_count) as executor, \
+                    open(self.__partial_path, 'r+b') as fp:
+                for index in range(part_count):
+                    while next_submit < part_count and next_submit < index + window:
+                        if next_submit not in completed:
+                            start = next_submit * self.__part_size
+                            end = min(start + self.__part_size, total_size) - 1
+                            future_map[next_submit] = executor.submit(
+                                self.__fetch_part, url, start, end)
+                        next_submit += 1
+
+                    start = index * self.__part_size
+                    if index in completed:
+                        fp.seek(start)
+                        data = fp.read(min(self.__part_size, total_size - start))
+                    else:
+                        data = future_map.pop(index).result()
+                        fp.seek(start)
+                        fp.write(data)
+                        # part must be on disk before state marks it completed
+                        fp.flush()
+                        os.fsync(fp.fileno())
+                        completed.add(index)
+                        self.__save_state(url, total_size, etag, completed)
+                    hasher.update(data)
+        finally:
+            for future in future_map.values():
+                future.cancel()
+            with self.__connection_list_lock:
+                for connection in self.__connection_list:
+                    connection.close()
+
+        self.__finish()
+        return hasher.hexdigest()
+
+    def __finish(self):
+        os.replace(self.__partial_path, self.__download_path)
+        if os.path.exists(self.__state_path):
+            os.remove(self.__state_path)
+
+
+def http_download(download_path: str,
+                  download_url: str,
+                  buffer_size: int=4*1024*1024,
+                  connection_count: int=4,
+                  expected_sha512: str=None):
     '''Start download  
-    
+
+    The file is fetched in HTTP Range parts over a small connection pool if the server supports it,
+    otherwise in a single stream. Interrupted downloads are resumed from `<download_path>.part`.
+
     :param download_path: download path
     :param download_url: url of resource(http protocal)
-    :param buffer_size: buffer size(byte)
+    :param buffer_size: buffer size(byte), also size of each range request
+    :param connection_count: number of connections
+    :param expected_sha512: expected SHA-512 hex digest; not verified if it's None
+    :return: SHA-512 hex digest of downloaded file
     '''
     try:
-        response: HTTPResponse = request.urlopen(download_url)
-        with open(download_path, 'wb+') as fp:
-            while True:
-                buffer = response.read(buffer_size)
-                fp.write(buffer)
-                if len(buffer) < buffer_size:
-                    break
+        sha512 = _RangedDownload(
+            download_path, download_url, buffer_size, connection_count).run()
     except Exception as ex:
         print(f'fail to download from {download_url}: {ex}')
         raise
 
+    if expected_sha512 is not None and sha512.lower() != expected_sha512.lower():
+        os.remove(download_path)
+        raise ValueError(
+            f'SHA-512 mismatch for {download_url}: expected {expected_sha512}, got {sha512}')
+    return sha512
+
 
 def extract_tar_gz(compressed_file_path: str, destination_folder: str):
     '''Extract .tar.gz file
@@ -116,6 +319,207 @@ def extract_zip(compressed_file_path: str, destination_folder: str):
         zip_ref.extractall(destination_folder)
 
 
+class _PipelineReader(io.RawIOBase):
+    '''Readable stream fed by a background thread that pulls a response,
+    so that network, hashing, teeing and decompression overlap.
+    '''
+    def __init__(self,
+                 response: HTTPResponse,
+                 block_size: int,
+                 queue_size: int,
+                 tee_fp=None):
+        '''
+        :param response: HTTP response
+        :param block_size: block size(byte) read from response at once
+        :param queue_size: maximum number of blocks buffered between threads
+        :param tee_fp: writable binary file receiving a copy of the stream
+        '''
+        super().__init__()
+        self.__response = response
+        self.__block_size = block_size
+        self.__queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__tee_fp = tee_fp
+        self.__hasher = hashlib.sha512()
+        self.__current = memoryview(b'')
+        self.__eof = False
+        self.__stopped = threading.Event()
+        self.__producer = threading.Thread(target=self.__produce, daemon=True)
+        self.__producer.start()
+
+    @property
+    def sha512(self):
+        '''Get SHA-512 hex digest of bytes pulled so far.
+        '''
+        return self.__hasher.hexdigest()
+
+    def __produce(self):
+        try:
+            while not self.__stopped.is_set():
+                block = self.__response.read(self.__block_size)
+                if len(block) == 0:
+                    break
+                self.__hasher.update(block)
+                if self.__tee_fp is not None:
+                    self.__tee_fp.write(block)
+                self.__queue.put(block)
+            self.__queue.put(b'')
+        except Exception as ex:
+            self.__queue.put(ex)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self.__current) == 0:
+            if self.__eof:
+                return 0
+            block = self.__queue.get()
+            if isinstance(block, Exception):
+                raise block
+            if len(block) == 0:
+                self.__eof = True
+                return 0
+            self.__current = memoryview(block)
+        size = min(len(buffer), len(self.__current))
+        buffer[:size] = self.__current[:size]
+        self.__current = self.__current[size:]
+        return size
+
+    def drain(self):
+        '''Consume remaining bytes, e.g. tar padding, so that hash covers the whole stream.
+        '''
+        while self.readinto(bytearray(self.__block_size)) > 0:
+            pass
+        self.__producer.join()
+
+    def close(self):
+        self.__stopped.set()
+        # unblock producer waiting on a full queue
+        while self.__producer.is_alive():
+            try:
+                self.__queue.get_nowait()
+            except queue.Empty:
+                self.__producer.join(0.1)
+        super().close()
+
+
+def http_extract_tar_gz(download_url: str,
+                        destination_folder: str,
+                        tee_path: str=None,
+                        expected_sha512: str=None,
+                        block_size: int=1024*1024,
+                        queue_size: int=16):
+    '''Extract .tar.gz file while it is being downloaded, without a full copy on disk.
+
+    :param download_url: url of .tar.gz file(http protocal)
+    :param destination_folder: extract folder
+    :param tee_path: path to keep a copy of archive, e.g. in archive cache; no copy if it's None
+    :param expected_sha512: expected SHA-512 hex digest; not verified if it's None
+    :param block_size: block size(byte) read from network at once
+    :param queue_size: maximum number of blocks buffered between download and extraction
+    :return: SHA-512 hex digest of archive
+    '''
+    tee_fp = open(f'{tee_path}.part', 'wb') if tee_path is not None else None
+    try:
+        response: HTTPResponse = request.urlopen(download_url)
+        with response:
+            reader = _PipelineReader(response, block_size, queue_size, tee_fp)
+            try:
+                with tarfile.open(fileobj=reader, mode='r|gz') as tar_ref:
+                    tar_ref.extractall(destination_folder)
+                reader.drain()
+                sha512 = reader.sha512
+            finally:
+                reader.close()
+    except Exception as ex:
+        print(f'fail to download and extract from {download_url}: {ex}')
+        if tee_fp is not None:
+            tee_fp.close()
+            os.remove(f'{tee_path}.part')
+        raise
+
+    if tee_fp is not None:
+        tee_fp.close()
+    if expected_sha512 is not None and sha512.lower() != expected_sha512.lower():
+        if tee_path is not None:
+            os.remove(f'{tee_path}.part')
+        raise ValueError(
+            f'SHA-512 mismatch for {download_url}: expected {expected_sha512}, got {sha512}')
+    if tee_path is not None:
+        os.replace(f'{tee_path}.part', tee_path)
+    return sha512
+
+
+class FileLock:
+    '''Inter-process lock backed by a lock file, usable across testbeds on the same machine.
+    '''
+    def __init__(self, lock_file_path: str):
+        '''
+        :param lock_file_path: lock file path
+        '''
+        self.__lock_file_path = lock_file_path
+        self.__fp = None
+
+    @property
+    def lock_file_path(self):
+        '''Get lock file path.
+        '''
+        return self.__lock_file_path
+
+    def acquire(self):
+        '''Block until the lock is acquired.
+        '''
+        lock_folder = os.path.dirname(self.__lock_file_path)
+        if lock_folder != '':
+            os.makedirs(lock_folder, exist_ok=True)
+        self.__fp = open(self.__lock_file_path, 'a+b')
+        try:
+            if rid_os_name() == 'win':
+                self.__fp.seek(0)
+                # LK_LOCK only retries for 10 seconds
+                while True:
+                    try:
+                        msvcrt.locking(self.__fp.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            else:
+                fcntl.flock(self.__fp.fileno(), fcntl.LOCK_EX)
+        except Exception:
+            self.__fp.close()
+            self.__fp = None
+            raise
+
+    def release(self):
+        '''Release the lock.
+        '''
+        if self.__fp is None:
+            return
+        if rid_os_name() == 'win':
+            self.__fp.seek(0)
+            msvcrt.locking(self.__fp.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.__fp.fileno(), fcntl.LOCK_UN)
+        self.__fp.close()
+        self.__fp = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def machine_lock(name: str):
+    '''Get a machine-wide lock shared by all testbeds.
+
+    :param name: lock name
+    :return: FileLock instance
+    '''
+    return FileLock(os.path.join(tempfile.gettempdir(), f'DiagToolsTestRunner-{name}.lock'))
+
+
 def parse_toml(toml_file_path: str):
     '''Parse toml file and convert to namespace. 
 
@@ -2,10 +2,16 @@
 '''
 
 import os
+import time
+import uuid
+import queue
+from itertools import count
+from subprocess import TimeoutExpired
 from tempfile import TemporaryDirectory
 
 from core_functionality import common
-from core_functionality.cli import CommandInvoker
+from core_functionality.cli import CommandInvoker, AsyncCommandInvoker
+from core_functionality.output_buffer import OutputBuffer
 
 class CLIDebugger:
     '''Invoke CLI debugger like cdb and lldb.
@@ -35,6 +41,60 @@ class CLIDebugger:
             if self.__debugger_name.startswith('lldb'):
                 fp.write('exit\n')
 
+    def __dump_args(self, script_path: str, dump_path: str):
+        args = [self.__debugger_path]
+        if self.__debugger_name.startswith('cdb'):
+            args.extend(
+                [
+                    '-cf', script_path,
+                    '-z', dump_path
+                ]
+            )
+        if self.__debugger_name.startswith('lldb'):
+            args.extend(
+                [
+                    '-s', script_path,
+                    '-c', dump_path,
+                    '--batch'
+                ]
+            )
+        return args
+
+    def __process_args(self, script_path: str, pid: str):
+        args = [self.__debugger_path]
+        if self.__debugger_name.startswith('cdb'):
+            args.extend(
+                [
+                    '-cf', script_path,
+                    '-p', pid,
+                ]
+            )
+        if self.__debugger_name.startswith('lldb'):
+            args.extend(
+                [
+                    '-s', script_path,
+                    '-p', pid,
+                    '--batch'
+                ]
+            )
+        return args
+
+    def __launchable_args(self, script_path: str, launchable: str):
+        args = [self.__debugger_path]
+        if self.__debugger_name.startswith('cdb'):
+            args.extend(
+                [
+                    '-g', '-cf', script_path, launchable
+                ]
+            )
+        if self.__debugger_name.startswith('lldb'):
+            args.extend(
+                [
+                    '-s', script_path, '--batch', launchable
+                ]
+            )
+        return args
+
     def debug_dump(self,
                    dump_path: str,
                    debug_command_list: list[str],
@@ -57,22 +117,7 @@ class CLIDebugger:
 
         self.__generate_debugging_script(script_path, debug_command_list)
 
-        args = [self.__debugger_path]
-        if self.__debugger_name.startswith('cdb'):
-            args.extend(
-                [
-                    '-cf', script_path,
-                    '-z', dump_path
-                ]
-            )
-        if self.__debugger_name.startswith('lldb'):
-            args.extend(
-                [
-                    '-s', script_path,
-                    '-c', dump_path,
-                    '--batch'
-                ]
-            )
+        args = self.__dump_args(script_path, dump_path)
 
         with CommandInvoker(args,
                             cwd=cwd,
@@ -84,6 +129,39 @@ class CLIDebugger:
             temp_dir.cleanup()
             return invoker
 
+    async def debug_dump_async(self,
+                               dump_path: str,
+                               debug_command_list: list[str],
+                               cwd: str=None,
+                               redirect_std_in: bool=False,
+                               redirect_std_out_err: bool=False,
+                               silent: bool=False):
+        '''Debug dump asynchronously.
+
+        :param dump_path: dump path
+        :param debug_command_list: debugging command sequence
+        :param cwd: working directory
+        :param redirect_std_in: whether to redirect stardard input
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        :return: AsyncCommandInvoker instance
+        '''
+        with TemporaryDirectory() as temp_dir:
+            script_path = os.path.join(temp_dir, 'debugging-dump-script.txt')
+
+            self.__generate_debugging_script(script_path, debug_command_list)
+
+            args = self.__dump_args(script_path, dump_path)
+
+            async with AsyncCommandInvoker(args,
+                                           cwd=cwd,
+                                           redirect_std_in=redirect_std_in,
+                                           redirect_std_out_err=redirect_std_out_err,
+                                           silent=silent
+            ) as invoker:
+                await invoker.communicate()
+                return invoker
+
     def debug_process(self,
                       pid: str,
                       debug_command_list: list[str],
@@ -106,22 +184,7 @@ class CLIDebugger:
 
         self.__generate_debugging_script(script_path, debug_command_list)
 
-        args = [self.__debugger_path]
-        if self.__debugger_name.startswith('cdb'):
-            args.extend(
-                [
-                    '-cf', script_path,
-                    '-p', pid,
-                ]
-            )
-        if self.__debugger_name.startswith('lldb'):
-            args.extend(
-                [
-                    '-s', script_path,
-                    '-p', pid,
-                    '--batch'
-                ]
-            )
+        args = self.__process_args(script_path, pid)
 
         with CommandInvoker(args,
                             cwd=cwd,
@@ -133,6 +196,39 @@ class CLIDebugger:
             temp_dir.cleanup()
             return invoker
 
+    async def debug_process_async(self,
+                                  pid: str,
+                                  debug_command_list: list[str],
+                                  cwd: str=None,
+                                  redirect_std_in: bool=False,
+                                  redirect_std_out_err: bool=False,
+                                  silent: bool=False):
+        '''Debug process asynchronously.
+
+        :param pid: process id
+        :param debug_command_list: debugging command sequence
+        :param cwd: working directory
+        :param redirect_std_in: whether to redirect stardard input
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        :return: AsyncCommandInvoker instance
+        '''
+        with TemporaryDirectory() as temp_dir:
+            script_path = os.path.join(temp_dir, 'debugging-process-script.txt')
+
+            self.__generate_debugging_script(script_path, debug_command_list)
+
+            args = self.__process_args(script_path, pid)
+
+            async with AsyncCommandInvoker(args,
+                                           cwd=cwd,
+                                           redirect_std_in=redirect_std_in,
+                                           redirect_std_out_err=redirect_std_out_err,
+                                           silent=silent
+            ) as invoker:
+                await invoker.communicate()
+                return invoker
+
     def debug_launchable(self,
                          launchable: str,
                          debug_command_list: list[str],
@@ -155,19 +251,7 @@ class CLIDebugger:
 
         self.__generate_debugging_script(script_path, debug_command_list)
 
-        args = [self.__debugger_path]
-        if self.__debugger_name.startswith('cdb'):
-            args.extend(
-                [
-                    '-g', '-cf', script_path, launchable
-                ]
-            )
-        if self.__debugger_name.startswith('lldb'):
-            args.extend(
-                [
-                    '-s', script_path, '--batch', launchable
-                ]
-            )
+        args = self.__launchable_args(script_path, launchable)
 
         with CommandInvoker(args,
                             cwd=cwd,
@@ -178,3 +262,237 @@ class CLIDebugger:
             invoker.communicate()
             temp_dir.cleanup()
             return invoker
+
+    async def debug_launchable_async(self,
+                                     launchable: str,
+                                     debug_command_list: list[str],
+                                     cwd: str=None,
+                                     redirect_std_in: bool=False,
+                                     redirect_std_out_err: bool=False,
+                                     silent: bool=False):
+        '''Debug process asynchronously.
+
+        :param launchable: path to launchable file
+        :param debug_command_list: debugging command sequence
+        :param cwd: working directory
+        :param redirect_std_in: whether to redirect stardard input
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        :return: AsyncCommandInvoker instance
+        '''
+        with TemporaryDirectory() as temp_dir:
+            script_path = os.path.join(temp_dir, 'debugging-launchable-script.txt')
+
+            self.__generate_debugging_script(script_path, debug_command_list)
+
+            args = self.__launchable_args(script_path, launchable)
+
+            async with AsyncCommandInvoker(args,
+                                           cwd=cwd,
+                                           redirect_std_in=redirect_std_in,
+                                           redirect_std_out_err=redirect_std_out_err,
+                                           silent=silent
+            ) as invoker:
+                await invoker.communicate()
+                return invoker
+
+    def open_session(self,
+                     init_command_list: list[str]=None,
+                     cwd: str=None,
+                     env: dict=None,
+                     timeout: float=None):
+        '''Start a long-lived debugger session.
+
+        :param init_command_list: commands run once after debugger starts, e.g. loading plugins
+        :param cwd: working directory
+        :param env: environment variables
+        :param timeout: time(seconds) to wait for a command; wait forever if it's None
+        :return: DebuggerSession instance
+        '''
+        return DebuggerSession(self.__debugger_path, init_command_list, cwd, env, timeout)
+
+
+class DebuggerCommandResult:
+    '''Output and timing of a command run in DebuggerSession.
+    '''
+    def __init__(self, command: str, output: str, elapsed_secs: float):
+        '''
+        :param command: debugging command
+        :param output: standard output and err of the command
+        :param elapsed_secs: wall-clock time of the command(seconds)
+        '''
+        self.command = command
+        self.output = output
+        self.elapsed_secs = elapsed_secs
+
+
+class _SessionOutputBuffer(OutputBuffer):
+    '''OutputBuffer that hands every line to the session instead of keeping it.
+
+    Output of each command is kept in its DebuggerCommandResult, so the buffer stays empty
+    rather than holding the transcript of the whole session a second time.
+    '''
+    def __init__(self, line_queue: queue.Queue, stream_name: str):
+        super().__init__()
+        self.__line_queue = line_queue
+        self.__stream_name = stream_name
+
+    def append(self, text: str):
+        self.__line_queue.put((self.__stream_name, text.rstrip('\n')))
+
+
+class DebuggerSession:
+    '''Keep one lldb process and feed it commands through standard input.
+
+    After each command a sentinel is printed to standard output and err, so output
+    of the command is everything read before the sentinels arrive on both pipes.
+    Dumps are loaded one after another into the same process, so lldb, plugins
+    and symbols are loaded once.
+    '''
+    def __init__(self,
+                 debugger_path: str,
+                 init_command_list: list[str]=None,
+                 cwd: str=None,
+                 env: dict=None,
+                 timeout: float=None):
+        '''
+        :param debugger_path: path of lldb
+        :param init_command_list: commands run once after debugger starts, e.g. loading plugins
+        :param cwd: working directory
+        :param env: environment variables
+        :param timeout: time(seconds) to wait for a command; wait forever if it's None. \
+            The session is closed once a command times out
+        '''
+        if not os.path.basename(debugger_path).startswith('lldb'):
+            raise ValueError(f'Debugger session is only supported with lldb: {debugger_path}')
+
+        self.__debugger_path = debugger_path
+        self.__init_command_list = init_command_list if init_command_list is not None else []
+        self.__cwd = cwd
+        self.__env = env
+        self.__timeout = timeout
+        self.__token = uuid.uuid4().hex
+        self.__counter = count()
+        self.__line_queue: queue.Queue = queue.Queue()
+        self.__invoker: CommandInvoker = None
+
+    @property
+    def invoker(self):
+        '''Get CommandInvoker instance of debugger process.
+        '''
+        return self.__invoker
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        '''Start debugger and run init commands.
+
+        :return: a list of DebuggerCommandResult of init commands
+        '''
+        stream_names = iter(['stdout', 'stderr'])
+        # drop lines left by a previous debugger process
+        self.__line_queue = queue.Queue()
+        line_queue = self.__line_queue
+        self.__invoker = CommandInvoker(
+            [self.__debugger_path, '--no-use-colors'],
+            cwd=self.__cwd,
+            env=self.__env,
+            output_buffer_factory=lambda: _SessionOutputBuffer(
+                line_queue, next(stream_names))
+        )
+        # wait until debugger is ready
+        self.execute([])
+        return self.execute(self.__init_command_list)
+
+    def execute(self, command_list: list[str]):
+        '''Run commands one by one.
+
+        :param command_list: debugging command sequence
+        :return: a list of DebuggerCommandResult
+        '''
+        if len(command_list) == 0:
+            self.__run_command(None)
+            return []
+        return [self.__run_command(command) for command in command_list]
+
+    def load_dump(self, dump_path: str):
+        '''Replace current target with a core dump.
+
+        :param dump_path: dump path
+        :return: a list of DebuggerCommandResult
+        '''
+        return self.execute([
+            'target delete --all',
+            f'target create --core "{dump_path}"'
+        ])
+
+    def __run_command(self, command: str):
+        '''Send a command followed by sentinel and collect output until sentinel arrives.
+
+        :param command: debugging command; only sentinel is sent if it's None
+        :return: DebuggerCommandResult instance
+        '''
+        if self.__invoker is None:
+            raise ChildProcessError(f'Debugger session is not started: {self.__debugger_path}')
+        sentinel = f'__DIAGTOOLS_SENTINEL_{self.__token}_{next(self.__counter)}__'
+        sentinel_command = (
+            f'script print("{sentinel}"); '
+            f'print("{sentinel}", file=__import__("sys").stderr)'
+        )
+
+        start = time.perf_counter()
+        if command is not None:
+            self.__invoker.stdin.write(f'{command}\n')
+        self.__invoker.stdin.write(f'{sentinel_command}\n')
+        self.__invoker.stdin.flush()
+
+        output_lines = []
+        pending_streams = {'stdout', 'stderr'}
+        while len(pending_streams) > 0:
+            try:
+                stream_name, line = self.__line_queue.get(timeout=1)
+            except queue.Empty:
+                if self.__invoker.poll() is not None:
+                    raise ChildProcessError(
+                        f'{self.__debugger_path} exits with {self.__invoker.returncode}')
+                if self.__timeout is not None and time.perf_counter() - start > self.__timeout:
+                    # late output of the command would be taken as output of the next one,
+                    # so the session ends here and has to be started again
+                    self.__invoker.kill()
+                    self.close()
+                    raise TimeoutError(f'Command timed out: {command}')
+                continue
+
+            if line.rstrip().endswith(sentinel):
+                pending_streams.discard(stream_name)
+                continue
+            if sentinel in line:
+                # echo of sentinel command
+                continue
+            output_lines.append(line)
+
+        elapsed_secs = time.perf_counter() - start
+        return DebuggerCommandResult(command, '\n'.join(output_lines), elapsed_secs)
+
+    def close(self):
+        '''Quit debugger.
+        '''
+        if self.__invoker is None:
+            return
+        try:
+            if self.__invoker.poll() is None:
+                self.__invoker.stdin.write('quit\n')
+                self.__invoker.stdin.flush()
+            self.__invoker.wait(timeout=30)
+        except (OSError, ValueError):
+            pass
+        except TimeoutExpired:
+            self.__invoker.kill()
+        finally:
+            self.__invoker.__exit__(None, None, None)
+            self.__invoker = None
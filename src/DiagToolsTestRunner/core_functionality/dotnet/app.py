@@ -2,9 +2,11 @@
 '''
 
 import os
+import asyncio
 
-from core_functionality.cli import CommandInvoker
+from core_functionality.cli import CommandInvoker, AsyncCommandInvoker
 from core_functionality.dotnet.environment import DotNetEnvironment
+from core_functionality.dotnet.skeleton_cache import SkeletonCache
 
 class DotNetApp:
     '''Represent a .NET app(even isn't created).\
@@ -17,13 +19,15 @@ class DotNetApp:
                  template: str,
                  build_config: str='Debug',
                  output_folder: str=None,
-                 name: str=None):
+                 name: str=None,
+                 skeleton_cache: SkeletonCache=None):
         '''
         :param dotnet_env: DotNetEnvironment instance
         :param root: .NET app root path
         :param template: .NET app template
         :param build_config: build configuration
         :param name: app name; if it's None, the app name is name of app root
+        :param skeleton_cache: project skeleton cache; `dotnet new` runs for every app if it's None
         '''
         assert build_config.lower() in ['debug', 'release']
         self.__root = root
@@ -31,6 +35,7 @@ class DotNetApp:
         self.__build_config = build_config
         self.__target_rid = dotnet_env.target_rid
         self.__dotnet_env = dotnet_env
+        self.__skeleton_cache = skeleton_cache
         self.__target_framework = f'net{dotnet_env.sdk_full_version[:3]}'
 
         if output_folder is None:
@@ -79,6 +84,12 @@ class DotNetApp:
         '''
         return self.__name
 
+    @property
+    def build_config(self):
+        '''Get build configuration.
+        '''
+        return self.__build_config
+
     @property
     def target_framework(self):
         '''Get target framework.
@@ -121,21 +132,58 @@ class DotNetApp:
         '''
         return self.__native_executable
 
+    def __create_args(self):
+        return [
+            self.__dotnet_env.dotnet_executable, 'new', self.__template,
+            '-o', self.__root,
+            '-n', self.__name,
+            '--force'
+        ]
+
+    def __restore_args(self, packages_folder: str=None):
+        args = [
+            self.__dotnet_env.dotnet_executable, 'restore',
+            '-r', self.__target_rid
+        ]
+        if packages_folder is not None:
+            args.extend(['--packages', packages_folder])
+        return args
+
+    def __build_args(self, no_restore: bool=False):
+        args = [
+            self.__dotnet_env.dotnet_executable, 'build',
+            '-r', self.__target_rid,
+            '-c', self.__build_config
+        ]
+        if no_restore:
+            args.append('--no-restore')
+        return args
+
+    def __publish_args(self):
+        return [
+            self.__dotnet_env.dotnet_executable, 'publish',
+            '-r', self.__target_rid,
+            '-c', self.__build_config
+        ]
+
     def create(self, redirect_std_out_err: bool=True, silent: bool=False):
         '''Build a .NET app.
         
         :param redirect_std_out_err: whether to redirect stardard output and err
         :param silent: whether to suppress console output
-        :return: CommandInvoker instance
+        :return: CommandInvoker instance, or None if app is copied from cached skeleton
         '''
-        args = [
-            self.__dotnet_env.dotnet_executable, 'new', self.__template,
-            '-o', self.__root,
-            '-n', self.__name,
-            '--force'
-        ]
+        if self.__skeleton_cache is not None:
+            return self.__skeleton_cache.create_app(
+                self.__dotnet_env,
+                self.__template,
+                self.__root,
+                self.__name,
+                redirect_std_out_err=redirect_std_out_err,
+                silent=silent
+            )
         with CommandInvoker(
-            args,
+            self.__create_args(),
             env=self.__dotnet_env.environment_variables,
             redirect_std_out_err=redirect_std_out_err,
             silent=silent
@@ -143,21 +191,61 @@ class DotNetApp:
             invoker.communicate()
             return invoker
 
-    def build(self, redirect_std_out_err: bool=True, silent: bool=False):
+    async def create_async(self, redirect_std_out_err: bool=True, silent: bool=False):
+        '''Create a .NET app asynchronously.
+
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        :return: AsyncCommandInvoker instance; \
+            CommandInvoker instance or None if skeleton cache is used
+        '''
+        if self.__skeleton_cache is not None:
+            return await asyncio.to_thread(self.create, redirect_std_out_err, silent)
+        async with AsyncCommandInvoker(
+            self.__create_args(),
+            env=self.__dotnet_env.environment_variables,
+            redirect_std_out_err=redirect_std_out_err,
+            silent=silent
+        ) as invoker:
+            await invoker.communicate()
+            return invoker
+
+    def restore(self,
+                packages_folder: str=None,
+                redirect_std_out_err: bool=True,
+                silent: bool=False):
+        '''Restore packages of a .NET app.
+
+        :param packages_folder: packages folder shared by apps; default NuGet folder if it's None
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+
+        :return: CommandInvoker instance
+        '''
+        with CommandInvoker(
+            self.__restore_args(packages_folder),
+            env=self.__dotnet_env.environment_variables,
+            cwd=self.__root,
+            redirect_std_out_err=redirect_std_out_err,
+            silent=silent
+        ) as p:
+            p.communicate()
+            return p
+
+    def build(self,
+              redirect_std_out_err: bool=True,
+              silent: bool=False,
+              no_restore: bool=False):
         '''Build a .NET app.
 
         :param redirect_std_out_err: whether to redirect stardard output and err
         :param silent: whether to suppress console output
+        :param no_restore: whether to skip implicit restore
 
         :return: CommandInvoker instance
         '''
-        args = [
-            self.__dotnet_env.dotnet_executable, 'build',
-            '-r', self.__target_rid,
-            '-c', self.__build_config
-        ]
         with CommandInvoker(
-            args,
+            self.__build_args(no_restore),
             env=self.__dotnet_env.environment_variables,
             cwd=self.__root,
             redirect_std_out_err=redirect_std_out_err,
@@ -166,6 +254,28 @@ class DotNetApp:
             p.communicate()
             return p
 
+    async def build_async(self,
+                          redirect_std_out_err: bool=True,
+                          silent: bool=False,
+                          no_restore: bool=False):
+        '''Build a .NET app asynchronously.
+
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        :param no_restore: whether to skip implicit restore
+
+        :return: AsyncCommandInvoker instance
+        '''
+        async with AsyncCommandInvoker(
+            self.__build_args(no_restore),
+            env=self.__dotnet_env.environment_variables,
+            cwd=self.__root,
+            redirect_std_out_err=redirect_std_out_err,
+            silent=silent
+        ) as p:
+            await p.communicate()
+            return p
+
     def publish(self, redirect_std_out_err: bool=True, silent: bool=False):
         '''Publish a .NET app.
 
@@ -174,13 +284,8 @@ class DotNetApp:
 
         :return: CommandInvoker instance
         '''
-        args = [
-            self.__dotnet_env.dotnet_executable, 'publish',
-            '-r', self.__target_rid,
-            '-c', self.__build_config
-        ]
         with CommandInvoker(
-            args,
+            self.__publish_args(),
             env=self.__dotnet_env.environment_variables,
             cwd=self.__root,
             redirect_std_out_err=redirect_std_out_err,
@@ -188,3 +293,21 @@ class DotNetApp:
         ) as p:
             p.communicate()
             return p
+
+    async def publish_async(self, redirect_std_out_err: bool=True, silent: bool=False):
+        '''Publish a .NET app asynchronously.
+
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+
+        :return: AsyncCommandInvoker instance
+        '''
+        async with AsyncCommandInvoker(
+            self.__publish_args(),
+            env=self.__dotnet_env.environment_variables,
+            cwd=self.__root,
+            redirect_std_out_err=redirect_std_out_err,
+            silent=silent
+        ) as p:
+            await p.communicate()
+            return p
@@ -0,0 +1,129 @@
+'''Cache build output of .NET apps
+'''
+
+import os
+import shutil
+import hashlib
+from threading import Lock
+
+from core_functionality import common
+from core_functionality.artifact_cache import CACHE_ROOT_ENV
+from core_functionality.dotnet.app import DotNetApp
+
+
+class BuildCache:
+    '''Keep build output of .NET apps keyed by template, SDK, rid, build config and sources.
+    '''
+    def __init__(self, cache_root: str):
+        '''
+        :param cache_root: cache folder
+        '''
+        self.__cache_root = cache_root
+
+    @property
+    def cache_root(self):
+        '''Get cache folder.
+        '''
+        return self.__cache_root
+
+    @staticmethod
+    def compute_key(app: DotNetApp, source_path_map: dict[str, str]):
+        '''Compute cache key of an app.
+
+        :param app: DotNetApp instance
+        :param source_path_map: a dict maps relative path in app root to source file copied there
+        :return: cache key
+        '''
+        hasher = hashlib.sha256()
+        for field in [
+            app.app_name,
+            app.app_template,
+            app.dotnet_env.sdk_full_version,
+            app.dotnet_env.target_rid,
+            app.build_config
+        ]:
+            hasher.update(field.encode('utf-8'))
+            hasher.update(b'\0')
+
+        for relative_path in sorted(source_path_map):
+            hasher.update(relative_path.encode('utf-8'))
+            hasher.update(b'\0')
+            with open(source_path_map[relative_path], 'rb') as fp:
+                while True:
+                    buffer = fp.read(1024*1024)
+                    if len(buffer) == 0:
+                        break
+                    hasher.update(buffer)
+            hasher.update(b'\0')
+        return hasher.hexdigest()
+
+    def get_entry_path(self, key: str):
+        '''Get folder of a cache entry.
+
+        :param key: cache key
+        :return: entry folder
+        '''
+        return os.path.join(self.__cache_root, key)
+
+    def restore(self, key: str, app: DotNetApp):
+        '''Copy cached build output into symbol folder of app.
+
+        :param key: cache key
+        :param app: DotNetApp instance
+        :return: whether cache is hit
+        '''
+        entry_path = self.get_entry_path(key)
+        os.makedirs(self.__cache_root, exist_ok=True)
+        with common.FileLock(f'{entry_path}.lock'):
+            if not os.path.exists(os.path.join(entry_path, '.build-complete')):
+                return False
+            if os.path.exists(app.symbol_folder):
+                shutil.rmtree(app.symbol_folder)
+            shutil.copytree(
+                entry_path,
+                app.symbol_folder,
+                symlinks=True,
+                ignore=shutil.ignore_patterns('.build-complete')
+            )
+        return True
+
+    def store(self, key: str, app: DotNetApp):
+        '''Save symbol folder of a built app into cache.
+
+        :param key: cache key
+        :param app: DotNetApp instance
+        '''
+        entry_path = self.get_entry_path(key)
+        temp_path = f'{entry_path}.{os.getpid()}.part'
+        os.makedirs(self.__cache_root, exist_ok=True)
+        with common.FileLock(f'{entry_path}.lock'):
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path)
+            shutil.copytree(app.symbol_folder, temp_path, symlinks=True)
+            with open(os.path.join(temp_path, '.build-complete'), 'w', encoding='utf-8') as fp:
+                fp.write(key)
+            if os.path.exists(entry_path):
+                shutil.rmtree(entry_path)
+            os.replace(temp_path, entry_path)
+
+
+__DEFAULT_CACHE: BuildCache = None
+__DEFAULT_CACHE_LOCK = Lock()
+
+
+def default_build_cache():
+    '''Get build cache shared in process.
+
+    It lives in `builds` of the folder given by DIAGTOOLS_CACHE_ROOT.
+
+    :return: BuildCache instance
+    '''
+    global __DEFAULT_CACHE
+    with __DEFAULT_CACHE_LOCK:
+        if __DEFAULT_CACHE is None:
+            cache_root = os.environ.get(
+                CACHE_ROOT_ENV,
+                os.path.join(common.user_profile(), '.diagtoolstestrunner', 'cache')
+            )
+            __DEFAULT_CACHE = BuildCache(os.path.join(cache_root, 'builds'))
+        return __DEFAULT_CACHE
@@ -0,0 +1,17 @@
+'''Manage build servers kept alive between builds of one SDK
+'''
+
+from core_functionality.cli import CommandInvoker
+from core_functionality.dotnet.environment import DotNetEnvironment
+
+
+def shutdown_build_server(dotnet_env: DotNetEnvironment):
+    '''Run `dotnet build-server shutdown`.
+
+    :param dotnet_env: DotNetEnvironment instance
+    :return: CommandInvoker instance
+    '''
+    args = [dotnet_env.dotnet_executable, 'build-server', 'shutdown']
+    with CommandInvoker(args, env=dotnet_env.environment_variables) as invoker:
+        invoker.communicate()
+        return invoker
@@ -2,10 +2,11 @@
 '''
 
 import os
-import glob
+from concurrent.futures import ThreadPoolExecutor
 
-from core_functionality.cli import CommandInvoker
+from core_functionality.cli import CommandInvoker, AsyncCommandInvoker
 from core_functionality.dotnet.environment import DotNetEnvironment
+from core_functionality.dotnet.tool_registry import ToolRegistry
 
 class DotNetDiagnosticTool:
     '''Contains basic information of .NET tools.
@@ -22,6 +23,7 @@ class DotNetDiagnosticTool:
         self.__name = name
         self.__dotnet_env = dotnet_env
         self.__version = version
+        self.__tool_registry = ToolRegistry(dotnet_env.dotnet_tool_root)
 
     @property
     def dotnet_env(self):
@@ -41,6 +43,26 @@ class DotNetDiagnosticTool:
         '''
         return self.__version
 
+    @property
+    def tool_registry(self):
+        '''Get registry of tools installed in tool root.
+        '''
+        return self.__tool_registry
+
+    def __get_install_tool_path(self):
+        '''Get tool path to install to.
+
+        Tool root can only hold one version of a tool, so another version goes to a
+        side-by-side tool path and is found through tool registry.
+        '''
+        tool_root = self.__dotnet_env.dotnet_tool_root
+        store_folder = os.path.join(tool_root, '.store', self.__name.lower())
+        if self.__version is None or not os.path.isdir(store_folder):
+            return tool_root
+        if self.__version in os.listdir(store_folder):
+            return tool_root
+        return self.__tool_registry.get_side_by_side_tool_path(self.__version)
+
     def install_tool(self,
                      feed: str=None,
                      config_file_path: str=None,
@@ -52,12 +74,21 @@ class DotNetDiagnosticTool:
         :param config_file_path: tool installation config file
         :param redirect_std_out_err: whether to redirect stardard output and err
         :param silent: whether to suppress console output
+        :return: CommandInvoker instance, or None if the version is already installed
         '''
         tool_root = self.__dotnet_env.dotnet_tool_root
         assert tool_root is not None
+        if self.__version is not None:
+            try:
+                self.__tool_registry.lookup(self.__name, self.__version)
+                return None
+            except FileNotFoundError:
+                pass
+
+        tool_path = self.__get_install_tool_path()
         args = [
             self.__dotnet_env.dotnet_executable, 'tool', 'install', self.__name,
-            '--tool-path', tool_root
+            '--tool-path', tool_path
         ]
 
         if self.__version is not None:
@@ -74,34 +105,18 @@ class DotNetDiagnosticTool:
             silent=silent
         ) as invoker:
             invoker.communicate()
-            return invoker
+
+        if invoker.returncode == 0 and self.__version is not None:
+            self.__tool_registry.register(self.__name, self.__version, tool_path)
+        return invoker
 
     def get_tool_il(self):
-        '''Get il(.dll) of tool
+        '''Get il(.dll) of tool from tool registry
         
         :return: il of tool
         '''
-        tool_root = self.__dotnet_env.dotnet_tool_root
-        assert tool_root is not None
-        tool_il_template = os.path.join(
-            tool_root,
-            '.store',
-            self.__name,
-            self.__version,
-            self.__name,
-            self.__version,
-            'tools',
-            'net*',
-            'any',
-            f'{self.__name}.dll'
-        )
-
-        tool_il_candidates = glob.glob(tool_il_template)
-        if len(tool_il_candidates) < 1:
-            raise FileNotFoundError(
-                f'Fail to find dll file for {self.__name} {self.__version} in {tool_root}')
-
-        return tool_il_candidates[0]
+        assert self.__dotnet_env.dotnet_tool_root is not None
+        return self.__tool_registry.lookup(self.__name, self.__version).il_path
 
     def invoke_diagnostic_tool(self,
                                optional_args: list[str]=None,
@@ -117,18 +132,8 @@ class DotNetDiagnosticTool:
         :param redirect_std_out_err: whether to redirect stardard output and err
         :param silent: whether to suppress console output
         '''
-        tool_il = self.get_tool_il()
-        assert os.path.exists(tool_il)
-
-        args = [
-            self.__dotnet_env.dotnet_executable,
-            tool_il
-        ]
-
-        args.extend(optional_args)
-
         with CommandInvoker(
-            args,
+            self.__diagnostic_tool_args(optional_args),
             cwd=cwd,
             env=self.__dotnet_env.environment_variables,
             redirect_std_in=redirect_std_in,
@@ -137,3 +142,68 @@ class DotNetDiagnosticTool:
         ) as p:
             p.communicate()
             return p
+
+    async def invoke_diagnostic_tool_async(self,
+                                           optional_args: list[str]=None,
+                                           cwd: str=None,
+                                           redirect_std_in: bool=False,
+                                           redirect_std_out_err: bool=False,
+                                           silent: bool=False):
+        '''Invoke diagnostic tool asynchronously by running "dotnet <tool>.dll <optional args>".
+
+        :param optional_args: optinal arguments
+        :param cwd: working directory
+        :param redirect_std_in: whether to redirect stardard input
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        '''
+        async with AsyncCommandInvoker(
+            self.__diagnostic_tool_args(optional_args),
+            cwd=cwd,
+            env=self.__dotnet_env.environment_variables,
+            redirect_std_in=redirect_std_in,
+            redirect_std_out_err=redirect_std_out_err,
+            silent=silent
+        ) as p:
+            await p.communicate()
+            return p
+
+    def __diagnostic_tool_args(self, optional_args: list[str]=None):
+        tool_il = self.get_tool_il()
+        assert os.path.exists(tool_il)
+
+        args = [
+            self.__dotnet_env.dotnet_executable,
+            tool_il
+        ]
+
+        if optional_args is not None:
+            args.extend(optional_args)
+        return args
+
+
+def install_diagnostic_tools(tool_list: list[DotNetDiagnosticTool],
+                             feed: str=None,
+                             config_file_path: str=None,
+                             max_workers: int=None):
+    '''Install tools concurrently; each tool has its own folder in tool store.
+
+    Pass `LocalNuGetFeed.config_file_path` as config file to install from a local mirror only.
+
+    :param tool_list: a list of DotNetDiagnosticTool instance
+    :param feed: diagnostic tool feed
+    :param config_file_path: tool installation config file
+    :param max_workers: maximum number of installations running at the same time
+    :return: a list of CommandInvoker instance
+    '''
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_list = [
+            executor.submit(
+                tool.install_tool,
+                feed=feed,
+                config_file_path=config_file_path,
+                silent=True
+            )
+            for tool in tool_list
+        ]
+        return [future.result() for future in future_list]
@@ -2,20 +2,46 @@
 '''
 
 import os
+import shutil
+import tarfile
+import zipfile
 
 from core_functionality import common
+from core_functionality.artifact_cache import ArtifactCache, default_artifact_cache
 from core_functionality.cli import CommandInvoker
 from core_functionality.dotnet.environment import DotNetEnvironment
 
 class DotNetInstaller:
     '''Install .NET SDK and runtime.
     '''
-    def __init__(self, script_root: str, dotnet_env: DotNetEnvironment):
+    def __init__(self,
+                 script_root: str,
+                 dotnet_env: DotNetEnvironment,
+                 sdk_store_root: str=None,
+                 link_mode: str='symlink',
+                 artifact_cache: ArtifactCache=None,
+                 sdk_archive_url_template: str=None,
+                 archive_cache_root: str=None):
         '''
         :param dotnet_env: DotNetEnvironment instance
         :param script_path: script path
+        :param sdk_store_root: machine-level SDK store shared by testbeds; \
+            SDK is installed into dotnet root directly if it's None
+        :param link_mode: how SDK in store is placed into dotnet root, 'symlink' or 'hardlink'
+        :param artifact_cache: cache of dotnet-install script; shared cache if it's None
+        :param sdk_archive_url_template: url of SDK archive with {version}, {rid} and {extension} \
+            placeholders; if it's set, SDK is extracted while downloading instead of \
+            running dotnet-install script
+        :param archive_cache_root: folder of SDK archives; an archive found there is \
+            extracted without network access, and downloaded archives are kept there
         '''
+        assert link_mode in ['symlink', 'hardlink']
         self.__dotnet_env = dotnet_env
+        self.__sdk_store_root = sdk_store_root
+        self.__link_mode = link_mode
+        self.__artifact_cache = artifact_cache
+        self.__sdk_archive_url_template = sdk_archive_url_template
+        self.__archive_cache_root = archive_cache_root
         self.__shell_engine = ''
 
         self.__script_download_link = ''
@@ -33,19 +59,226 @@ class DotNetInstaller:
         self.__script_path = os.path.join(
             script_root,
             os.path.basename(self.__script_download_link))
-        common.http_download(self.__script_path, self.__script_download_link)
+
+    def __prepare_install_script(self):
+        '''Place dotnet-install script from artifact cache, so no network I/O on construction.
+        '''
+        artifact_cache = self.__artifact_cache
+        if artifact_cache is None:
+            artifact_cache = default_artifact_cache()
+        artifact_cache.fetch_to(self.__script_download_link, self.__script_path)
         if common.rid_os_name().startswith('linux') or common.rid_os_name().startswith('osx'):
             enable_execute_args = ['chmod', '+x', self.__script_path]
             with CommandInvoker(enable_execute_args, env=os.environ, silent=False) as ci:
                 ci.communicate()
 
+    @property
+    def sdk_store_path(self):
+        '''Get path of SDK in store, or None if store isn't used.
+        '''
+        if self.__sdk_store_root is None:
+            return None
+        return os.path.join(
+            self.__sdk_store_root,
+            f'{self.__dotnet_env.sdk_full_version}-{self.__dotnet_env.target_rid}'
+        )
+
     def install_dotnet_sdk(self):
         '''Install .NET SDK according to given DotNetEnvironment instance.
-        
+
+        If SDK store is used, SDK is installed into store once under a file lock
+        and then linked into dotnet root.
+
+        :return: CommandInvoker instance, or None if SDK is taken from store
+        '''
+        if self.__sdk_store_root is None:
+            return self.__install_into(self.__dotnet_env.dotnet_root)
+
+        store_path = self.sdk_store_path
+        complete_marker = os.path.join(store_path, '.install-complete')
+        invoker = None
+        with common.FileLock(f'{store_path}.lock'):
+            if not os.path.exists(complete_marker):
+                if os.path.exists(store_path):
+                    shutil.rmtree(store_path)
+                invoker = self.__install_into(store_path)
+                if invoker is not None and invoker.returncode != 0:
+                    return invoker
+                with open(complete_marker, 'w', encoding='utf-8') as fp:
+                    fp.write(self.__dotnet_env.sdk_full_version)
+
+        self.__link_sdk_from_store(store_path)
+        return invoker
+
+    def __link_sdk_from_store(self, store_path: str):
+        '''Place SDK in store into dotnet root as a symlink or a hardlink tree.
+
+        :param store_path: path of SDK in store
+        '''
+        dotnet_root = self.__dotnet_env.dotnet_root
+        if os.path.islink(dotnet_root):
+            if os.path.realpath(dotnet_root) == os.path.realpath(store_path):
+                return
+            os.unlink(dotnet_root)
+        elif os.path.isdir(dotnet_root):
+            shutil.rmtree(dotnet_root)
+
+        parent_folder = os.path.dirname(dotnet_root)
+        if parent_folder != '':
+            os.makedirs(parent_folder, exist_ok=True)
+
+        if self.__link_mode == 'symlink':
+            os.symlink(store_path, dotnet_root, target_is_directory=True)
+            return
+
+        def link_or_copy(src: str, dst: str):
+            try:
+                os.link(src, dst)
+            except OSError:
+                # e.g. store and testbed are on different devices
+                shutil.copy2(src, dst)
+
+        shutil.copytree(
+            store_path,
+            dotnet_root,
+            symlinks=True,
+            copy_function=link_or_copy,
+            ignore=shutil.ignore_patterns('.install-complete')
+        )
+
+    @property
+    def sdk_archive_name(self):
+        '''Get file name of SDK archive.
+        '''
+        return (
+            f'dotnet-sdk-{self.__dotnet_env.sdk_full_version}-{self.__dotnet_env.target_rid}'
+            f'{self.__dotnet_env.compressed_file_extension}'
+        )
+
+    @property
+    def local_archive_path(self):
+        '''Get path of SDK archive in archive cache, or None if archive cache isn't used.
+        '''
+        if self.__archive_cache_root is None:
+            return None
+        return os.path.join(self.__archive_cache_root, self.sdk_archive_name)
+
+    def __install_into(self, install_dir: str):
+        '''Install SDK into given directory with configured backend.
+
+        Backends are tried in order: local archive cache, archive url and dotnet-install script.
+
+        :param install_dir: install directory
+        :return: CommandInvoker instance
+        '''
+        local_archive_path = self.local_archive_path
+        if local_archive_path is not None and os.path.exists(local_archive_path):
+            self.__install_from_local_archive(local_archive_path, install_dir)
+            return self.__check_sdk_version(install_dir)
+
+        # other backends go to network
+        artifact_cache = self.__artifact_cache
+        if artifact_cache is None:
+            artifact_cache = default_artifact_cache()
+        if artifact_cache.offline:
+            if local_archive_path is not None:
+                raise FileNotFoundError(f'{local_archive_path} is not found in offline mode')
+            if self.__sdk_archive_url_template is not None:
+                raise FileNotFoundError(
+                    f'{self.sdk_archive_name} can not be downloaded from archive url in offline mode')
+
+        if self.__sdk_archive_url_template is not None:
+            self.__install_from_archive_url(install_dir)
+            return self.__check_sdk_version(install_dir)
+        return self.__run_install_script(install_dir)
+
+    def __install_from_local_archive(self, archive_path: str, install_dir: str):
+        '''Extract SDK archive in archive cache.
+
+        :param archive_path: path of SDK archive
+        :param install_dir: install directory
+        '''
+        os.makedirs(install_dir, exist_ok=True)
+        try:
+            if archive_path.endswith('.tar.gz'):
+                common.extract_tar_gz(archive_path, install_dir)
+            else:
+                common.extract_zip(archive_path, install_dir)
+        except (tarfile.TarError, zipfile.BadZipFile, EOFError) as ex:
+            raise OSError(f'fail to extract {archive_path}: {ex}') from ex
+
+    def __check_sdk_version(self, install_dir: str):
+        '''Check that `dotnet --version` of installed SDK matches expected version.
+
+        :param install_dir: install directory
+        :return: CommandInvoker instance
+        '''
+        dotnet_executable = os.path.join(
+            install_dir,
+            os.path.basename(self.__dotnet_env.dotnet_executable)
+        )
+        env = self.__dotnet_env.environment_variables.copy()
+        env['DOTNET_ROOT'] = install_dir
+        with CommandInvoker([dotnet_executable, '--version'], cwd=install_dir, env=env) as invoker:
+            invoker.communicate()
+
+        if invoker.returncode != 0:
+            raise OSError(
+                f'fail to get SDK version in {install_dir}: '
+                f'{invoker.standard_output}{invoker.standard_error}'
+            )
+        actual_version = invoker.standard_output.strip()
+        if actual_version != self.__dotnet_env.sdk_full_version:
+            raise OSError(
+                f'SDK version mismatch in {install_dir}: '
+                f'expect {self.__dotnet_env.sdk_full_version}, get {actual_version}'
+            )
+        return invoker
+
+    def __install_from_archive_url(self, install_dir: str):
+        '''Download SDK archive and extract it at the same time.
+
+        Zip archives can't be read before the central directory at the end arrives,
+        so they are downloaded first and then extracted.
+
+        :param install_dir: install directory
+        '''
+        archive_url = self.__sdk_archive_url_template.format(
+            version=self.__dotnet_env.sdk_full_version,
+            rid=self.__dotnet_env.target_rid,
+            extension=self.__dotnet_env.compressed_file_extension
+        )
+        tee_path = None
+        if self.__archive_cache_root is not None:
+            os.makedirs(self.__archive_cache_root, exist_ok=True)
+            tee_path = os.path.join(self.__archive_cache_root, self.sdk_archive_name)
+
+        os.makedirs(install_dir, exist_ok=True)
+        try:
+            if self.__dotnet_env.compressed_file_extension == '.tar.gz':
+                common.http_extract_tar_gz(archive_url, install_dir, tee_path=tee_path)
+                return
+
+            archive_path = tee_path
+            if archive_path is None:
+                archive_path = os.path.join(install_dir, self.sdk_archive_name)
+            common.http_download(archive_path, archive_url)
+            common.extract_zip(archive_path, install_dir)
+            if tee_path is None:
+                os.remove(archive_path)
+        except (tarfile.TarError, ValueError) as ex:
+            raise OSError(f'fail to install SDK from {archive_url}: {ex}') from ex
+
+    def __run_install_script(self, install_dir: str):
+        '''Run dotnet-install script.
+
+        :param install_dir: install directory
+        :return: CommandInvoker instance
         '''
+        self.__prepare_install_script()
         args = [
             self.__shell_engine, self.__script_path,
-            '-i', self.__dotnet_env.dotnet_root,
+            '-i', install_dir,
             '--version', self.__dotnet_env.sdk_full_version
         ]
         architecture = self.__dotnet_env.target_rid.split('-')[-1]
@@ -0,0 +1,285 @@
+'''Mirror NuGet packages into a local feed
+'''
+
+import os
+import json
+import shutil
+import base64
+import hashlib
+import zipfile
+import threading
+from urllib import request
+from xml.sax.saxutils import quoteattr
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+from core_functionality import common
+
+
+class LocalNuGetFeed:
+    '''Folder feed in NuGet v3 hierarchical layout: <id>/<version>/<id>.<version>.nupkg.
+    '''
+    def __init__(self, feed_root: str):
+        '''
+        :param feed_root: feed folder
+        '''
+        self.__feed_root = feed_root
+        self.__base_address_map: dict[str, str] = dict()
+        self.__lock = threading.Lock()
+
+    @property
+    def feed_root(self):
+        '''Get feed folder.
+        '''
+        return self.__feed_root
+
+    @property
+    def config_file_path(self):
+        '''Get nuget.config that uses this feed as the only package source.
+        '''
+        config_file_path = os.path.join(self.__feed_root, 'nuget.config')
+        if not os.path.exists(config_file_path):
+            os.makedirs(self.__feed_root, exist_ok=True)
+            content = (
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                '<configuration>\n'
+                '  <packageSources>\n'
+                '    <clear />\n'
+                f'    <add key="local-mirror" value={quoteattr(self.__feed_root)} />\n'
+                '  </packageSources>\n'
+                '</configuration>\n'
+            )
+            temp_path = f'{config_file_path}.{os.getpid()}.part'
+            with open(temp_path, 'w', encoding='utf-8') as fp:
+                fp.write(content)
+            os.replace(temp_path, config_file_path)
+        return config_file_path
+
+    def get_package_folder(self, package_id: str, version: str):
+        '''Get folder of a package version.
+
+        :param package_id: package id
+        :param version: package version
+        :return: package folder
+        '''
+        return os.path.join(self.__feed_root, package_id.lower(), version.lower())
+
+    def get_package_path(self, package_id: str, version: str):
+        '''Get path of .nupkg file.
+
+        :param package_id: package id
+        :param version: package version
+        :return: path of .nupkg file
+        '''
+        return os.path.join(
+            self.get_package_folder(package_id, version),
+            f'{package_id.lower()}.{version.lower()}.nupkg'
+        )
+
+    def has_package(self, package_id: str, version: str):
+        '''Whether a package version is in feed.
+
+        :param package_id: package id
+        :param version: package version
+        '''
+        return os.path.exists(f'{self.get_package_path(package_id, version)}.sha512')
+
+    def __resolve_package_base_address(self, remote_feed: str):
+        '''Get PackageBaseAddress resource from service index of remote feed.
+
+        :param remote_feed: url of service index
+        :return: url of flat container
+        '''
+        with self.__lock:
+            if remote_feed in self.__base_address_map:
+                return self.__base_address_map[remote_feed]
+
+        with request.urlopen(remote_feed) as response:
+            service_index = json.load(response)
+        for resource in service_index['resources']:
+            if resource['@type'].startswith('PackageBaseAddress/3.0.0'):
+                base_address = resource['@id']
+                if not base_address.endswith('/'):
+                    base_address += '/'
+                with self.__lock:
+                    self.__base_address_map[remote_feed] = base_address
+                return base_address
+        raise ValueError(f'No PackageBaseAddress resource in {remote_feed}')
+
+    def add_package(self, remote_feed: str, package_id: str, version: str):
+        '''Copy a package version from remote feed(v3 url or folder) into local feed.
+
+        :param remote_feed: url of service index, or a folder feed
+        :param package_id: package id
+        :param version: package version
+        :return: path of .nupkg file
+        '''
+        package_path = self.get_package_path(package_id, version)
+        if self.has_package(package_id, version):
+            return package_path
+
+        package_folder = self.get_package_folder(package_id, version)
+        os.makedirs(package_folder, exist_ok=True)
+        with common.FileLock(f'{package_folder}.lock'):
+            if self.has_package(package_id, version):
+                return package_path
+
+            lower_id = package_id.lower()
+            lower_version = version.lower()
+            if os.path.isdir(remote_feed):
+                source_path = os.path.join(
+                    remote_feed, lower_id, lower_version, f'{lower_id}.{lower_version}.nupkg')
+                if not os.path.exists(source_path):
+                    source_path = os.path.join(remote_feed, f'{package_id}.{version}.nupkg')
+                shutil.copyfile(source_path, package_path)
+                hasher = hashlib.sha512()
+                with open(package_path, 'rb') as fp:
+                    while True:
+                        buffer = fp.read(1024*1024)
+                        if len(buffer) == 0:
+                            break
+                        hasher.update(buffer)
+                sha512 = hasher.hexdigest()
+            else:
+                base_address = self.__resolve_package_base_address(remote_feed)
+                sha512 = common.http_download(
+                    package_path,
+                    f'{base_address}{lower_id}/{lower_version}/{lower_id}.{lower_version}.nupkg'
+                )
+
+            with zipfile.ZipFile(package_path, 'r') as zip_ref:
+                nuspec_name = [
+                    name for name in zip_ref.namelist()
+                    if '/' not in name and name.lower().endswith('.nuspec')
+                ][0]
+                with open(os.path.join(package_folder, f'{lower_id}.nuspec'), 'wb') as fp:
+                    fp.write(zip_ref.read(nuspec_name))
+
+            # NuGet treats a package in v3 folder as complete once its hash file exists
+            with open(f'{package_path}.sha512', 'w', encoding='utf-8') as fp:
+                fp.write(base64.b64encode(bytes.fromhex(sha512)).decode('ascii'))
+        return package_path
+
+    def mirror(self,
+               remote_feed: str,
+               package_list: list[tuple[str, str]],
+               max_workers: int=None):
+        '''Copy package versions from remote feed concurrently.
+
+        :param remote_feed: url of service index, or a folder feed
+        :param package_list: a list of (package id, version)
+        :param max_workers: maximum number of downloads running at the same time
+        :return: a list of path of .nupkg file
+        '''
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_list = [
+                executor.submit(self.add_package, remote_feed, package_id, version)
+                for package_id, version in package_list
+            ]
+            return [future.result() for future in future_list]
+
+    def serve(self, host: str='127.0.0.1', port: int=0):
+        '''Serve feed over HTTP as a NuGet v3 flat container.
+
+        :param host: host to bind
+        :param port: port to bind; a free port is picked if it's 0
+        :return: LocalNuGetFeedServer instance
+        '''
+        return LocalNuGetFeedServer(self.__feed_root, host, port)
+
+
+class LocalNuGetFeedServer:
+    '''Tiny HTTP server for a LocalNuGetFeed.
+    '''
+    def __init__(self, feed_root: str, host: str='127.0.0.1', port: int=0):
+        '''
+        :param feed_root: feed folder
+        :param host: host to bind
+        :param port: port to bind; a free port is picked if it's 0
+        '''
+        self.__feed_root = feed_root
+        self.__server = ThreadingHTTPServer((host, port), self.__create_handler())
+        self.__server.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def service_index_url(self):
+        '''Get url of service index, which is used as package source.
+        '''
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}/v3/index.json'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''Start serving in a background thread.
+        '''
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        '''Stop serving.
+        '''
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __create_handler(self):
+        feed_root = self.__feed_root
+
+        class Handler(BaseHTTPRequestHandler):
+            '''Answer service index, version list and package content requests.
+            '''
+            def log_message(self, format, *args):
+                pass
+
+            def __send(self, status: int, content: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def __send_json(self, obj):
+                self.__send(200, json.dumps(obj).encode('utf-8'), 'application/json')
+
+            def do_GET(self):
+                parts = [part for part in self.path.split('?')[0].split('/') if part != '']
+                if parts == ['v3', 'index.json']:
+                    host, port = self.server.server_address[:2]
+                    self.__send_json({
+                        'version': '3.0.0',
+                        'resources': [{
+                            '@id': f'http://{host}:{port}/v3-flatcontainer/',
+                            '@type': 'PackageBaseAddress/3.0.0'
+                        }]
+                    })
+                    return
+
+                if len(parts) == 3 and parts[0] == 'v3-flatcontainer' and parts[2] == 'index.json':
+                    package_root = os.path.join(feed_root, parts[1].lower())
+                    if not os.path.isdir(package_root):
+                        self.__send(404, b'', 'text/plain')
+                        return
+                    version_list = [
+                        version for version in sorted(os.listdir(package_root))
+                        if os.path.isdir(os.path.join(package_root, version))
+                    ]
+                    self.__send_json({'versions': version_list})
+                    return
+
+                if len(parts) == 4 and parts[0] == 'v3-flatcontainer' and '..' not in parts:
+                    file_path = os.path.join(feed_root, parts[1].lower(), parts[2].lower(), parts[3])
+                    if os.path.isfile(file_path):
+                        with open(file_path, 'rb') as fp:
+                            self.__send(200, fp.read(), 'application/octet-stream')
+                        return
+                self.__send(404, b'', 'text/plain')
+
+        return Handler
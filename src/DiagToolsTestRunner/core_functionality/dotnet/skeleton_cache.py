@@ -0,0 +1,181 @@
+'''Cache project skeletons instantiated by `dotnet new`
+'''
+
+import os
+import re
+import shutil
+from threading import Lock
+
+from core_functionality import common
+from core_functionality.artifact_cache import CACHE_ROOT_ENV
+from core_functionality.cli import CommandInvoker
+from core_functionality.dotnet.environment import DotNetEnvironment
+
+
+class SkeletonCache:
+    '''Instantiate a template once per SDK and copy the skeleton into each app root.
+    '''
+    SKELETON_NAME = 'DiagToolsSkeleton'
+
+    def __init__(self, cache_root: str):
+        '''
+        :param cache_root: cache folder
+        '''
+        self.__cache_root = cache_root
+
+    @property
+    def cache_root(self):
+        '''Get cache folder.
+        '''
+        return self.__cache_root
+
+    def get_skeleton_path(self, dotnet_env: DotNetEnvironment, template: str):
+        '''Get folder of skeleton.
+
+        :param dotnet_env: DotNetEnvironment instance
+        :param template: .NET app template
+        :return: skeleton folder
+        '''
+        return os.path.join(
+            self.__cache_root,
+            f'{dotnet_env.sdk_full_version}-{dotnet_env.target_rid}',
+            template
+        )
+
+    def create_app(self,
+                   dotnet_env: DotNetEnvironment,
+                   template: str,
+                   app_root: str,
+                   name: str,
+                   redirect_std_out_err: bool=True,
+                   silent: bool=False):
+        '''Create a .NET app from cached skeleton, instantiating the skeleton if needed.
+
+        :param dotnet_env: DotNetEnvironment instance
+        :param template: .NET app template
+        :param app_root: .NET app root path
+        :param name: app name
+        :param redirect_std_out_err: whether to redirect stardard output and err
+        :param silent: whether to suppress console output
+        :return: CommandInvoker instance of `dotnet new`, or None if skeleton is cached
+        '''
+        skeleton_path = self.get_skeleton_path(dotnet_env, template)
+        complete_marker = os.path.join(skeleton_path, '.skeleton-complete')
+        invoker = None
+        os.makedirs(os.path.dirname(skeleton_path), exist_ok=True)
+        with common.FileLock(f'{skeleton_path}.lock'):
+            if not os.path.exists(complete_marker):
+                invoker = self.__instantiate(
+                    dotnet_env, template, skeleton_path, redirect_std_out_err, silent)
+                if invoker.returncode != 0:
+                    return invoker
+            copy_skeleton(skeleton_path, app_root, self.SKELETON_NAME, name)
+        return invoker
+
+    def __instantiate(self,
+                      dotnet_env: DotNetEnvironment,
+                      template: str,
+                      skeleton_path: str,
+                      redirect_std_out_err: bool,
+                      silent: bool):
+        '''Run `dotnet new` into skeleton folder.
+
+        :return: CommandInvoker instance
+        '''
+        temp_path = f'{skeleton_path}.{os.getpid()}.part'
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path)
+        args = [
+            dotnet_env.dotnet_executable, 'new', template,
+            '-o', temp_path,
+            '-n', self.SKELETON_NAME,
+            '--no-restore'
+        ]
+        with CommandInvoker(
+            args,
+            env=dotnet_env.environment_variables,
+            redirect_std_out_err=redirect_std_out_err,
+            silent=silent
+        ) as invoker:
+            invoker.communicate()
+        if invoker.returncode != 0:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return invoker
+
+        with open(os.path.join(temp_path, '.skeleton-complete'), 'w', encoding='utf-8') as fp:
+            fp.write(template)
+        if os.path.exists(skeleton_path):
+            shutil.rmtree(skeleton_path)
+        os.replace(temp_path, skeleton_path)
+        return invoker
+
+
+def to_identifier(name: str):
+    '''Convert app name to a valid C# identifier, like `dotnet new` does for namespaces.
+
+    :param name: app name
+    :return: identifier
+    '''
+    identifier = re.sub(r'[^A-Za-z0-9_]', '_', name)
+    if identifier == '' or identifier[0].isdigit():
+        identifier = f'_{identifier}'
+    return identifier
+
+
+def copy_skeleton(skeleton_path: str, app_root: str, skeleton_name: str, name: str):
+    '''Copy skeleton into app root and rename it to app name.
+
+    Files are copied rather than hard linked since callers overwrite sources in place.
+
+    :param skeleton_path: skeleton folder
+    :param app_root: .NET app root path
+    :param skeleton_name: name skeleton is instantiated with
+    :param name: app name
+    '''
+    identifier = to_identifier(name)
+    for root, dir_list, file_list in os.walk(skeleton_path):
+        dir_list[:] = [d for d in dir_list if d not in ['bin', 'obj']]
+        relative_root = os.path.relpath(root, skeleton_path)
+        target_root = os.path.normpath(
+            os.path.join(app_root, relative_root.replace(skeleton_name, name)))
+        os.makedirs(target_root, exist_ok=True)
+        for file_name in file_list:
+            if file_name == '.skeleton-complete':
+                continue
+            src_path = os.path.join(root, file_name)
+            dest_path = os.path.join(target_root, file_name.replace(skeleton_name, name))
+            with open(src_path, 'rb') as fp:
+                content = fp.read()
+            try:
+                text = content.decode('utf-8')
+            except UnicodeDecodeError:
+                shutil.copyfile(src_path, dest_path)
+                continue
+            if dest_path.endswith('.csproj'):
+                text = text.replace(skeleton_name, name)
+            else:
+                text = text.replace(skeleton_name, identifier)
+            with open(dest_path, 'wb') as fp:
+                fp.write(text.encode('utf-8'))
+
+
+__DEFAULT_CACHE: SkeletonCache = None
+__DEFAULT_CACHE_LOCK = Lock()
+
+
+def default_skeleton_cache():
+    '''Get skeleton cache shared in process.
+
+    It lives in `skeletons` of the folder given by DIAGTOOLS_CACHE_ROOT.
+
+    :return: SkeletonCache instance
+    '''
+    global __DEFAULT_CACHE
+    with __DEFAULT_CACHE_LOCK:
+        if __DEFAULT_CACHE is None:
+            cache_root = os.environ.get(
+                CACHE_ROOT_ENV,
+                os.path.join(common.user_profile(), '.diagtoolstestrunner', 'cache')
+            )
+            __DEFAULT_CACHE = SkeletonCache(os.path.join(cache_root, 'skeletons'))
+        return __DEFAULT_CACHE
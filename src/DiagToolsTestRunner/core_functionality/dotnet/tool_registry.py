@@ -0,0 +1,169 @@
+'''Record installed .NET tools and their il
+'''
+
+import os
+import re
+import glob
+import json
+from threading import Lock
+
+from core_functionality import common
+
+
+class ToolRegistryEntry:
+    '''An installed tool version.
+    '''
+    def __init__(self, name: str, version: str, target_framework: str, il_path: str, mtime: float):
+        '''
+        :param name: tool name
+        :param version: tool version
+        :param target_framework: target framework of tool il, e.g. net8.0
+        :param il_path: path of tool il(.dll)
+        :param mtime: modification time of tool il when it's recorded
+        '''
+        self.name = name
+        self.version = version
+        self.target_framework = target_framework
+        self.il_path = il_path
+        self.mtime = mtime
+
+
+class ToolRegistry:
+    '''Persistent index of tools installed under a tool root.
+
+    Entries are kept in `.tool-registry.json` of tool root and are checked
+    against mtime of tool il, so lookups don't search tool store.
+    '''
+    REGISTRY_FILE_NAME = '.tool-registry.json'
+
+    def __init__(self, tool_root: str):
+        '''
+        :param tool_root: .NET tool root
+        '''
+        self.__tool_root = tool_root
+        self.__registry_path = os.path.join(tool_root, self.REGISTRY_FILE_NAME)
+        self.__lock = Lock()
+        self.__entry_map: dict[tuple[str, str], ToolRegistryEntry] = dict()
+        self.__registry_mtime = None
+
+    @property
+    def tool_root(self):
+        '''Get tool root.
+        '''
+        return self.__tool_root
+
+    def get_side_by_side_tool_path(self, version: str):
+        '''Get tool path for a version installed beside another version of the same tool.
+
+        :param version: tool version
+        :return: tool path
+        '''
+        return os.path.join(self.__tool_root, '.versions', version)
+
+    def __reload(self):
+        '''Load registry file if it's changed by another process.
+        '''
+        try:
+            mtime = os.stat(self.__registry_path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self.__registry_mtime:
+            return
+        with open(self.__registry_path, 'r', encoding='utf-8') as fp:
+            entry_list = json.load(fp)
+        self.__entry_map = {
+            (entry['name'], entry['version']): ToolRegistryEntry(**entry)
+            for entry in entry_list
+        }
+        self.__registry_mtime = mtime
+
+    def __save(self):
+        '''Write registry file atomically.
+        '''
+        os.makedirs(self.__tool_root, exist_ok=True)
+        temp_path = f'{self.__registry_path}.{os.getpid()}.part'
+        with open(temp_path, 'w', encoding='utf-8') as fp:
+            json.dump([vars(entry) for entry in self.__entry_map.values()], fp, indent=2)
+        os.replace(temp_path, self.__registry_path)
+        self.__registry_mtime = os.stat(self.__registry_path).st_mtime
+
+    def register(self, name: str, version: str, tool_path: str=None):
+        '''Search tool store once and record tool il.
+
+        :param name: tool name
+        :param version: tool version
+        :param tool_path: tool path the version is installed to; tool root if it's None
+        :return: ToolRegistryEntry instance
+        '''
+        if tool_path is None:
+            tool_path = self.__tool_root
+        tool_il_template = os.path.join(
+            tool_path,
+            '.store',
+            name.lower(),
+            version,
+            name.lower(),
+            version,
+            'tools',
+            'net*',
+            'any',
+            f'{name}.dll'
+        )
+        tool_il_candidates = glob.glob(tool_il_template)
+        if len(tool_il_candidates) < 1:
+            raise FileNotFoundError(f'Fail to find dll file for {name} {version} in {tool_path}')
+
+        def framework_version(il_path: str):
+            target_framework = os.path.basename(os.path.dirname(os.path.dirname(il_path)))
+            return [int(number) for number in re.findall(r'\d+', target_framework)]
+
+        # prefer il built for the newest framework
+        il_path = max(tool_il_candidates, key=framework_version)
+        entry = ToolRegistryEntry(
+            name,
+            version,
+            os.path.basename(os.path.dirname(os.path.dirname(il_path))),
+            il_path,
+            os.stat(il_path).st_mtime
+        )
+
+        os.makedirs(self.__tool_root, exist_ok=True)
+        with self.__lock, common.FileLock(f'{self.__registry_path}.lock'):
+            self.__reload()
+            self.__entry_map[(name, version)] = entry
+            self.__save()
+        return entry
+
+    def lookup(self, name: str, version: str):
+        '''Get recorded tool il, registering it again if it's missing or changed.
+
+        :param name: tool name
+        :param version: tool version
+        :return: ToolRegistryEntry instance
+        '''
+        with self.__lock:
+            self.__reload()
+            entry = self.__entry_map.get((name, version))
+        if entry is not None:
+            try:
+                if os.stat(entry.il_path).st_mtime == entry.mtime:
+                    return entry
+            except FileNotFoundError:
+                pass
+
+        for tool_path in [self.__tool_root, self.get_side_by_side_tool_path(version)]:
+            try:
+                return self.register(name, version, tool_path)
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(f'Fail to find dll file for {name} {version} in {self.__tool_root}')
+
+    def get_versions(self, name: str):
+        '''Get recorded versions of a tool.
+
+        :param name: tool name
+        :return: a list of version
+        '''
+        with self.__lock:
+            self.__reload()
+            return [version for entry_name, version in self.__entry_map if entry_name == name]
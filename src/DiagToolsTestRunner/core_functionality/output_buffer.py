@@ -0,0 +1,143 @@
+'''Implement size-bounded buffer for command output
+'''
+
+import io
+import mmap
+import codecs
+import tempfile
+from threading import Lock
+from typing import Generator, TextIO
+
+
+class OutputBuffer:
+    '''Collect text in chunks and spill to a temporary file once the in-memory cap is exceeded.
+    '''
+    def __init__(self,
+                 memory_limit: int=16*1024*1024,
+                 spill_folder: str=None,
+                 encoding: str='utf-8'):
+        '''
+        :param memory_limit: maximum number of characters kept in memory
+        :param spill_folder: folder of spill file; system temp folder if it's None
+        :param encoding: encoding of spill file
+        '''
+        self.__lock = Lock()
+        self.__memory_limit = memory_limit
+        self.__spill_folder = spill_folder
+        self.__encoding = encoding
+
+        self.__chunks: list[str] = []
+        self.__memory_size = 0
+        self.__size = 0
+        self.__spill_file = None
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def spilled(self):
+        '''Whether content has been spilled to disk.
+        '''
+        return self.__spill_file is not None
+
+    def append(self, text: str):
+        '''Append text.
+
+        :param text: text to append
+        '''
+        with self.__lock:
+            self.__size += len(text)
+            if self.__spill_file is not None:
+                self.__spill_file.write(text.encode(self.__encoding))
+                return
+
+            self.__chunks.append(text)
+            self.__memory_size += len(text)
+            if self.__memory_size > self.__memory_limit:
+                self.__spill()
+
+    def __spill(self):
+        '''Move in-memory chunks to spill file.
+        '''
+        self.__spill_file = tempfile.TemporaryFile(mode='w+b', dir=self.__spill_folder)
+        for chunk in self.__chunks:
+            self.__spill_file.write(chunk.encode(self.__encoding))
+        self.__chunks = []
+        self.__memory_size = 0
+
+    def getvalue(self):
+        '''Get whole content.
+
+        :return: content in string
+        '''
+        with self.__lock:
+            if self.__spill_file is None:
+                if len(self.__chunks) > 1:
+                    self.__chunks = [''.join(self.__chunks)]
+                return self.__chunks[0] if len(self.__chunks) > 0 else ''
+
+            self.__spill_file.flush()
+            self.__spill_file.seek(0)
+            content = self.__spill_file.read().decode(self.__encoding, errors='replace')
+            self.__spill_file.seek(0, io.SEEK_END)
+            return content
+
+    def mmap(self):
+        '''Map spill file into memory.
+
+        :return: read-only mmap instance, or None if content isn't spilled or is empty
+        '''
+        with self.__lock:
+            if self.__spill_file is None or self.__size == 0:
+                return None
+            self.__spill_file.flush()
+            return mmap.mmap(self.__spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def iter_lines(self) -> Generator[str, None, None]:
+        '''Iterate content line by line without loading all of it.
+
+        :return: Generator[str]
+        '''
+        mapped = self.mmap()
+        if mapped is None:
+            with self.__lock:
+                chunks = self.__chunks.copy()
+            yield from io.StringIO(''.join(chunks))
+            return
+
+        with mapped:
+            while True:
+                line = mapped.readline()
+                if len(line) == 0:
+                    break
+                yield line.decode(self.__encoding, errors='replace')
+
+    def write_to(self, stream: TextIO, block_size: int=4*1024*1024):
+        '''Copy content to a text stream block by block.
+
+        :param stream: writable text stream
+        :param block_size: block size(byte) used when copying spill file
+        '''
+        mapped = self.mmap()
+        if mapped is None:
+            with self.__lock:
+                chunks = self.__chunks.copy()
+            stream.writelines(chunks)
+            return
+
+        with mapped:
+            decoder = codecs.getincrementaldecoder(self.__encoding)(errors='replace')
+            for offset in range(0, len(mapped), block_size):
+                stream.write(decoder.decode(mapped[offset:offset + block_size]))
+            stream.write(decoder.decode(b'', final=True))
+
+    def close(self):
+        '''Release spill file and in-memory chunks.
+        '''
+        with self.__lock:
+            if self.__spill_file is not None:
+                self.__spill_file.close()
+                self.__spill_file = None
+            self.__chunks = []
+            self.__memory_size = 0
+            self.__size = 0
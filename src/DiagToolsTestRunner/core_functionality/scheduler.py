@@ -0,0 +1,171 @@
+'''Implement dependency-aware scheduler for test steps
+'''
+
+import os
+import time
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable
+
+from core_functionality.cli import CommandInvoker, write_invoker_output
+
+
+class Step:
+    '''A unit of work in step graph.
+    '''
+    def __init__(self,
+                 name: str,
+                 action: Callable[[], CommandInvoker | None],
+                 dependencies: list[str]=None,
+                 logger_path: str=None):
+        '''
+        :param name: unique step name
+        :param action: callable runs the step; the returned CommandInvoker is logged
+        :param dependencies: names of steps that must finish first
+        :param logger_path: logger path; nothing is logged if it's None
+        '''
+        self.name = name
+        self.action = action
+        self.dependencies = list(dependencies) if dependencies is not None else []
+        self.logger_path = logger_path
+
+
+class StepResult:
+    '''Result of a step.
+    '''
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    def __init__(self, name: str, status: str, elapsed_secs: float=0, exception: Exception=None):
+        '''
+        :param name: step name
+        :param status: one of StepResult.SUCCEEDED, StepResult.FAILED and StepResult.SKIPPED
+        :param elapsed_secs: wall-clock time of the step(seconds)
+        :param exception: exception raised by the step
+        '''
+        self.name = name
+        self.status = status
+        self.elapsed_secs = elapsed_secs
+        self.exception = exception
+
+
+class StepScheduler:
+    '''Run steps concurrently once all of their dependencies are finished.
+    '''
+    def __init__(self, max_workers: int=None):
+        '''
+        :param max_workers: maximum number of steps running at the same time
+        '''
+        self.__max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.__step_map: dict[str, Step] = dict()
+        self.__logger_lock_map: dict[str, Lock] = dict()
+
+    def add_step(self,
+                 name: str,
+                 action: Callable[[], CommandInvoker | None],
+                 dependencies: list[str]=None,
+                 logger_path: str=None):
+        '''Add step to graph.
+
+        :param name: unique step name
+        :param action: callable runs the step; the returned CommandInvoker is logged
+        :param dependencies: names of steps that must finish first
+        :param logger_path: logger path; nothing is logged if it's None
+        :return: step name
+        '''
+        if name in self.__step_map:
+            raise ValueError(f'Duplicate step: {name}')
+        self.__step_map[name] = Step(name, action, dependencies, logger_path)
+        if logger_path is not None and logger_path not in self.__logger_lock_map:
+            self.__logger_lock_map[logger_path] = Lock()
+        return name
+
+    def __validate(self):
+        '''Check unknown dependencies and cycles.
+        '''
+        for step in self.__step_map.values():
+            for dependency in step.dependencies:
+                if dependency not in self.__step_map:
+                    raise ValueError(f'Unknown dependency {dependency} of step {step.name}')
+
+        in_degree = {name: len(step.dependencies) for name, step in self.__step_map.items()}
+        ready = [name for name, degree in in_degree.items() if degree == 0]
+        visited = 0
+        while len(ready) > 0:
+            name = ready.pop()
+            visited += 1
+            for step in self.__step_map.values():
+                if name in step.dependencies:
+                    in_degree[step.name] -= 1
+                    if in_degree[step.name] == 0:
+                        ready.append(step.name)
+        if visited != len(self.__step_map):
+            raise ValueError('Step graph contains a cycle')
+
+    def __run_step(self, step: Step, ignore_error: bool):
+        content = []
+        invoker = None
+        exception = None
+        start = time.perf_counter()
+        try:
+            invoker = step.action()
+        except Exception as ex:
+            # any error fails the step alone, results of other steps are still reported
+            exception = ex
+            content.append(f'Fail to run step \"{step.name}\": {ex}\n')
+            if not ignore_error:
+                content.append('Skip dependent steps\n')
+        elapsed_secs = time.perf_counter() - start
+
+        if step.logger_path is not None:
+            with self.__logger_lock_map[step.logger_path]:
+                write_invoker_output(
+                    step.logger_path,
+                    invoker if isinstance(invoker, CommandInvoker) else None,
+                    content
+                )
+
+        status = StepResult.SUCCEEDED if exception is None else StepResult.FAILED
+        return StepResult(step.name, status, elapsed_secs, exception)
+
+    def run(self, ignore_error: bool=False) -> dict[str, StepResult]:
+        '''Run all steps.
+
+        :param ignore_error: whether to run dependent steps of a failed step
+        :return: a dict maps step name to StepResult
+        '''
+        self.__validate()
+
+        result_map: dict[str, StepResult] = dict()
+        pending = dict(self.__step_map)
+        running: dict[Future, str] = dict()
+
+        def is_blocked(step: Step):
+            return any(
+                result_map[dependency].status != StepResult.SUCCEEDED
+                for dependency in step.dependencies
+                if dependency in result_map
+            ) and not ignore_error
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers) as executor:
+            while len(pending) > 0 or len(running) > 0:
+                for name, step in list(pending.items()):
+                    if is_blocked(step):
+                        result_map[name] = StepResult(name, StepResult.SKIPPED)
+                        pending.pop(name)
+                        continue
+                    if all(dependency in result_map for dependency in step.dependencies):
+                        running[executor.submit(self.__run_step, step, ignore_error)] = name
+                        pending.pop(name)
+
+                if len(running) == 0:
+                    continue
+
+                done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    result_map[name] = future.result()
+
+        return {name: result_map[name] for name in self.__step_map}
+
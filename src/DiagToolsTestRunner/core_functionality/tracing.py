@@ -4,15 +4,20 @@
 import os
 
 from core_functionality import common
+from core_functionality.artifact_cache import ArtifactCache, default_artifact_cache
 from core_functionality.cli import CommandInvoker
 
 class PerfCollect:
     '''Tracing with perfcollect.
     '''
-    def __init__(self, perfcollect_path: str, install_prerequisites: bool=False):
+    def __init__(self,
+                 perfcollect_path: str,
+                 install_prerequisites: bool=False,
+                 artifact_cache: ArtifactCache=None):
         '''
         :param perfcollect_path: perfcollect path
         :param install_prerequisites: whether to install prerequisites
+        :param artifact_cache: cache of perfcollect script; shared cache if it's None
         '''
         if not common.rid_os_name().startswith('linux'):
             raise OSError('perfcollect is only supported on Linux')
@@ -20,14 +25,11 @@ class PerfCollect:
         self.__perfcollect_download_link = \
             'https://raw.githubusercontent.com/microsoft/perfview/main/src/perfcollect/perfcollect'
         self.__perfcollect_path = perfcollect_path
-
-        common.http_download(self.__perfcollect_path, self.__perfcollect_download_link)
-
-        enable_execute_args = ['chmod', '+x', self.__perfcollect_path]
-        with CommandInvoker(enable_execute_args, env=os.environ, silent=False) as ci:
-            ci.communicate()
+        self.__artifact_cache = artifact_cache
+        self.__prepared = False
 
         if install_prerequisites:
+            self.__prepare_perfcollect()
             install_args = [
                 '/bin/bash',
                 self.__perfcollect_path,
@@ -36,6 +38,21 @@ class PerfCollect:
             with CommandInvoker(install_args, env=os.environ, silent=False) as ci:
                 ci.communicate()
 
+    def __prepare_perfcollect(self):
+        '''Place perfcollect from artifact cache on first use, so no network I/O on construction.
+        '''
+        if self.__prepared:
+            return
+        artifact_cache = self.__artifact_cache
+        if artifact_cache is None:
+            artifact_cache = default_artifact_cache()
+        artifact_cache.fetch_to(self.__perfcollect_download_link, self.__perfcollect_path)
+
+        enable_execute_args = ['chmod', '+x', self.__perfcollect_path]
+        with CommandInvoker(enable_execute_args, env=os.environ, silent=False) as ci:
+            ci.communicate()
+        self.__prepared = True
+
     @property
     def perfcollect_path(self):
         '''Get perfcollect path.
@@ -54,6 +71,7 @@ class PerfCollect:
         :param redirect_std_out_err: whether to redirect stardard output and err
         :param silent: whether to suppress console output
         '''
+        self.__prepare_perfcollect()
         args = [
             '/bin/bash',
             self.__perfcollect_path,
@@ -5,6 +5,9 @@ class BaseDotNetSetting:
     '''`DotNet` section
     '''
     VersionList: list[str]
+    SDKStore: str
+    SDKArchiveURL: str
+    SDKArchiveCache: str
 
 class BaseDiagToolSetting:
     '''`DiagTool` section
@@ -9,6 +9,8 @@ from core_functionality.tracing import PerfCollect
 from core_functionality.dotnet.environment import DotNetEnvironment
 from core_functionality.dotnet.installer import DotNetInstaller
 from core_functionality.dotnet.app import DotNetApp
+from core_functionality.dotnet.build_cache import BuildCache, default_build_cache
+from core_functionality.dotnet.skeleton_cache import default_skeleton_cache
 
 
 class BaseLTTngTestConfig:
@@ -25,38 +27,95 @@ class LTTngTestConfig:
     DotNetEnvironment: DotNetEnvironment
     Installer: DotNetInstaller
     GCPerfsim: DotNetApp
+    BuildCache: BuildCache
     PerfCollect: PerfCollect
+    TestBed: str
     TestResultFolder: str
 
 
-def generate_lttng_test_config(config_file_path: str) -> list[LTTngTestConfig]:
+def get_isolated_test_bed(test_bed: str, version: str):
+    '''Get testbed dedicated to a single SDK version.
+
+    :param test_bed: testbed in config file
+    :param version: full version of .NET SDK
+    :return: path of dedicated testbed
+    '''
+    return os.path.join(test_bed, f'testbed-{version}')
+
+
+def get_isolated_home(test_bed: str, version: str):
+    '''Get HOME folder dedicated to a single SDK version.
+
+    :param test_bed: testbed in config file
+    :param version: full version of .NET SDK
+    :return: path of dedicated HOME folder
+    '''
+    return os.path.join(get_isolated_test_bed(test_bed, version), 'home')
+
+
+def generate_lttng_test_config(config_file_path: str,
+                               version_list: list[str]=None,
+                               isolate_test_bed: bool=False) -> list[LTTngTestConfig]:
     '''Parse config file and generate test config for LTTng test runner.
     
     :param toml_file_path: path of toml file
+    :param version_list: SDK versions to generate config for; all versions if it's None
+    :param isolate_test_bed: whether to give each SDK version a dedicated testbed
     :return: a list of LTTngTestConfig instance
     '''
     base_config: BaseLTTngTestConfig = common.parse_toml(config_file_path)
 
+    sdk_store_root = getattr(base_config.DotNet, 'SDKStore', None)
+    if sdk_store_root == '':
+        sdk_store_root = None
+    sdk_archive_url_template = getattr(base_config.DotNet, 'SDKArchiveURL', None)
+    if sdk_archive_url_template == '':
+        sdk_archive_url_template = None
+    sdk_archive_cache_root = getattr(base_config.DotNet, 'SDKArchiveCache', None)
+    if sdk_archive_cache_root is None or sdk_archive_cache_root == '':
+        sdk_archive_cache_root = os.path.join(base_config.Test.TestBed, 'archives')
+
     config_list = list()
     for version in base_config.DotNet.VersionList:
+        if version_list is not None and version not in version_list:
+            continue
+        if isolate_test_bed:
+            test_bed = get_isolated_test_bed(base_config.Test.TestBed, version)
+        else:
+            test_bed = base_config.Test.TestBed
         dotnet_root = os.path.join(
-            base_config.Test.TestBed,
+            test_bed,
             f'.NET-sdk-{version}'
         )
         target_rid = f'{common.rid_os_name()}-{common.rid_machine_name()}'
         build_config = base_config.App.BuildConfig
         env = DotNetEnvironment(dotnet_root, version, target_rid)
-        installer = DotNetInstaller(base_config.Test.TestBed, env)
-        app_root = os.path.join(base_config.Test.TestBed, f'gcperfsim-{version}')
-        gcperfsim_app = DotNetApp(env, app_root, 'console', build_config, name='gcperfsim')
-        test_result_folder = os.path.join(base_config.Test.TestBed, f'TestResult-{version}')
-        perfcollect_path = os.path.join(base_config.Test.TestBed, 'perfcollect')
+        installer = DotNetInstaller(
+            test_bed,
+            env,
+            sdk_store_root=sdk_store_root,
+            sdk_archive_url_template=sdk_archive_url_template,
+            archive_cache_root=sdk_archive_cache_root
+        )
+        app_root = os.path.join(test_bed, f'gcperfsim-{version}')
+        gcperfsim_app = DotNetApp(
+            env,
+            app_root,
+            'console',
+            build_config,
+            name='gcperfsim',
+            skeleton_cache=default_skeleton_cache()
+        )
+        test_result_folder = os.path.join(test_bed, f'TestResult-{version}')
+        perfcollect_path = os.path.join(test_bed, 'perfcollect')
 
         config = LTTngTestConfig()
         config.DotNetEnvironment = env
         config.Installer = installer
         config.GCPerfsim = gcperfsim_app
+        config.BuildCache = default_build_cache()
         config.PerfCollect = PerfCollect(perfcollect_path)
+        config.TestBed = test_bed
         config.TestResultFolder = test_result_folder
         config_list.append(config)
     return config_list
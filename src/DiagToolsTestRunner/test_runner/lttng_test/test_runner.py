@@ -4,7 +4,9 @@
 import os
 from typing import Callable, Generator, Any
 
+from core_functionality import common
 from core_functionality.cli import CommandInvoker, command_sequence_runner
+from core_functionality.scheduler import StepScheduler
 from test_assets import gcperfsim as gcperfsim_assets
 from test_runner.lttng_test.config import LTTngTestConfig
 
@@ -15,23 +17,37 @@ class LTTngTestRunner:
     def __init__(self,
                  config: LTTngTestConfig,
                  init_logger_name: str=None,
-                 ignore_error: bool=False):
+                 ignore_error: bool=False,
+                 initialize: bool=True):
         '''
         :param config: a LTTngTestConfig instance
+        :param init_logger_name: logger name for initialization
+        :param ignore_error: whether to ignore error
+        :param initialize: whether to initialize immediately; \
+            set it False when initialization steps are run by StepScheduler
         '''
         self.__config = config
+        self.__gcperfsim_cache_key = None
+        self.__gcperfsim_restored = False
         if init_logger_name is None:
-            init_logger_path = os.path.join(
+            self.__init_logger_path = os.path.join(
                 self.__config.TestResultFolder,
                 f'init-{self.__config.DotNetEnvironment.sdk_full_version}.log'
             )
         else:
-            init_logger_path = os.path.join(
+            self.__init_logger_path = os.path.join(
                 self.__config.TestResultFolder,
                 f'init-{init_logger_name}.log'
             )
-        command_sequence_runner(
-            init_logger_path, self.__initialize_test(), ignore_error=ignore_error)
+        if initialize:
+            command_sequence_runner(
+                self.__init_logger_path, self.__initialize_test(), ignore_error=ignore_error)
+
+    @property
+    def init_logger_path(self):
+        '''Get logger path for initialization.
+        '''
+        return self.__init_logger_path
 
     def __initialize_test(self):
         '''Initialize environment for testing.
@@ -43,10 +59,60 @@ class LTTngTestRunner:
         # install sdk
         yield self.__config.Installer.install_dotnet_sdk()
 
+        # take gcperfsim from build cache if nothing changed
+        self.__restore_gcperfsim()
+
         # create gcperfsim
-        yield self.__config.GCPerfsim.create()
+        yield self.__create_gcperfsim()
 
         # replace source code file
+        self.__replace_gcperfsim_source()
+
+        # builf gcperfsim
+        yield self.__build_gcperfsim()
+
+    def __gcperfsim_source_map(self):
+        return {'Program.cs': gcperfsim_assets.gcperfsim_src_path}
+
+    def __restore_gcperfsim(self):
+        '''Restore built gcperfsim from build cache.
+        '''
+        build_cache = getattr(self.__config, 'BuildCache', None)
+        if build_cache is None:
+            return
+        self.__gcperfsim_cache_key = build_cache.compute_key(
+            self.__config.GCPerfsim, self.__gcperfsim_source_map())
+        self.__gcperfsim_restored = build_cache.restore(
+            self.__gcperfsim_cache_key, self.__config.GCPerfsim)
+        if self.__gcperfsim_restored:
+            print(f'restore {self.__config.GCPerfsim.app_name} from build cache')
+
+    def __create_gcperfsim(self):
+        '''Create gcperfsim unless it's restored from build cache.
+
+        :return: CommandInvoker instance, or None if it's restored
+        '''
+        if self.__gcperfsim_restored:
+            return None
+        return self.__config.GCPerfsim.create()
+
+    def __build_gcperfsim(self):
+        '''Build gcperfsim unless it's restored from build cache, and save output to cache.
+
+        :return: CommandInvoker instance, or None if it's restored
+        '''
+        if self.__gcperfsim_restored:
+            return None
+        invoker = self.__config.GCPerfsim.build()
+        if invoker.returncode == 0 and self.__gcperfsim_cache_key is not None:
+            self.__config.BuildCache.store(self.__gcperfsim_cache_key, self.__config.GCPerfsim)
+        return invoker
+
+    def __replace_gcperfsim_source(self):
+        '''Replace Program.cs of gcperfsim with test asset.
+        '''
+        if self.__gcperfsim_restored:
+            return
         target_src_file_path = os.path.join(
             self.__config.GCPerfsim.app_root,
             'Program.cs'
@@ -55,8 +121,44 @@ class LTTngTestRunner:
             with open(target_src_file_path, mode='w', encoding='utf-8') as writer:
                 writer.write(reader.read())
 
-        # builf gcperfsim
-        yield self.__config.GCPerfsim.build()
+    def add_initialization_steps(self, scheduler: StepScheduler):
+        '''Add initialization steps to a StepScheduler instead of running them in sequence.
+
+        Steps of different runners have no dependency on each other, so they run concurrently.
+
+        :param scheduler: a StepScheduler instance
+        :return: name of the last step
+        '''
+        os.makedirs(self.__config.TestResultFolder, exist_ok=True)
+        sdk_version = self.__config.DotNetEnvironment.sdk_full_version
+        install_step = scheduler.add_step(
+            f'install-sdk-{sdk_version}',
+            self.__config.Installer.install_dotnet_sdk,
+            logger_path=self.__init_logger_path
+        )
+        restore_step = scheduler.add_step(
+            f'restore-gcperfsim-{sdk_version}',
+            self.__restore_gcperfsim,
+            logger_path=self.__init_logger_path
+        )
+        create_step = scheduler.add_step(
+            f'create-gcperfsim-{sdk_version}',
+            self.__create_gcperfsim,
+            [install_step, restore_step],
+            logger_path=self.__init_logger_path
+        )
+        replace_source_step = scheduler.add_step(
+            f'replace-gcperfsim-source-{sdk_version}',
+            self.__replace_gcperfsim_source,
+            [create_step],
+            logger_path=self.__init_logger_path
+        )
+        return scheduler.add_step(
+            f'build-gcperfsim-{sdk_version}',
+            self.__build_gcperfsim,
+            [replace_source_step],
+            logger_path=self.__init_logger_path
+        )
 
     def run_test_with_gcperfsim(self,
                                 test: Callable[
@@ -64,6 +166,9 @@ class LTTngTestRunner:
                                 logger_name: str=None,
                                 ignore_error: bool=False):
         '''Start gcperfsim for testing.
+
+        Perf sessions need the whole machine, so they are serialized by a machine-wide lock
+        across runners, worker processes and testbeds.
         
         :param test: a callable takes LTTngTestConfig as parameter and return a generator
         :param logger_name: logger name
@@ -81,11 +186,12 @@ class LTTngTestRunner:
             )
 
         gcperfsim_run_args = [self.__config.GCPerfsim.executable]
-        with CommandInvoker(
-            gcperfsim_run_args,
-            cwd=self.__config.TestResultFolder,
-            env=self.__config.DotNetEnvironment.dotnet_tracing_environment
-        ) as invoker:
-            command_sequence_runner(
-                logger_path, test(self.__config), ignore_error=ignore_error)
-            invoker.kill()
+        with common.machine_lock('perf-session'):
+            with CommandInvoker(
+                gcperfsim_run_args,
+                cwd=self.__config.TestResultFolder,
+                env=self.__config.DotNetEnvironment.dotnet_tracing_environment
+            ) as invoker:
+                command_sequence_runner(
+                    logger_path, test(self.__config), ignore_error=ignore_error)
+                invoker.kill()
@@ -0,0 +1,135 @@
+'''Test common.http_download against a local HTTP server
+'''
+
+import os
+import sys
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core_functionality import common
+
+
+CONTENT = bytes(range(256)) * 1000
+PART_SIZE = 16 * 1024
+
+
+class _Server:
+    '''Serve CONTENT with configurable Range support.
+
+    mode:
+        ignore-range - always answer 200 with the whole content
+        unknown-size - answer ranges with `Content-Range: bytes a-b/*`
+        ranged       - answer ranges with total size
+    '''
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.fail_part_set: set[int] = set()
+        self.request_list: list[str] = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                range_header = self.headers.get('Range')
+                with server.lock:
+                    server.request_list.append(range_header)
+                if range_header is None or server.mode == 'ignore-range':
+                    self.__send(200, CONTENT)
+                    return
+
+                start, end = [int(value) for value in range_header[len('bytes='):].split('-')]
+                end = min(end, len(CONTENT) - 1)
+                if start // PART_SIZE in server.fail_part_set:
+                    self.__send(500, b'')
+                    return
+                total = '*' if server.mode == 'unknown-size' else str(len(CONTENT))
+                self.__send(206, CONTENT[start:end + 1], {'Content-Range': f'bytes {start}-{end}/{total}'})
+
+            def __send(self, status: int, content: bytes, headers: dict=None):
+                self.send_response(status)
+                for key, value in (headers or dict()).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/artifact.bin'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HttpDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.download_path = os.path.join(self.temp_dir.name, 'artifact.bin')
+        self.expected_sha512 = hashlib.sha512(CONTENT).hexdigest()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def __read_download(self):
+        with open(self.download_path, 'rb') as fp:
+            return fp.read()
+
+    def test_server_ignoring_range(self):
+        with _Server('ignore-range') as server:
+            sha512 = common.http_download(self.download_path, server.url, PART_SIZE, 4)
+        self.assertEqual(sha512, self.expected_sha512)
+        self.assertEqual(self.__read_download(), CONTENT)
+
+    def test_unknown_total_size(self):
+        with _Server('unknown-size') as server:
+            sha512 = common.http_download(self.download_path, server.url, PART_SIZE, 4)
+            # the 1-byte probe is not taken as the whole file
+            self.assertIn(None, server.request_list)
+        self.assertEqual(sha512, self.expected_sha512)
+        self.assertEqual(self.__read_download(), CONTENT)
+
+    def test_resume_after_interrupted_part(self):
+        with _Server('ranged') as server:
+            failed_part = 5
+            server.fail_part_set.add(failed_part)
+            with self.assertRaises(OSError):
+                common.http_download(self.download_path, server.url, PART_SIZE, 1)
+            self.assertFalse(os.path.exists(self.download_path))
+            self.assertTrue(os.path.exists(f'{self.download_path}.part.json'))
+
+            server.fail_part_set.clear()
+            server.request_list.clear()
+            sha512 = common.http_download(self.download_path, server.url, PART_SIZE, 1)
+            # only the probe, the failed part and parts after it are fetched again
+            fetched_starts = [
+                int(range_header[len('bytes='):].split('-')[0])
+                for range_header in server.request_list[1:]
+            ]
+            self.assertEqual(min(fetched_starts), failed_part * PART_SIZE)
+        self.assertEqual(sha512, self.expected_sha512)
+        self.assertEqual(self.__read_download(), CONTENT)
+        self.assertFalse(os.path.exists(f'{self.download_path}.part.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()